@@ -0,0 +1,82 @@
+"""
+Benchmark the dashboard's Region/Product/Date filtering.
+
+Compares the original boolean-mask filter against FilterIndex on a
+synthetic frame. Run from the repository root:
+
+    python benchmarks/bench_filter_index.py --rows 10000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.filter_index import FilterIndex  # noqa: E402
+
+REGIONS = ['Central', 'Northern', 'Southern']
+PRODUCTS = ['Maize Seeds', 'Fertilizer', 'Pesticides', 'Irrigation Kit', 'Animal Feed']
+
+
+def make_frame(rows, seed=42):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, rows), unit="D")
+    return pd.DataFrame({
+        "Customer ID": rng.integers(1, rows // 10 + 2, rows),
+        "Date": dates,
+        "Region": pd.Series(np.array(REGIONS, dtype=object)[rng.integers(0, len(REGIONS), rows)]),
+        "Product": pd.Series(np.array(PRODUCTS, dtype=object)[rng.integers(0, len(PRODUCTS), rows)]),
+        "Sales": rng.integers(1000, 10000, rows),
+    })
+
+
+def mask_filter(df, regions, products, start, end):
+    return df[
+        (df['Region'].isin(regions)) &
+        (df['Product'].isin(products)) &
+        (df['Date'] >= pd.to_datetime(start)) &
+        (df['Date'] <= pd.to_datetime(end))
+    ]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+SCENARIOS = {
+    "all rows": (REGIONS, PRODUCTS, "2022-01-01", "2024-12-31"),
+    "one month, all categories": (REGIONS, PRODUCTS, "2023-06-01", "2023-06-30"),
+    "one region, two products": (REGIONS[:1], PRODUCTS[:2], "2022-01-01", "2024-12-31"),
+    "one region, one product, one week": (REGIONS[1:2], PRODUCTS[3:4], "2023-03-01", "2023-03-07"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    build_time, index = best_of(lambda: FilterIndex(df), 1)
+    print(f"rows={args.rows:,}  index build={build_time * 1000:.0f} ms")
+    print(f"{'scenario':<36}{'selected':>12}{'mask ms':>10}{'index ms':>10}{'speedup':>9}")
+    for name, (regions, products, start, end) in SCENARIOS.items():
+        mask_time, expected = best_of(lambda: mask_filter(df, regions, products, start, end), args.repeat)
+        index_time, result = best_of(lambda: index.select(regions, products, start, end), args.repeat)
+        assert len(result) == len(expected)
+        print(f"{name:<36}{len(result):>12,}{mask_time * 1000:>10.1f}{index_time * 1000:>10.1f}"
+              f"{mask_time / max(index_time, 1e-9):>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare forecasting backends on generated daily sales.
+
+Generates transactions whose daily totals follow a trend with yearly and
+weekly seasonality plus noise, holds out the last --holdout days, and
+reports fit time and holdout accuracy for each backend. Run from the
+repository root:
+
+    python benchmarks/bench_forecasting.py --days 1095 --holdout 90
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.forecasting import BACKENDS, FourierModel, daily_sales  # noqa: E402
+
+
+def make_transactions(days, per_day=20, seed=42):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2021-01-01", periods=days, freq="D")
+    t = np.arange(days)
+    level = 100_000 + 40 * t
+    seasonal = 1 + 0.25 * np.sin(2 * np.pi * t / 365.25) + 0.1 * np.sin(2 * np.pi * t / 7)
+    totals = level * seasonal * rng.normal(1, 0.05, days)
+    # Split each day's total across a random number of transactions.
+    counts = rng.poisson(per_day, days) + 1
+    day_of_row = np.repeat(np.arange(days), counts)
+    weights = rng.random(len(day_of_row))
+    weights /= np.bincount(day_of_row, weights)[day_of_row]
+    return pd.DataFrame({
+        "Date": dates[day_of_row],
+        "Sales": np.round(totals[day_of_row] * weights).astype(np.int64),
+    })
+
+
+def fit_uncached(train, backend):
+    """Fit a backend directly, bypassing the model cache so timings are real."""
+    series = daily_sales(train)
+    if backend == "fourier":
+        return FourierModel(yearly_seasonality=True, weekly_seasonality=True).fit(series["ds"], series["y"])
+    from prophet import Prophet
+    return Prophet(yearly_seasonality=True, weekly_seasonality=True, daily_seasonality=False).fit(series)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare forecasting backends.")
+    parser.add_argument("--days", type=int, default=1095)
+    parser.add_argument("--holdout", type=int, default=90)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    args = parser.parse_args()
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+
+    df = make_transactions(args.days)
+    cutoff = df["Date"].min() + pd.Timedelta(days=args.days - args.holdout)
+    train, test = df[df["Date"] < cutoff], daily_sales(df[df["Date"] >= cutoff])
+
+    print(f"transactions={len(df):,}  train days={args.days - args.holdout}  holdout days={args.holdout}")
+    print(f"{'backend':<10}{'fit s':>10}{'MAPE %':>10}{'RMSE':>12}{'coverage %':>12}")
+    for backend in args.backends:
+        start = time.perf_counter()
+        model = fit_uncached(train, backend)
+        fit_time = time.perf_counter() - start
+        if backend == "prophet":
+            forecast = model.predict(test[["ds"]])
+        else:
+            forecast = model.predict(test["ds"])
+        y, yhat = test["y"].to_numpy(), forecast["yhat"].to_numpy()
+        mape = np.mean(np.abs((y - yhat) / y)) * 100
+        rmse = np.sqrt(np.mean((y - yhat) ** 2))
+        inside = (y >= forecast["yhat_lower"].to_numpy()) & (y <= forecast["yhat_upper"].to_numpy())
+        print(f"{backend:<10}{fit_time:>10.3f}{mape:>10.2f}{rmse:>12,.0f}{inside.mean() * 100:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Report and check the app's cold-start import time.
+
+Imports a module (by default ``app``, i.e. everything Streamlit imports
+before the first page renders) in fresh interpreters under
+``python -X importtime``, prints the slowest modules and the cost per
+top-level package, and fails if the import exceeds a time budget or pulls
+in a library that should only load with its page. Run from the
+repository root:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module src.pages.forecast --top 30
+    python benchmarks/import_time.py --max-seconds 2.0   # exit 1 when over budget
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that belong to a single page or action and must not load at startup.
+DEFERRED_MODULES = ["sklearn", "scipy", "prophet", "cmdstanpy", "xlsxwriter", "openpyxl", "duckdb"]
+_MODULES_MARKER = "__loaded_modules__"
+
+
+def import_profile(module):
+    """
+    Import ``module`` in a fresh interpreter with ``-X importtime``.
+
+    Returns:
+        tuple: (rows, loaded) where rows is a list of (module, self_us,
+        cumulative_us, depth) in import order and loaded is the set of
+        top-level package names in sys.modules afterwards.
+    """
+    code = (
+        f"import sys, json; import {module}; "
+        f"print({_MODULES_MARKER!r} + json.dumps(sorted({{m.split('.')[0] for m in sys.modules}})))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    loaded = set()
+    for line in proc.stdout.splitlines():
+        if line.startswith(_MODULES_MARKER):
+            loaded = set(json.loads(line[len(_MODULES_MARKER):]))
+    return rows, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report and check cold-start import time.")
+    parser.add_argument("--module", default="app", help="Module to import (default: app).")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters to run; the fastest counts.")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules/packages to list.")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Fail when the import takes longer than this.")
+    parser.add_argument("--allow", nargs="*", default=[],
+                        help="Deferred modules that may load for this --module.")
+    args = parser.parse_args()
+
+    runs = [import_profile(args.module) for _ in range(args.repeat)]
+    rows, loaded = min(runs, key=lambda run: run[0][-1][2])
+    total = rows[-1][2] / 1e6
+
+    print(f"import {args.module}: {total:.3f} s (fastest of {args.repeat}), {len(rows)} modules")
+    print(f"\n{'cumulative s':>12}{'self s':>10}  module")
+    for name, self_us, cumulative_us, _ in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"{cumulative_us / 1e6:>12.3f}{self_us / 1e6:>10.3f}  {name}")
+
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    print(f"\n{'self s':>12}  package")
+    for package, self_us in sorted(by_package.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{self_us / 1e6:>12.3f}  {package}")
+
+    failures = []
+    eager = sorted(set(DEFERRED_MODULES) - set(args.allow) & loaded)
+    if eager:
+        failures.append(f"deferred modules imported eagerly: {', '.join(eager)}")
+    if args.max_seconds is not None and total > args.max_seconds:
+        failures.append(f"import took {total:.3f} s, budget is {args.max_seconds:.3f} s")
+    for failure in failures:
+        print(f"\nFAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""
+Report how much memory normalize_schema() saves on a sales CSV, per column.
+
+Reads the CSV as plain pandas would (text as strings, integers as
+int64), normalizes it the way load_data does, and prints each column's
+dtype and deep memory usage before and after. Run from the repository
+root:
+
+    python benchmarks/memory_report.py
+    python benchmarks/memory_report.py data/.cache/bench/sales_1000000_42.csv
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.data_loader import apply_column_types, memory_report, normalize_schema  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("path", nargs="?", default=os.path.join(ROOT, "data", "sample_sales_data.csv"),
+                        help="sales CSV to measure")
+    args = parser.parse_args(argv)
+
+    before = apply_column_types(pd.read_csv(args.path, parse_dates=["Date"]))
+    after = normalize_schema(before)
+    report = memory_report(before, after)
+    print(f"{args.path}: {len(before):,} rows")
+    print(report.to_string(index=False, float_format=lambda x: f"{x:,.2f}"))
+
+
+if __name__ == "__main__":
+    main()
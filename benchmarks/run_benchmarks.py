@@ -0,0 +1,428 @@
+"""
+Benchmark every dashboard stage on generated datasets, and compare runs.
+
+Each benchmark times one stage (loading, filtering, KPIs, aggregation,
+insights, chart builders, the DuckDB backend, anomaly detection,
+forecasting, segmentation, exports) on datasets from src/generate_sample_data.py. Datasets are
+written once per size to data/.cache/bench and loaded through load_data.
+Module-level memos are cleared before every timed run, so timings are
+for a first view of new data. Run from the repository root:
+
+    python benchmarks/run_benchmarks.py run --sizes 10k 1m --output before.json
+    python benchmarks/run_benchmarks.py run --sizes 10k 1m --output after.json --only "filter.*" "kpis.*"
+    python benchmarks/run_benchmarks.py compare before.json after.json --threshold 0.15
+
+compare exits with status 1 if any benchmark got slower by more than the
+threshold (and by more than --min-delta seconds, to ignore timer noise).
+"""
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src import cube, customer_segmentation, filter_index, forecasting, kpis as kpis_module  # noqa: E402
+from src import anomaly_detection, retention, visuals  # noqa: E402
+from src.aggregation import compute_dashboard_aggregates  # noqa: E402
+from src.data_loader import MANIFEST_PATH, load_data  # noqa: E402
+from src.duckdb_backend import DuckDBSource, duckdb_available  # noqa: E402
+from src.exports import write_csv, write_parquet, write_xlsx  # noqa: E402
+from src.generate_sample_data import generate_sample_data  # noqa: E402
+from src.insights import generate_insight  # noqa: E402
+from src.model_cache import ModelCache  # noqa: E402
+from src.shared_cache import shared_cache  # noqa: E402
+
+DATA_DIR = os.path.join(ROOT, "data", ".cache", "bench")
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+DEFAULT_SIZES = ["10k", "1m", "10m"]
+# The Excel writer runs row by row; larger inputs are truncated to this.
+XLSX_MAX_ROWS = 100_000
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """
+    Register a benchmark.
+
+    The decorated function receives the dataset context and returns a
+    zero-argument callable, which is what gets timed, and the number of
+    rows that callable processes. Work done before returning is setup.
+    """
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def reset_memos():
+    """Forget every module-level memo so each run starts cold."""
+    shared_cache.clear()
+    forecasting._model_caches.clear()
+
+
+class Dataset:
+    """A generated dataset and the intermediate results benchmarks start from."""
+
+    def __init__(self, rows, seed=42, data_dir=DATA_DIR):
+        self.rows = rows
+        os.makedirs(data_dir, exist_ok=True)
+        self.path = os.path.join(data_dir, f"sales_{rows}_{seed}.csv")
+        if not os.path.exists(self.path):
+            print(f"  generating {rows:,} rows -> {self.path}", flush=True)
+            generate_sample_data(self.path, num_days=1095, num_rows=rows, seed=seed)
+        self.df = load_data(self.path)
+        self.tmp = tempfile.mkdtemp(prefix="bench-")
+
+        date_min = self.df['Date'].min()
+        # A typical narrowed view: one region, two products, one year
+        self.selection = (
+            ['Central'], ['Maize Seeds', 'Fertilizer'],
+            (date_min + pd.Timedelta(days=365)).date(), (date_min + pd.Timedelta(days=729)).date(),
+        )
+        self.all = (
+            list(self.df['Region'].unique()), list(self.df['Product'].unique()),
+            date_min.date(), self.df['Date'].max().date(),
+        )
+
+    def filtered(self):
+        return filter_index.get_filter_index(self.df).select(*self.selection)
+
+    def aggregates(self, grain="Daily"):
+        reset_memos()
+        cube_slice = cube.get_sales_cube(self.df).slice(*self.all)
+        return compute_dashboard_aggregates(cube_slice, self.df, grain=grain,
+                                            retention=retention.get_customer_retention(self.df))
+
+
+# ---------- load ----------
+@benchmark("load.parse_csv")
+def bench_load_parse(ds):
+    return lambda: load_data(ds.path, use_cache=False), ds.rows
+
+
+@benchmark("load.cached")
+def bench_load_cached(ds):
+    return lambda: load_data(ds.path), ds.rows
+
+
+@benchmark("load.append_partition")
+def bench_append_partition(ds):
+    # A partitioned directory holding all but the last day, already ingested
+    directory = os.path.join(ds.tmp, "partitions")
+    last_day = ds.df['Date'].max().normalize()
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+        ds.df[ds.df['Date'] < last_day].to_csv(os.path.join(directory, "history.csv"), index=False)
+    latest = os.path.join(directory, "latest.csv")
+    for path in (latest, os.path.join(directory, MANIFEST_PATH)):
+        if os.path.exists(path):
+            os.remove(path)
+    df = load_data(directory)
+    cube.get_sales_cube(df)
+    retention.get_customer_retention(df)
+    customer_segmentation.get_customer_feature_store(df)
+
+    # The last day arrives as a new partition
+    new_rows = ds.df[ds.df['Date'] >= last_day]
+    new_rows.to_csv(latest, index=False)
+
+    def run():
+        df = load_data(directory)
+        return (cube.get_sales_cube(df), retention.get_customer_retention(df),
+                customer_segmentation.get_customer_feature_store(df))
+    return run, len(new_rows)
+
+
+# ---------- filtering ----------
+@benchmark("filter.build_index")
+def bench_build_index(ds):
+    return lambda: filter_index.FilterIndex(ds.df), ds.rows
+
+
+@benchmark("filter.select")
+def bench_select(ds):
+    index = filter_index.get_filter_index(ds.df)
+    return lambda: index.select(*ds.selection), ds.rows
+
+
+@benchmark("filter.cube_slice")
+def bench_cube_slice(ds):
+    sales_cube = cube.get_sales_cube(ds.df)
+    return lambda: sales_cube.slice(*ds.selection), len(sales_cube.frame)
+
+
+# ---------- KPIs and aggregation ----------
+@benchmark("kpis.calculate_kpis")
+def bench_calculate_kpis(ds):
+    filtered = ds.filtered()
+    return lambda: kpis_module.calculate_kpis(filtered), len(filtered)
+
+
+@benchmark("kpis.prefix_sums")
+def bench_prefix_sums(ds):
+    sales_cube = cube.get_sales_cube(ds.df)
+
+    def run():
+        prefix = kpis_module.KpiPrefixSums(sales_cube)
+        return prefix.kpis(*ds.selection), prefix.comparison_kpis(*ds.selection)
+    return run, len(sales_cube.frame)
+
+
+@benchmark("aggregation.dashboard_daily")
+def bench_aggregates(ds):
+    filtered = ds.filtered()
+    cube_slice = cube.get_sales_cube(ds.df).slice(*ds.selection)
+    customers = retention.get_customer_retention(ds.df)
+    return lambda: compute_dashboard_aggregates(
+        cube_slice, filtered, grain="Daily", retention=customers, start_date=ds.selection[2]
+    ), len(filtered)
+
+
+@benchmark("retention.build")
+def bench_retention_build(ds):
+    return lambda: retention.CustomerRetention(ds.df), ds.rows
+
+
+@benchmark("retention.filtered_view")
+def bench_retention_view(ds):
+    filtered = ds.filtered()
+    customers = retention.get_customer_retention(ds.df)
+
+    def run():
+        positions = customers.positions(filtered)
+        return (customers.customer_mix(positions, ds.selection[2]), customers.churn_summary(positions),
+                customers.cohort_matrix(positions), customers.lifetime_value(positions))
+    return run, len(filtered)
+
+
+@benchmark("insights.generate_insight")
+def bench_insight(ds):
+    region_sales = ds.aggregates().region_sales
+    return lambda: generate_insight(region_sales), len(region_sales)
+
+
+# ---------- charts ----------
+def _chart(builder, pick):
+    def bench(ds):
+        data = pick(ds)
+        return lambda: builder(*data).to_json(), len(data[0])
+    return bench
+
+
+for _name, _builder, _pick in [
+    ("sales_by_region", visuals.sales_by_region, lambda ds: (ds.aggregates().region_sales,)),
+    ("age_distribution", visuals.age_distribution, lambda ds: (ds.aggregates().age_counts,)),
+    ("gender_pie", visuals.gender_pie, lambda ds: (ds.aggregates().gender_counts,)),
+    ("sales_by_product", visuals.sales_by_product, lambda ds: (ds.aggregates().product_sales,)),
+    ("sales_profit_over_time", visuals.sales_profit_over_time,
+     lambda ds: (ds.aggregates().time_series, "Daily")),
+    ("sales_anomaly_chart", visuals.sales_anomaly_chart,
+     lambda ds: (ds.df, ds.df.nlargest(20, 'Sales'))),
+    ("segment_scatter", visuals.segment_scatter,
+     lambda ds: (customer_segmentation.get_customer_feature_store(ds.df).features().assign(
+         Segment=lambda f: (f['Customer ID'] % 3).astype(str)),)),
+]:
+    benchmark(f"visuals.{_name}")(_chart(_builder, _pick))
+
+
+# ---------- DuckDB backend (when installed) ----------
+if duckdb_available():
+    @benchmark("duckdb.dashboard_aggregates")
+    def bench_duckdb_aggregates(ds):
+        # A new source per run, so the view and retention scans are not cached
+        return lambda: DuckDBSource(ds.path).dashboard_aggregates(*ds.selection), ds.rows
+
+    @benchmark("duckdb.view")
+    def bench_duckdb_view(ds):
+        return lambda: DuckDBSource(ds.path).view(*ds.selection), ds.rows
+
+
+# ---------- models ----------
+@benchmark("models.detect_sales_anomalies")
+def bench_isolation_forest(ds):
+    return lambda: anomaly_detection.detect_sales_anomalies(ds.df), ds.rows
+
+
+@benchmark("models.scan_panel_anomalies")
+def bench_panel_scan(ds):
+    reset_memos()
+    cube.get_sales_cube(ds.df)
+    return lambda: anomaly_detection.scan_panel_anomalies(ds.df, grain="Daily"), ds.rows
+
+
+def _forecast(backend):
+    def bench(ds):
+        reset_memos()
+        # A throwaway cache directory, so the model is really fitted
+        directory = tempfile.mkdtemp(dir=ds.tmp)
+        if backend == "prophet":
+            from prophet.serialize import model_from_json, model_to_json
+            cache = ModelCache(dumps=model_to_json, loads=model_from_json, directory=directory)
+        else:
+            cache = ModelCache(dumps=forecasting.FourierModel.to_json,
+                               loads=forecasting.FourierModel.from_json, directory=directory)
+        forecasting._model_caches[backend] = cache
+        return lambda: forecasting.forecast_sales(ds.df, periods=90, backend=backend), ds.rows
+    return bench
+
+
+benchmark("models.forecast_sales_fourier")(_forecast("fourier"))
+benchmark("models.forecast_sales_prophet")(_forecast("prophet"))
+
+
+@benchmark("models.segment_customers")
+def bench_segmentation(ds):
+    return lambda: customer_segmentation.segment_customers(ds.df), ds.rows
+
+
+# ---------- exports ----------
+@benchmark("export.csv")
+def bench_export_csv(ds):
+    path = os.path.join(ds.tmp, "export.csv")
+
+    def run():
+        with open(path, "wb") as f:
+            write_csv(ds.df, f)
+    return run, ds.rows
+
+
+@benchmark("export.parquet")
+def bench_export_parquet(ds):
+    return lambda: write_parquet(ds.df, os.path.join(ds.tmp, "export.parquet")), ds.rows
+
+
+@benchmark("export.xlsx")
+def bench_export_xlsx(ds):
+    rows = ds.df.iloc[:XLSX_MAX_ROWS]
+    summaries = {"Products": ds.aggregates().product_sales}
+    return lambda: write_xlsx(rows, os.path.join(ds.tmp, "export.xlsx"), summaries), len(rows)
+
+
+def run_benchmarks(sizes, patterns, repeat, seed):
+    results = []
+    for size in sizes:
+        rows = SIZES[size]
+        print(f"dataset {size} ({rows:,} rows)", flush=True)
+        ds = Dataset(rows, seed=seed)
+        for name, bench in BENCHMARKS.items():
+            if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+                continue
+            timings = []
+            for _ in range(repeat):
+                reset_memos()
+                fn, processed = bench(ds)
+                start = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - start)
+            results.append({
+                "benchmark": name, "dataset": size, "dataset_rows": rows, "rows": int(processed),
+                "min_s": min(timings), "median_s": statistics.median(timings), "runs_s": timings,
+            })
+            print(f"  {name:<40}{min(timings):>10.4f} s  ({processed:,} rows)", flush=True)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(baseline, candidate, threshold, min_delta):
+    """Print a comparison table; return the number of regressions."""
+    base = {(r["benchmark"], r["dataset"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"{'benchmark':<40}{'dataset':>8}{'before s':>12}{'after s':>12}{'change':>10}  status")
+    for result in candidate["results"]:
+        key = (result["benchmark"], result["dataset"])
+        before = base.pop(key, None)
+        after_s = result["min_s"]
+        if before is None:
+            print(f"{key[0]:<40}{key[1]:>8}{'-':>12}{after_s:>12.4f}{'':>10}  new")
+            continue
+        before_s = before["min_s"]
+        change = (after_s - before_s) / before_s if before_s else 0.0
+        status = "ok"
+        if change > threshold and after_s - before_s > min_delta:
+            status = "REGRESSION"
+            regressions += 1
+        elif change < -threshold and before_s - after_s > min_delta:
+            status = "faster"
+        print(f"{key[0]:<40}{key[1]:>8}{before_s:>12.4f}{after_s:>12.4f}{change:>+10.1%}  {status}")
+    for (name, dataset), before in base.items():
+        print(f"{name:<40}{dataset:>8}{before['min_s']:>12.4f}{'-':>12}{'':>10}  missing")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard benchmark suite.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run benchmarks and write JSON results.")
+    run.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, choices=list(SIZES))
+    run.add_argument("--only", nargs="*", default=[], help="Glob patterns of benchmark names to run.")
+    run.add_argument("--skip-prophet", action="store_true", help="Skip the Prophet forecast benchmark.")
+    run.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark; the fastest is compared.")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--output", default=None, help="Write results to this JSON file.")
+    run.add_argument("--list", action="store_true", help="List benchmark names and exit.")
+
+    cmp = commands.add_parser("compare", help="Compare two result files.")
+    cmp.add_argument("baseline")
+    cmp.add_argument("candidate")
+    cmp.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown flagged as a regression.")
+    cmp.add_argument("--min-delta", type=float, default=0.005, help="Ignore changes smaller than this (seconds).")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+        regressions = compare(baseline, candidate, args.threshold, args.min_delta)
+        if regressions:
+            print(f"\n{regressions} regression(s) over {args.threshold:.0%}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return 0
+    if args.skip_prophet:
+        BENCHMARKS.pop("models.forecast_sales_prophet")
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    results = run_benchmarks(args.sizes, args.only, args.repeat, args.seed)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+from dataclasses import dataclass
+
+import pandas as pd
+
+from src.cube import CUBE_MEASURES, time_series
+from src.kpis import calculate_kpis
+from src.perf import timed
+from src.retention import CHURN_WINDOW_DAYS, get_customer_retention
+
+
+@dataclass
+class DashboardAggregates:
+    """Every figure the dashboard page shows, computed once per rerun."""
+
+    kpis: dict
+    region_sales: pd.DataFrame
+    product_sales: pd.DataFrame
+    time_series: pd.DataFrame
+    gender_counts: pd.DataFrame
+    age_counts: pd.DataFrame
+    new_vs_repeat: pd.Series
+    churned_customers: int
+    churn_summary: pd.DataFrame
+    cohort_retention: pd.DataFrame
+    lifetime_value: pd.DataFrame
+
+
+@timed("aggregation.dashboard")
+def compute_dashboard_aggregates(cube_slice, filtered_df, grain="Daily", kpis=None, retention=None,
+                                 start_date=None, churn_window_days=CHURN_WINDOW_DAYS):
+    """
+    Compute all dashboard aggregates in one pass over each input.
+
+    Sales/Profit figures are rolled up from a single Region x Product
+    grouping of the cube slice; demographics come from a single
+    Gender x Age grouping of the raw rows. Customer figures read the
+    dataset's precomputed CustomerRetention tables for the customers in
+    the filtered rows.
+
+    Args:
+        cube_slice (pd.DataFrame): Rows returned by SalesCube.slice.
+        filtered_df (pd.DataFrame): Filtered raw transactions.
+        grain (str): Time series grain ("Daily", "Weekly" or "Monthly").
+        kpis (dict, optional): Precomputed KPIs, e.g. from KpiPrefixSums.
+        retention (CustomerRetention, optional): Built from the full dataset,
+            so that "new" and "churned" reflect each customer's whole
+            history. Defaults to one built from ``filtered_df``.
+        start_date (date-like, optional): First day of the view; customers
+            whose first purchase is on or after it count as new. Defaults
+            to the earliest filtered date.
+        churn_window_days (int): Days without a purchase before a customer
+            counts as churned.
+
+    Returns:
+        DashboardAggregates: Results consumed by the chart builders.
+    """
+    demographics = filtered_df.groupby(
+        ["Customer Gender", "Customer Age"], observed=True
+    ).size().rename("Count")
+
+    if retention is None:
+        retention = get_customer_retention(filtered_df)
+    if start_date is None:
+        start_date = filtered_df["Date"].min() if not filtered_df.empty else pd.Timestamp.min
+
+    customers = customer_measures(retention, retention.positions(filtered_df), start_date, churn_window_days)
+    return build_dashboard_aggregates(cube_slice, demographics, customers, grain=grain, kpis=kpis)
+
+
+def customer_measures(retention, customers, start_date, churn_window_days=CHURN_WINDOW_DAYS):
+    """
+    The customer figures of DashboardAggregates, from a dataset's retention tables.
+
+    Args:
+        retention (CustomerRetention): Per-customer tables of the dataset.
+        customers (np.ndarray): Positions in ``retention`` of the customers in view.
+        start_date (date-like): First day of the view.
+        churn_window_days (int): Churn window in days.
+
+    Returns:
+        dict: 'new_vs_repeat', 'churned_customers', 'churn_summary',
+        'cohort_retention' and 'lifetime_value'.
+    """
+    return {
+        "new_vs_repeat": retention.customer_mix(customers, start_date),
+        "churned_customers": int(retention.churned(customers, churn_window_days).sum()),
+        "churn_summary": retention.churn_summary(customers),
+        "cohort_retention": retention.cohort_matrix(customers),
+        "lifetime_value": retention.lifetime_value(customers, window_days=churn_window_days),
+    }
+
+
+def build_dashboard_aggregates(cube_slice, demographics, customers, grain="Daily", kpis=None):
+    """
+    Assemble DashboardAggregates from already-reduced inputs.
+
+    Shared by compute_dashboard_aggregates() and query backends that
+    compute the inputs elsewhere (see src/duckdb_backend.py); nothing here
+    touches raw transactions.
+
+    Args:
+        cube_slice (pd.DataFrame): Date, Region, Product and CUBE_MEASURES,
+            one row per day and pair.
+        demographics (pd.Series): Transaction counts indexed by
+            (Customer Gender, Customer Age).
+        customers (dict): Customer figures, as returned by customer_measures().
+        grain (str): Time series grain.
+        kpis (dict, optional): Precomputed KPIs.
+
+    Returns:
+        DashboardAggregates
+    """
+    pairs = cube_slice.groupby(["Region", "Product"], observed=True)[CUBE_MEASURES].sum()
+    region_sales = pairs.groupby(level="Region", observed=True)[CUBE_MEASURES].sum().reset_index()
+    product_sales = pairs.groupby(level="Product", observed=True)[CUBE_MEASURES].sum().reset_index()
+
+    gender_counts = (
+        demographics.groupby(level="Customer Gender", observed=True).sum()
+        .sort_values(ascending=False).reset_index()
+    )
+    age_counts = demographics.reset_index()
+
+    return DashboardAggregates(
+        kpis=kpis if kpis is not None else calculate_kpis(pairs),
+        region_sales=region_sales,
+        product_sales=product_sales,
+        time_series=time_series(cube_slice, grain),
+        gender_counts=gender_counts,
+        age_counts=age_counts,
+        **customers,
+    )
@@ -1,17 +1,315 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
 import pandas as pd
-from sklearn.ensemble import IsolationForest
 
+from src.cube import TIME_GRAINS, get_sales_cube
+from src.data_loader import appended_rows, dataset_fingerprint, dataset_source
+from src.model_cache import DEFAULT_CACHE_DIR
+from src.perf import timed
+from src.shared_cache import shared_cache
+
+STATE_DIR = os.path.join(os.path.dirname(DEFAULT_CACHE_DIR), "anomaly_state")
+_MAX_STORED_ANOMALIES = 1000
+
+# Series levels scanned by scan_panel_anomalies, and the columns defining each.
+PANEL_LEVELS = {
+    "Region": ["Region"],
+    "Product": ["Product"],
+    "Region x Product": ["Region", "Product"],
+}
+# Scale factor turning a median absolute deviation into a standard deviation.
+_MAD_SCALE = 1.4826
+# Default trailing baseline length, in periods, for each time grain.
+SCAN_WINDOWS = {"Daily": 28, "Weekly": 8, "Monthly": 6}
+_SCAN_CHUNK_SERIES = 256
+
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+
+@timed("anomaly.isolation_forest")
 def detect_sales_anomalies(df, contamination=0.05):
     """
     Detect anomalies in sales data using Isolation Forest.
     Assumes df has columns: 'Date', 'Sales'.
     Returns df with an additional 'Anomaly' boolean column.
     """
+    from sklearn.ensemble import IsolationForest  # slow import; only batch mode needs it
+
     if df.empty or 'Sales' not in df.columns:
         raise ValueError("DataFrame must contain 'Sales' column and not be empty.")
 
-    df_sorted = df.sort_values('Date').copy()
+    # sort_values already returns a new frame, so the flag can be added to it directly
+    df_sorted = df.sort_values('Date')
     model = IsolationForest(contamination=contamination, random_state=42)
-    df_sorted['Anomaly'] = model.fit_predict(df_sorted[['Sales']])
-    df_sorted['Anomaly'] = df_sorted['Anomaly'] == -1
+    df_sorted['Anomaly'] = model.fit_predict(df_sorted[['Sales']]) == -1
     return df_sorted
+
+
+class StreamingAnomalyDetector:
+    """
+    Incremental Sales anomaly detector with an EWMA baseline per series.
+
+    For every series (all rows, or one per value of the ``by`` columns) the
+    detector keeps an exponentially weighted mean and mean of squares of
+    transaction Sales. When update() is given a dataset appended to the one
+    it last processed (see data_loader.appended_rows) it scores only the
+    appended rows against that baseline, then folds them into it, so the
+    cost depends on the new data rather than on the history. Any other
+    dataset rebuilds the state from scratch. State, including the flagged
+    anomalies, is persisted as JSON between runs.
+    """
+
+    def __init__(self, state_path, by=(), alpha=0.05, threshold=3.5, warmup=10):
+        self.state_path = state_path
+        self.by = list(by)
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self._lock = threading.Lock()
+        self.reset()
+        self._load()
+
+    def reset(self):
+        """Forget all series state and flagged anomalies."""
+        self.fingerprint = None
+        self.watermark = None
+        self.series = {}
+        self.anomalies = pd.DataFrame(columns=['Date'] + self.by + ['Sales', 'Score'])
+
+    def _load(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get('by') != self.by or state.get('alpha') != self.alpha:
+            return
+        self.fingerprint = state.get('fingerprint')
+        self.watermark = pd.Timestamp(state['watermark']) if state.get('watermark') else None
+        self.series = {tuple(json.loads(k)): v for k, v in state['series'].items()}
+        anomalies = pd.DataFrame(state['anomalies'], columns=self.anomalies.columns)
+        anomalies['Date'] = pd.to_datetime(anomalies['Date'])
+        self.anomalies = anomalies
+
+    def _save(self):
+        anomalies = self.anomalies.tail(_MAX_STORED_ANOMALIES).copy()
+        anomalies['Date'] = anomalies['Date'].astype(str)
+        state = {
+            'by': self.by,
+            'alpha': self.alpha,
+            'fingerprint': self.fingerprint,
+            'watermark': str(self.watermark) if self.watermark is not None else None,
+            'series': {json.dumps(list(k), default=str): v for k, v in self.series.items()},
+            'anomalies': anomalies.to_dict('records'),
+        }
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            with open(self.state_path + '.tmp', 'w') as f:
+                json.dump(state, f, default=str)
+            os.replace(self.state_path + '.tmp', self.state_path)
+        except OSError as e:
+            print(f"Could not save anomaly detector state {self.state_path}: {e}")
+
+    def _update_day(self, keys, codes, values):
+        """Score one day's rows against the current state, then fold them in."""
+        state = np.array([self.series.get(k, [0.0, 0.0, 0]) for k in keys], dtype=float)
+        mean, sq, count = state[:, 0], state[:, 1], state[:, 2]
+
+        std = np.sqrt(np.maximum(sq - mean ** 2, 0.0))
+        std = np.where(std > 0, std, np.nan)
+        scores = (values - mean[codes]) / std[codes]
+        scores[count[codes] < self.warmup] = np.nan
+
+        # Closed-form EWMA over each series' rows in arrival order: the j-th
+        # of n rows gets weight alpha * (1 - alpha) ** (n - 1 - j).
+        n = np.bincount(codes, minlength=len(keys))
+        order = np.argsort(codes, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+        position = np.empty(len(codes), dtype=np.int64)
+        position[order] = np.arange(len(codes)) - starts[codes[order]]
+        weights = self.alpha * (1 - self.alpha) ** (n[codes] - 1 - position)
+        decay = (1 - self.alpha) ** n
+        new_mean = decay * mean + np.bincount(codes, weights * values, len(keys))
+        new_sq = decay * sq + np.bincount(codes, weights * values ** 2, len(keys))
+        # A series seen for the first time starts from its plain average.
+        fresh = (count == 0) & (n > 0)
+        new_mean[fresh] = np.bincount(codes, values, len(keys))[fresh] / n[fresh]
+        new_sq[fresh] = np.bincount(codes, values ** 2, len(keys))[fresh] / n[fresh]
+
+        for i, key in enumerate(keys):
+            if n[i]:
+                self.series[key] = [float(new_mean[i]), float(new_sq[i]), int(count[i] + n[i])]
+        return scores
+
+    @timed("anomaly.streaming_update")
+    def update(self, df):
+        """
+        Score the rows of ``df`` not yet folded into the baseline.
+
+        Only rows appended to the dataset processed last are new, whatever
+        their dates. When ``df`` does not extend that dataset (a different
+        or edited source) the state is rebuilt from all of its rows.
+
+        Returns:
+            pd.DataFrame: The newly scored rows with 'Score' and 'Anomaly' columns.
+        """
+        with self._lock:
+            fingerprint = dataset_fingerprint(df)
+            if fingerprint == self.fingerprint:
+                new = df.iloc[:0]
+            else:
+                appended = appended_rows(df)
+                if appended is not None and self.fingerprint is not None and appended[0] == self.fingerprint:
+                    new = appended[1]
+                else:
+                    self.reset()
+                    new = df
+                self.fingerprint = fingerprint
+                if new.empty:
+                    self._save()
+            if new.empty:
+                return new.assign(Score=pd.Series(dtype=float), Anomaly=pd.Series(dtype=bool))
+
+            new = new.sort_values('Date', kind='stable')
+            if self.by:
+                codes, uniques = pd.MultiIndex.from_frame(new[self.by]).factorize()
+                keys = [tuple(u) for u in uniques]
+            else:
+                codes, keys = np.zeros(len(new), dtype=np.int64), [()]
+            values = new['Sales'].to_numpy(dtype=float)
+            days = new['Date'].dt.normalize().to_numpy()
+            bounds = np.flatnonzero(np.diff(days.astype('datetime64[ns]').astype(np.int64))) + 1
+            bounds = np.concatenate(([0], bounds, [len(new)]))
+
+            scores = np.empty(len(new))
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                scores[lo:hi] = self._update_day(keys, codes[lo:hi], values[lo:hi])
+
+            scored = new.assign(Score=scores, Anomaly=np.abs(np.nan_to_num(scores)) > self.threshold)
+            flagged = scored.loc[scored['Anomaly'], ['Date'] + self.by + ['Sales', 'Score']]
+            if not flagged.empty:
+                self.anomalies = pd.concat([self.anomalies, flagged], ignore_index=True)
+            self.watermark = max(new['Date'].max(), self.watermark or pd.Timestamp.min)
+            self._save()
+            return scored
+
+
+def get_streaming_detector(df, by=(), **kwargs):
+    """
+    Return the process-wide StreamingAnomalyDetector for a dataset's source.
+
+    The detector persists its state under STATE_DIR, keyed on the dataset
+    source and the series columns, so it survives reruns, sessions and
+    restarts and picks up from the last processed day.
+    """
+    key = hashlib.sha256(json.dumps([dataset_source(df), list(by)]).encode()).hexdigest()[:32]
+    with _detectors_lock:
+        if key not in _detectors:
+            path = os.path.join(STATE_DIR, f"{key}.json")
+            _detectors[key] = StreamingAnomalyDetector(path, by=by, **kwargs)
+        return _detectors[key]
+
+
+def _robust_scores(matrix, window):
+    """
+    Score every point of a (series x period) matrix against its trailing window.
+
+    Each point is compared with the median and MAD of the ``window`` periods
+    before it, for all series at once. The first ``window`` periods of each
+    series have no baseline and score NaN.
+    """
+    n_series, n_periods = matrix.shape
+    scores = np.full(matrix.shape, np.nan)
+    baseline = np.full(matrix.shape, np.nan)
+    if n_periods <= window:
+        return scores, baseline
+    # Chunk over series so the window copies made by np.median stay bounded.
+    for lo in range(0, n_series, _SCAN_CHUNK_SERIES):
+        block = matrix[lo:lo + _SCAN_CHUNK_SERIES]
+        windows = np.lib.stride_tricks.sliding_window_view(block, window, axis=1)[:, :-1]
+        median = np.median(windows, axis=2)
+        mad = np.median(np.abs(windows - median[:, :, None]), axis=2) * _MAD_SCALE
+        current = block[:, window:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = (current - median) / mad
+        score[mad == 0] = np.nan
+        scores[lo:lo + _SCAN_CHUNK_SERIES, window:] = score
+        baseline[lo:lo + _SCAN_CHUNK_SERIES, window:] = median
+    return scores, baseline
+
+
+@timed("anomaly.panel_scan")
+def scan_panel_anomalies(df, grain="Daily", levels=tuple(PANEL_LEVELS), window=None, threshold=3.5):
+    """
+    Score Sales of every Region, Product and Region x Product series at once.
+
+    Sales are rolled up from the dataset's SalesCube to the requested time
+    grain, laid out as a (series x period) matrix per level, and scored with
+    a trailing robust z-score (median / MAD over the previous ``window``
+    periods). The scan is memoized per dataset and parameters, so filtering
+    its result costs no refit.
+
+    Args:
+        df (pd.DataFrame): Transactions with 'Date', 'Region', 'Product' and 'Sales'.
+        grain (str): One of TIME_GRAINS ("Daily", "Weekly", "Monthly").
+        levels (tuple): Keys of PANEL_LEVELS to scan.
+        window (int, optional): Number of trailing periods forming each
+            baseline; defaults to SCAN_WINDOWS[grain].
+        threshold (float): Absolute score above which a point is an anomaly.
+
+    Returns:
+        pd.DataFrame: One row per series and period with 'Level', 'Series',
+        'Region', 'Product', 'Date', 'Sales', 'Baseline', 'Score' and
+        'Anomaly', sorted so the strongest anomalies come first.
+    """
+    window = window or SCAN_WINDOWS[grain]
+    key = (dataset_fingerprint(df), grain, tuple(levels), window, threshold)
+    return shared_cache.get_or_create(
+        "anomaly_scans", key, lambda: _scan_panel(df, grain, levels, window, threshold)
+    )
+
+
+def _scan_panel(df, grain, levels, window, threshold):
+    cube = get_sales_cube(df).frame
+    rule = TIME_GRAINS[grain]
+    frames = []
+    for level in levels:
+        columns = PANEL_LEVELS[level]
+        totals = cube.groupby(columns + [pd.Grouper(key="Date", freq=rule)], observed=True)["Sales"].sum()
+        matrix = totals.unstack("Date", fill_value=0)
+        if matrix.empty:
+            continue
+        # Periods with no sales in any series are still part of the timeline.
+        matrix = matrix.reindex(
+            columns=pd.date_range(matrix.columns.min(), matrix.columns.max(), freq=rule), fill_value=0
+        )
+        values = matrix.to_numpy(dtype=float)
+        scores, baseline = _robust_scores(values, window)
+
+        index = matrix.index.to_frame(index=False)
+        n_series, n_periods = values.shape
+        result = pd.DataFrame({
+            "Level": level,
+            "Region": np.repeat(index["Region"].to_numpy(), n_periods) if "Region" in index else "All",
+            "Product": np.repeat(index["Product"].to_numpy(), n_periods) if "Product" in index else "All",
+            "Date": np.tile(matrix.columns.to_numpy(), n_series),
+            "Sales": values.ravel(),
+            "Baseline": baseline.ravel(),
+            "Score": scores.ravel(),
+        })
+        result["Series"] = (
+            index[columns].astype(str).agg(" · ".join, axis=1).to_numpy().repeat(n_periods)
+        )
+        frames.append(result)
+
+    columns = ["Level", "Series", "Region", "Product", "Date", "Sales", "Baseline", "Score"]
+    table = pd.concat(frames, ignore_index=True)[columns] if frames else pd.DataFrame(columns=columns)
+    table["Anomaly"] = table["Score"].abs() > threshold
+    table = table.sort_values("Score", key=lambda s: s.abs(), ascending=False, na_position="last",
+                              ignore_index=True)
+    return table
@@ -1,21 +1,182 @@
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
 
-def segment_customers(df, n_clusters=3):
+from src.data_loader import appended_rows, dataset_fingerprint, union_categories, widen_integers
+from src.perf import timed
+from src.shared_cache import shared_cache
+
+FEATURE_COLUMNS = ['Recency', 'Frequency', 'Monetary', 'Tenure', 'Customer Age']
+# Heavy-tailed features are log-scaled before clustering.
+LOG_FEATURES = ['Frequency', 'Monetary']
+
+
+def _dominant(counts):
+    """Most frequent value per customer from a (Customer ID, value) -> count Series."""
+    top = counts.sort_values(ascending=False, kind='stable')
+    top = top[~top.index.get_level_values(0).duplicated()]
+    return pd.Series(top.index.get_level_values(1), index=top.index.get_level_values(0))
+
+
+def _summarize(df):
+    """Per-customer aggregates of a batch of transactions, in vectorized groupbys."""
+    df = df.sort_values('Date', kind='stable')
+    grouped = df.groupby('Customer ID', sort=False)
+    customers = grouped.agg(**{
+        'First Purchase': ('Date', 'min'),
+        'Last Purchase': ('Date', 'max'),
+        'Frequency': ('Date', 'size'),
+        'Monetary': ('Sales', 'sum'),
+        'Customer Age': ('Customer Age', 'last'),
+        'Customer Gender': ('Customer Gender', 'last'),
+    })
+    # CustomerFeatureStore.appended adds to these sums, which must not keep a narrow integer type
+    customers = widen_integers(customers, ['Monetary'])
+    product_counts = df.groupby(['Customer ID', 'Product'], observed=True).size()
+    region_counts = df.groupby(['Customer ID', 'Region'], observed=True).size()
+    return customers, product_counts, region_counts
+
+
+class CustomerFeatureStore:
     """
-    Cluster customers based on Age and Sales.
-    Returns dataframe with a 'Segment' column added.
+    Per-customer RFM feature table, maintained incrementally.
+
+    Holds each customer's first and last purchase, order count, total
+    spend, latest age and gender, plus per-customer Product and Region
+    counts from which the dominant product and region are derived.
+    appended() folds in new transactions, recomputing only the customers
+    they mention. Stores are shared between sessions, so they are never
+    modified once built.
+    """
+
+    def __init__(self, df):
+        self.customers, self.product_counts, self.region_counts = _summarize(df)
+        self.customers['Dominant Product'] = _dominant(self.product_counts)
+        self.customers['Dominant Region'] = _dominant(self.region_counts)
+        self.as_of = df['Date'].max()
+
+    @timed("segmentation.feature_store_append")
+    def appended(self, new_rows):
+        """Return the store for this data plus ``new_rows``, leaving this one unchanged."""
+        if new_rows.empty:
+            return self
+        batch, product_counts, region_counts = _summarize(new_rows)
+        store = CustomerFeatureStore.__new__(CustomerFeatureStore)
+        store.product_counts = self.product_counts.add(product_counts, fill_value=0)
+        store.region_counts = self.region_counts.add(region_counts, fill_value=0)
+        touched = batch.index
+        batch['Dominant Product'] = _dominant(
+            store.product_counts[store.product_counts.index.get_level_values(0).isin(touched)]).astype('category')
+        batch['Dominant Region'] = _dominant(
+            store.region_counts[store.region_counts.index.get_level_values(0).isin(touched)]).astype('category')
+
+        # New rows can bring gender, product or region values the table has no category for
+        customers, batch = union_categories([self.customers, batch])
+        store.customers = customers.copy()
+        # Keeps first-purchase order, as a store built from scratch has it
+        is_known = batch.index.isin(store.customers.index)
+        known, unknown = batch.index[is_known], batch.index[~is_known]
+
+        if len(known):
+            old = store.customers.loc[known]
+            new = batch.loc[known]
+            updated = pd.DataFrame({
+                'First Purchase': old['First Purchase'].where(
+                    old['First Purchase'] <= new['First Purchase'], new['First Purchase']),
+                'Last Purchase': old['Last Purchase'].where(
+                    old['Last Purchase'] >= new['Last Purchase'], new['Last Purchase']),
+                'Frequency': old['Frequency'] + new['Frequency'],
+                'Monetary': old['Monetary'] + new['Monetary'],
+                'Customer Age': new['Customer Age'],
+                'Customer Gender': new['Customer Gender'],
+                'Dominant Product': new['Dominant Product'],
+                'Dominant Region': new['Dominant Region'],
+            })
+            store.customers.loc[known, updated.columns] = updated
+        if len(unknown):
+            store.customers = pd.concat([store.customers, batch.loc[unknown]])
+        store.as_of = max(self.as_of, new_rows['Date'].max())
+        return store
+
+    def features(self):
+        """
+        Return the customer feature table.
+
+        Returns:
+            pd.DataFrame: One row per customer with 'Customer ID', FEATURE_COLUMNS,
+            'Customer Gender', 'Dominant Product' and 'Dominant Region'.
+        """
+        customers = self.customers
+        features = pd.DataFrame({
+            'Recency': (self.as_of - customers['Last Purchase']).dt.days,
+            'Frequency': customers['Frequency'],
+            'Monetary': customers['Monetary'],
+            'Tenure': (customers['Last Purchase'] - customers['First Purchase']).dt.days,
+            'Customer Age': customers['Customer Age'],
+            'Customer Gender': customers['Customer Gender'],
+            'Dominant Product': customers['Dominant Product'],
+            'Dominant Region': customers['Dominant Region'],
+        }, index=customers.index)
+        return features.rename_axis('Customer ID').reset_index()
+
+
+@timed("segmentation.feature_store")
+def get_customer_feature_store(df):
+    """
+    Return the CustomerFeatureStore for a dataset, building it once per fingerprint.
+
+    A dataset appended to one whose store is cached (see
+    data_loader.appended_rows) extends that store with the new rows; any
+    other dataset, including an edited version of the same source, gets a
+    store built from scratch.
+    """
+    return shared_cache.get_or_create(
+        "customer_features", dataset_fingerprint(df), lambda: _build_feature_store(df)
+    )
+
+
+def _build_feature_store(df):
+    appended = appended_rows(df)
+    if appended is not None:
+        parent = shared_cache.get("customer_features", appended[0])
+        if parent is not None:
+            return parent.appended(appended[1])
+    return CustomerFeatureStore(df)
+
+
+@timed("segmentation.segment_customers")
+def segment_customers(df, n_clusters=3, batch_size=4096):
+    """
+    Cluster customers on their RFM features with MiniBatchKMeans.
+
+    Each customer appears once, described by recency, frequency, monetary
+    value, tenure and age, so segmentation cost grows with the number of
+    customers rather than transactions, and MiniBatchKMeans keeps memory
+    bounded by the batch size.
+
+    Args:
+        df (pd.DataFrame): Transactions with 'Customer ID', 'Date', 'Sales',
+            'Customer Age', 'Customer Gender', 'Product' and 'Region'.
+        n_clusters (int): Number of segments.
+        batch_size (int): Customers per MiniBatchKMeans step.
+
+    Returns:
+        pd.DataFrame: The customer feature table with a 'Segment' column added.
     """
     # Ensure required columns exist
     if 'Customer Age' not in df.columns or 'Sales' not in df.columns:
         raise ValueError("DataFrame must contain 'Customer Age' and 'Sales' columns.")
 
-    features = df[['Customer Age', 'Sales']].copy()
-    scaler = StandardScaler()
-    features_scaled = scaler.fit_transform(features)
+    # Deferred: scikit-learn takes over a second to import.
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.preprocessing import StandardScaler
+
+    features = get_customer_feature_store(df).features()
+    X = features[FEATURE_COLUMNS].to_numpy(dtype=float, copy=True)
+    log_idx = [FEATURE_COLUMNS.index(col) for col in LOG_FEATURES]
+    X[:, log_idx] = np.log1p(np.clip(X[:, log_idx], 0, None))
+    X = StandardScaler().fit_transform(X)
 
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    df = df.copy()
-    df['Segment'] = kmeans.fit_predict(features_scaled)
-    return df
+    n_clusters = min(n_clusters, len(features))
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=batch_size, n_init=3)
+    features['Segment'] = kmeans.fit_predict(X)
+    return features
@@ -1,13 +1,15 @@
 # src/dashboard.py
 
 import streamlit as st
-from src.data_loader import load_data
-from src.kpis import calculate_kpis
-from src.visuals import sales_by_region, age_distribution, gender_pie
+from src.data_loader import dataset_fingerprint, load_data
+from src.filter_index import get_filter_index
+from src.cube import get_sales_cube
+from src.aggregation import compute_dashboard_aggregates
+from src.retention import get_customer_retention
+from src.visuals import cached_figure, sales_by_region, age_distribution, gender_pie
 from src.insights import generate_insight
-from src.ui import inject_css, render_kpis, section_header
-import io
-import pandas as pd
+from src.exports import dashboard_summaries
+from src.ui import inject_css, render_export, render_kpis, section_header
 
 
 def run_dashboard():
@@ -41,75 +43,50 @@ def run_dashboard():
         selected_products = st.multiselect("Filter by Product", products, default=list(products))
         date_range = st.date_input("Date Range", [date_min, date_max])
 
-    filtered_df = df[
-        (df['Region'].isin(selected_regions)) &
-        (df['Product'].isin(selected_products)) &
-        (df['Date'] >= pd.to_datetime(date_range[0])) &
-        (df['Date'] <= pd.to_datetime(date_range[1]))
-    ]
+    cube_df = get_sales_cube(df).slice(selected_regions, selected_products, date_range[0], date_range[-1])
+    filtered_df = get_filter_index(df).select(
+        selected_regions, selected_products, date_range[0], date_range[-1]
+    )
+
+    aggregates = compute_dashboard_aggregates(
+        cube_df, filtered_df, retention=get_customer_retention(df), start_date=date_range[0]
+    )
 
     # KPIs
     section_header("Key Performance Indicators")
-    render_kpis(calculate_kpis(filtered_df))
+    render_kpis(aggregates.kpis)
     st.markdown("---")
 
     # Regional Sales and Gender Distribution side by side
     section_header("Regional Sales & Gender Distribution")
     col1, col2 = st.columns([1.2, 1])
     with col1:
-        fig_region = sales_by_region(filtered_df)
-        fig_region.update_layout(
-            autosize=False,
-            width=520, height=340,
-            margin=dict(l=10, r=10, t=40, b=10),
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            font=dict(color="#222")
-        )
+        fig_region = cached_figure(sales_by_region, aggregates.region_sales, width=520, height=340)
         st.plotly_chart(fig_region, use_container_width=False)
     with col2:
-        fig_gender = gender_pie(filtered_df)
-        fig_gender.update_layout(
-            autosize=False,
-            width=340, height=340,
-            margin=dict(l=10, r=10, t=40, b=10),
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            font=dict(color="#222")
-        )
+        fig_gender = cached_figure(gender_pie, aggregates.gender_counts, width=340, height=340)
         st.plotly_chart(fig_gender, use_container_width=False)
     st.markdown("---")
 
     # Customer Age Distribution
     section_header("Customer Age Distribution")
-    fig_age = age_distribution(filtered_df)
-    fig_age.update_layout(
-        autosize=False,
-        width=860, height=320,
-        margin=dict(l=10, r=10, t=40, b=10),
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        font=dict(color="#222")
-    )
+    fig_age = cached_figure(age_distribution, aggregates.age_counts, width=860, height=320)
     st.plotly_chart(fig_age, use_container_width=False)
     st.markdown("---")
 
     # Business Insight
     section_header("Business Diagnosis")
-    st.info(generate_insight(filtered_df))
-
-    # Excel download for filtered data
-    def to_excel(df):
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Sheet1')
-        return output.getvalue()
-
-    st.sidebar.download_button(
-        label="Download Filtered Data as Excel",
-        data=to_excel(filtered_df),
-        file_name='filtered_data.xlsx',
-        mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    st.info(generate_insight(aggregates.region_sales))
+
+    # Built only when requested; see src/exports.py
+    render_export(
+        filtered_df,
+        [dataset_fingerprint(df), sorted(map(str, selected_regions)), sorted(map(str, selected_products)),
+         str(date_range[0]), str(date_range[-1])],
+        "filtered_data",
+        summaries=dashboard_summaries(aggregates),
+        key="filtered-data",
+        label="Export filtered data as"
     )
 
 
@@ -1,22 +1,551 @@
+import numpy as np
 import pandas as pd
+import glob
+import hashlib
+import json
 import os
+import threading
+import weakref
 
-def load_data(path="data/sample_sales_data.csv"):
+from src.perf import timed
+from src.shared_cache import shared_cache
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - cache is skipped without pyarrow
+    pa = None
+    feather = None
+
+# Expected numeric column types for the sales dataset. 'Date' is parsed
+# separately and the text columns (Region, Product, Customer Gender) are
+# left as read; normalize_schema() then narrows both.
+COLUMN_DTYPES = {
+    "Customer ID": "int64",
+    "Sales": "int64",
+    "Profit": "int64",
+    "Customer Age": "int64",
+}
+
+# Text columns with at most this share of distinct values become categoricals.
+MAX_CATEGORY_RATIO = 0.5
+_INTEGER_WIDTHS = [np.int8, np.int16, np.int32]
+
+CACHE_SUFFIX = ".arrow"
+CACHE_META_SUFFIX = ".arrow.json"
+_HASH_CHUNK_SIZE = 1 << 20
+
+# Files of a partitioned data directory, and where the list of already
+# ingested ones is kept (relative to the directory).
+PARTITION_PATTERN = "*.csv"
+MANIFEST_PATH = os.path.join(".cache", "manifest.json")
+
+_ingest_locks = {}
+_ingest_locks_lock = threading.Lock()
+
+# The frame each fingerprint tag was set on, by id. Weak, so once a frame
+# is freed a later frame reusing its id is not taken for the owner.
+_fingerprint_owners = weakref.WeakValueDictionary()
+
+
+def _content_hash(path):
+    """Return the SHA-256 hex digest of a file, read in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path, content_hash=None):
+    """
+    Describe a source file by path, size, mtime and content hash.
+
+    Args:
+        path (str): Path to the source file.
+        content_hash (str, optional): Precomputed content hash, to avoid rehashing.
+
+    Returns:
+        dict: Fingerprint with 'path', 'size', 'mtime_ns' and 'sha256' keys.
+    """
+    stat = os.stat(path)
+    return {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": content_hash or _content_hash(path),
+    }
+
+
+def set_fingerprint(df, fingerprint, source=None):
+    """
+    Tag a loaded DataFrame with the fingerprint of its contents.
+
+    ``source`` names where the data came from (e.g. the CSV path); unlike the
+    fingerprint it stays the same when that source gains new rows. The tag
+    belongs to ``df`` itself: frames derived from it inherit attrs, but not
+    the tag's trust (see dataset_fingerprint).
+    """
+    df.attrs["fingerprint"] = fingerprint
+    df.attrs["fingerprint_rows"] = len(df)
+    _fingerprint_owners[id(df)] = df
+    if source is not None:
+        df.attrs["source"] = source
+    return df
+
+
+def dataset_fingerprint(df):
+    """
+    Return a stable identifier for a DataFrame's contents.
+
+    Frames from load_data or the upload reader carry the fingerprint of
+    their source. pandas propagates attrs to derived frames (copies, column
+    subsets, reorderings), so the tag is only trusted on the frame it was
+    set on and while the row count still matches; otherwise the contents
+    are hashed and the result is stored on the frame.
+    """
+    if _has_own_fingerprint(df):
+        return df.attrs["fingerprint"]
+    hashed = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    digest = hashlib.sha256(hashed.tobytes())
+    digest.update(",".join(map(str, df.columns)).encode())
+    return set_fingerprint(df, digest.hexdigest()).attrs["fingerprint"]
+
+
+def _has_own_fingerprint(df):
+    attrs = df.attrs
+    return (bool(attrs.get("fingerprint")) and _fingerprint_owners.get(id(df)) is df
+            and attrs.get("fingerprint_rows") == len(df))
+
+
+def dataset_source(df):
+    """Return the name of a DataFrame's source, falling back to its fingerprint."""
+    return df.attrs.get("source") or dataset_fingerprint(df)
+
+
+def appended_rows(df):
+    """
+    Split a dataset that extends an earlier one into the parent's fingerprint and the new rows.
+
+    Frames from a partitioned data directory (see load_partitions) record
+    the dataset they were appended to, so results derived from that parent
+    can be extended with just the new rows instead of being rebuilt.
+
+    Returns:
+        tuple: (parent fingerprint, DataFrame of the appended rows), or
+        None when ``df`` is not a tagged append of an earlier dataset.
+    """
+    parent = df.attrs.get("parent")
+    if not parent or not _has_own_fingerprint(df) or parent["rows"] > len(df):
+        return None
+    return parent["fingerprint"], df.iloc[parent["rows"]:]
+
+
+def _cache_paths(path):
+    return path + CACHE_SUFFIX, path + CACHE_META_SUFFIX
+
+
+def _read_cache_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _cache_is_fresh(path, meta):
+    """
+    Check a cache's recorded fingerprint against the source file.
+
+    Size and mtime are compared first; the content hash is only recomputed
+    when the mtime moved, so a touched-but-unchanged file keeps its cache.
+    In that case the new mtime is recorded in ``meta``, for the caller to
+    persist so the file is not hashed again on every load.
+    """
+    if meta is None:
+        return False
+    stat = os.stat(path)
+    if meta.get("path") != os.path.abspath(path) or meta.get("size") != stat.st_size:
+        return False
+    if meta.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+    if meta.get("sha256") != _content_hash(path):
+        return False
+    meta["mtime_ns"] = stat.st_mtime_ns
+    return True
+
+
+def _write_meta(meta_path, meta):
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def apply_column_types(df):
+    """Cast the known sales columns to their expected types where present."""
+    dtypes = {col: dtype for col, dtype in COLUMN_DTYPES.items() if col in df.columns}
+    df = df.astype(dtypes, copy=False)
+    if "Date" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["Date"]):
+        df["Date"] = pd.to_datetime(df["Date"])
+    return df
+
+
+def normalize_schema(df, max_category_ratio=MAX_CATEGORY_RATIO):
+    """
+    Store a frame compactly: repeated text as categoricals, integers at their smallest width.
+
+    Text columns with few distinct values (Region, Product, Customer
+    Gender) become categoricals with sorted categories, and integer
+    columns are downcast to the narrowest signed type that holds their
+    values, e.g. int8 for ages. Dates, floats and columns that are
+    already categorical are left as they are.
+
+    Narrow integers can overflow: a groupby sum that finds one row per
+    group keeps the narrow type, and ``+`` between narrow arrays wraps
+    around. Tables of sums that are added to later should pass through
+    widen_integers() first.
+
+    Args:
+        df (pd.DataFrame): Frame to convert; it is not modified.
+        max_category_ratio (float): Largest share of distinct values for a
+            text column to become categorical.
+
+    Returns:
+        pd.DataFrame: The converted frame, with the same attrs.
+    """
+    converted = {}
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            codes, categories = pd.factorize(series, sort=True)
+            if len(series) and len(categories) <= max_category_ratio * len(series):
+                converted[column] = pd.Categorical.from_codes(codes, categories=categories)
+        elif pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+            dtype = _narrowest_integer(series.to_numpy())
+            if dtype.itemsize < series.dtype.itemsize:
+                converted[column] = series.astype(dtype)
+    if not converted:
+        return df
+    result = df.copy(deep=False)
+    for column, values in converted.items():
+        result[column] = values
+    return result
+
+
+def _narrowest_integer(values):
+    # pd.to_numeric(downcast=...) re-checks every candidate cast; min/max is enough for integers
+    if not len(values):
+        return values.dtype
+    lo, hi = values.min(), values.max()
+    for dtype in _INTEGER_WIDTHS:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return np.dtype(dtype)
+    return values.dtype
+
+
+def widen_integers(df, columns):
+    """
+    Cast the integer columns among ``columns`` to int64, leaving the others as they are.
+
+    Args:
+        df (pd.DataFrame): Frame to convert; it is not modified.
+        columns (list): Columns to widen, e.g. summed measures.
+
+    Returns:
+        pd.DataFrame: The frame with those columns as int64.
+    """
+    dtypes = {
+        column: np.int64 for column in columns
+        if pd.api.types.is_integer_dtype(df[column]) and not pd.api.types.is_extension_array_dtype(df[column])
+    }
+    return df.astype(dtypes) if dtypes else df
+
+
+def concat_frames(frames):
+    """
+    Concatenate frames from normalize_schema() into one with a fresh index.
+
+    pd.concat turns categoricals with different categories into plain
+    text; here each categorical column is first put on the union of the
+    categories (see union_categories()), so it stays categorical.
+    """
+    return pd.concat(union_categories(frames), ignore_index=True)
+
+
+def union_categories(frames):
+    """
+    Put each column that is categorical in every frame on the union of their categories.
+
+    Needed before combining such frames, whether by pd.concat or by
+    writing one's values into another with ``.loc``, which raises for
+    categoricals with different categories.
+
+    Args:
+        frames (iterable): DataFrames sharing some columns.
+
+    Returns:
+        list: The frames, converted where their categories differed.
+    """
+    frames = list(frames)
+    if len(frames) > 1:
+        for column in frames[0].columns:
+            dtypes = [frame[column].dtype if column in frame.columns else None for frame in frames]
+            if not all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+                continue
+            categories = dtypes[0].categories
+            for dtype in dtypes[1:]:
+                categories = categories.union(dtype.categories)
+            frames = [
+                frame if frame[column].dtype.categories.equals(categories)
+                else frame.assign(**{column: frame[column].cat.set_categories(categories)})
+                for frame in frames
+            ]
+    return frames
+
+
+def memory_report(before, after):
+    """
+    Per-column memory of a frame before and after normalize_schema().
+
+    Args:
+        before (pd.DataFrame): The frame as read.
+        after (pd.DataFrame): The normalized frame.
+
+    Returns:
+        pd.DataFrame: 'Column', 'Before dtype', 'After dtype', 'Before MB',
+        'After MB' and 'Saved (%)', plus a final 'Total' row.
+    """
+    before_bytes = before.memory_usage(index=False, deep=True)
+    after_bytes = after.memory_usage(index=False, deep=True).reindex(before_bytes.index, fill_value=0)
+    report = pd.DataFrame({
+        "Column": list(before_bytes.index) + ["Total"],
+        "Before dtype": [str(before[c].dtype) for c in before_bytes.index] + [""],
+        "After dtype": [str(after[c].dtype) if c in after.columns else "" for c in before_bytes.index] + [""],
+        "Before MB": list(before_bytes / 1e6) + [before_bytes.sum() / 1e6],
+        "After MB": list(after_bytes / 1e6) + [after_bytes.sum() / 1e6],
+    })
+    report["Saved (%)"] = (1 - report["After MB"] / report["Before MB"].where(report["Before MB"] > 0)) * 100
+    return report
+
+
+def _write_cache(df, path, fingerprint):
+    cache_path, meta_path = _cache_paths(path)
+    tmp_path = cache_path + ".tmp"
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Uncompressed IPC so later loads can memory-map the file.
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, cache_path)
+    _write_meta(meta_path, fingerprint)
+
+
+@timed("load_data")
+def load_data(path="data/sample_sales_data.csv", use_cache=True):
     """
-    Load sales data from a CSV file.
+    Load sales data from a CSV file, or from a directory of CSV partitions.
+
+    The parsed frame is typed and compacted by normalize_schema(), then
+    cached as an Arrow IPC file next to the CSV.
+    Later loads memory-map the cache instead of re-parsing, and a change in
+    the CSV's size, mtime or content triggers a rebuild. The loaded frame
+    is also kept in the process-wide shared cache, so every session reading
+    an unchanged file gets the same (read-only) frame. A directory is read
+    as an append-only store of partitions; see load_partitions().
 
     Args:
-        path (str): Path to the CSV file.
+        path (str): Path to the CSV file or data directory.
+        use_cache (bool): Read and write the columnar cache when pyarrow is available.
 
     Returns:
         pd.DataFrame: Loaded DataFrame, or empty DataFrame if file not found.
     """
     if not os.path.exists(path):
         return pd.DataFrame()  # Return empty DataFrame if file does not exist
+    if os.path.isdir(path):
+        return load_partitions(path, use_cache=use_cache)
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, use_cache)
+    df = shared_cache.get("datasets", key)
+    if df is None:
+        df = _load_data(path, use_cache)
+        if not df.empty:
+            shared_cache.put("datasets", key, df)
+    return df
+
+
+def _load_data(path, use_cache):
+    use_cache = use_cache and feather is not None
+    cache_path, meta_path = _cache_paths(path)
     try:
-        df = pd.read_csv(path, parse_dates=["Date"])
+        if use_cache:
+            meta = _read_cache_meta(meta_path)
+            recorded_mtime = meta.get("mtime_ns") if meta else None
+            if os.path.exists(cache_path) and _cache_is_fresh(path, meta):
+                try:
+                    cached = feather.read_table(cache_path, memory_map=True).to_pandas()
+                    df = normalize_schema(cached)
+                    if df is not cached:
+                        # Written before schema normalization; store the compact form
+                        _write_cache(df, path, meta)
+                    elif meta["mtime_ns"] != recorded_mtime:
+                        # Touched but unchanged: record the new mtime
+                        _write_meta(meta_path, meta)
+                    return set_fingerprint(df, meta["sha256"], source=os.path.abspath(path))
+                except (OSError, pa.ArrowException) as e:
+                    print(f"Ignoring unreadable data cache {cache_path}: {e}")
+
+        df = normalize_schema(apply_column_types(pd.read_csv(path, parse_dates=["Date"])))
+        fingerprint = file_fingerprint(path)
+        set_fingerprint(df, fingerprint["sha256"], source=fingerprint["path"])
+        if use_cache:
+            try:
+                _write_cache(df, path, fingerprint)
+            except (OSError, pa.ArrowException) as e:
+                print(f"Could not write data cache {cache_path}: {e}")
         return df
     except Exception as e:
         # Optionally, log the error or print for debugging
         print(f"Error loading data: {e}")
         return pd.DataFrame()
+
+
+def partition_files(directory, pattern=PARTITION_PATTERN):
+    """Return the partition files of a data directory, sorted by name."""
+    return sorted(glob.glob(os.path.join(directory, pattern)))
+
+
+def _read_manifest(directory):
+    manifest = _read_cache_meta(os.path.join(directory, MANIFEST_PATH))
+    if not manifest or "partitions" not in manifest:
+        return {"fingerprint": None, "rows": 0, "partitions": []}
+    return manifest
+
+
+def _write_manifest(directory, manifest):
+    manifest_path = os.path.join(directory, MANIFEST_PATH)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def _chain_fingerprint(parent, partition_hash):
+    """Fingerprint of a dataset extended by one partition, from its parent's and the partition's."""
+    return hashlib.sha256(f"{parent or ''}:{partition_hash}".encode()).hexdigest()
+
+
+def _listing_key(directory, partitions, use_cache):
+    return ("partitions", os.path.abspath(directory),
+            tuple((p["path"], p["size"], p["mtime_ns"]) for p in partitions), use_cache)
+
+
+def load_partitions(directory, pattern=PARTITION_PATTERN, use_cache=True):
+    """
+    Load an append-only directory of sales partitions, e.g. one CSV per day.
+
+    A manifest under ``<directory>/.cache`` lists the partitions already
+    ingested, in order, with their fingerprints. Each refresh parses only
+    files not in the manifest (oldest name first) and appends them to the
+    frame held in the shared cache, so its cost depends on the new data
+    rather than on the whole history. The result records the dataset it
+    was appended to (see appended_rows()), which lets the sales cube,
+    retention tables and customer features fold in just the new rows.
+
+    Partitions are expected never to change once written: if an ingested
+    file is modified or removed the store is re-ingested from scratch.
+    Each partition's parse is cached next to it as for load_data(), so
+    even that only re-reads Arrow files. New files should be moved into
+    the directory complete, not written in place.
+
+    Args:
+        directory (str): Data directory.
+        pattern (str): Glob of partition files within it.
+        use_cache (bool): Use the per-partition columnar cache.
+
+    Returns:
+        pd.DataFrame: All ingested rows, in ingestion order, or an empty
+        DataFrame if there are no readable partitions.
+    """
+    paths = partition_files(directory, pattern)
+    if not paths:
+        return pd.DataFrame()
+    stats = [os.stat(path) for path in paths]
+    listing = [{"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+               for path, stat in zip(paths, stats)]
+    key = _listing_key(directory, listing, use_cache)
+    df = shared_cache.get("datasets", key)
+    if df is not None:
+        return df
+
+    with _ingest_locks_lock:
+        lock = _ingest_locks.setdefault(os.path.abspath(directory), threading.Lock())
+    with lock:
+        df = shared_cache.get("datasets", key)
+        if df is not None:
+            return df
+        return _ingest(directory, paths, key, use_cache)
+
+
+def _ingest(directory, paths, key, use_cache):
+    manifest = _read_manifest(directory)
+    ingested = manifest["partitions"]
+    current = {os.path.abspath(path): path for path in paths}
+    recorded_mtimes = [p.get("mtime_ns") for p in ingested]
+    if not all(p["path"] in current and _cache_is_fresh(current[p["path"]], p) for p in ingested):
+        print(f"Partitions in {directory} changed or were removed; re-ingesting all of them.")
+        manifest = {"fingerprint": None, "rows": 0, "partitions": []}
+        ingested = []
+    # Partitions touched but unchanged get their new mtime recorded below
+    touched = [p.get("mtime_ns") for p in ingested] != recorded_mtimes[:len(ingested)]
+
+    base = None
+    if ingested:
+        base = shared_cache.get("datasets", _listing_key(directory, ingested, use_cache))
+        if base is None:
+            frames = [_load_data(current[p["path"]], use_cache) for p in ingested]
+            base = concat_frames(frames) if len(frames) > 1 else frames[0]
+            base.attrs = {}
+            set_fingerprint(base, manifest["fingerprint"], source=os.path.abspath(directory))
+
+    known = {p["path"] for p in ingested}
+    new_frames = []
+    for path in paths:
+        if os.path.abspath(path) in known:
+            continue
+        part = _load_data(path, use_cache)
+        if part.empty:
+            continue  # unreadable or still empty; retried on the next refresh
+        fingerprint = file_fingerprint(path, part.attrs["fingerprint"])
+        ingested.append({**fingerprint, "rows": len(part)})
+        manifest["fingerprint"] = _chain_fingerprint(manifest["fingerprint"], fingerprint["sha256"])
+        new_frames.append(part)
+
+    if not new_frames:
+        df = base if base is not None else pd.DataFrame()
+        if touched:
+            try:
+                _write_manifest(directory, manifest)
+            except OSError as e:
+                print(f"Could not write partition manifest for {directory}: {e}")
+    else:
+        df = concat_frames(([base] if base is not None else []) + new_frames)
+        df.attrs = {}
+        set_fingerprint(df, manifest["fingerprint"], source=os.path.abspath(directory))
+        if base is not None:
+            df.attrs["parent"] = {"fingerprint": base.attrs["fingerprint"], "rows": len(base)}
+        manifest["rows"] = len(df)
+        manifest["partitions"] = ingested
+        try:
+            _write_manifest(directory, manifest)
+        except OSError as e:
+            print(f"Could not write partition manifest for {directory}: {e}")
+
+    if not df.empty:
+        ingested_key = _listing_key(directory, ingested, use_cache)
+        shared_cache.put("datasets", ingested_key, df)
+        if key != ingested_key:
+            # Same frame under the full listing (it includes unreadable files)
+            shared_cache.put("datasets", key, df, nbytes=0)
+    return df
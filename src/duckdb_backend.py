@@ -0,0 +1,519 @@
+import glob
+import importlib.util
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from src.aggregation import build_dashboard_aggregates
+from src.data_loader import COLUMN_DTYPES, apply_column_types, normalize_schema, partition_files, set_fingerprint
+from src.exports import EXPORT_FORMATS, cached_export, write_xlsx
+from src.kpis import calculate_kpis
+from src.model_cache import fingerprint
+from src.perf import timed
+from src.retention import (
+    ANNUAL_DISCOUNT_RATE, CHURN_WINDOW_DAYS, CHURN_WINDOWS, COHORT_MONTHS, MAX_RETENTION_RATE,
+    churn_summary_frame, cohort_frame, customer_mix_series,
+)
+
+# "pandas", "duckdb" or "auto"; see resolve_backend().
+BACKEND_ENV_VAR = "SME_QUERY_BACKEND"
+BACKENDS = ("auto", "pandas", "duckdb")
+# In "auto" mode, CSV sources at least this large are queried in place.
+DUCKDB_MIN_BYTES = 256 * 1024 * 1024
+
+_SQL_TYPES = {"int64": "BIGINT"}
+_MAX_CACHED_VIEWS = 16
+# Customers kept in the lifetime value table; the dashboard shows the top 10.
+TOP_CUSTOMERS = 100
+_MAX_CACHED_SOURCES = 4
+_sources = OrderedDict()
+_sources_lock = threading.Lock()
+
+
+def duckdb_available():
+    """Whether the optional duckdb package is installed, without importing it."""
+    return importlib.util.find_spec("duckdb") is not None
+
+
+def _files(path):
+    if os.path.isdir(path):
+        return partition_files(path)
+    return sorted(glob.glob(path)) if glob.has_magic(path) else [path]
+
+
+def _source_fingerprint(files):
+    stats = [os.stat(f) for f in files]
+    return fingerprint(
+        "duckdb", [[os.path.abspath(f), s.st_size, s.st_mtime_ns] for f, s in zip(files, stats)]
+    ), sum(s.st_size for s in stats)
+
+
+def resolve_backend(path, preference=None):
+    """
+    Pick the query backend for a data source.
+
+    Args:
+        path (str): Data file, a glob of CSV or Parquet files, or a
+            partitioned data directory (see data_loader.load_partitions).
+        preference (str, optional): One of BACKENDS; defaults to the
+            SME_QUERY_BACKEND environment variable, then "auto".
+
+    Returns:
+        str: "duckdb" when asked for, or in "auto" mode when the source is
+        Parquet, several files, or a CSV of at least DUCKDB_MIN_BYTES;
+        otherwise "pandas". A directory is judged by its total size, since
+        pandas ingests its new partitions incrementally. Always "pandas"
+        when duckdb is not installed.
+    """
+    preference = (preference or os.environ.get(BACKEND_ENV_VAR) or "auto").lower()
+    if preference not in BACKENDS:
+        raise ValueError(f"Unknown query backend {preference!r}; expected one of {list(BACKENDS)}.")
+    if preference == "pandas" or not duckdb_available():
+        return "pandas"
+    if preference == "duckdb":
+        return "duckdb"
+    files = [f for f in _files(path) if os.path.exists(f)]
+    if not files:
+        return "pandas"
+    if os.path.isdir(path):
+        return "duckdb" if sum(os.path.getsize(f) for f in files) >= DUCKDB_MIN_BYTES else "pandas"
+    if len(files) > 1 or not files[0].lower().endswith(".csv"):
+        return "duckdb"
+    return "duckdb" if os.path.getsize(files[0]) >= DUCKDB_MIN_BYTES else "pandas"
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _literal(value):
+    """Render a filter value as a SQL literal."""
+    if isinstance(value, pd.Timestamp):
+        return f"TIMESTAMP '{value.isoformat(sep=' ')}'"
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _in(column, values):
+    values = list(values)
+    if not values:
+        return "FALSE"
+    return f"{_quote(column)} IN ({', '.join(map(_literal, values))})"
+
+
+def _day_range(start_date, end_date):
+    """Inclusive days as a half-open timestamp range."""
+    return pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+
+
+class DuckDBSource:
+    """
+    CSV or Parquet sales data queried in place with an embedded DuckDB.
+
+    Filters become a SQL WHERE clause and only aggregated results come
+    back to Python, so the data never has to fit in memory and scans use
+    every core. Each dashboard view costs one scan (see view()), cached by
+    filter selection; its customer figures (see customer_measures()) come
+    from per-customer tables kept inside DuckDB, which cost one more scan
+    per source. Parquet scans read only the columns a query needs; CSV
+    files are re-parsed by every scan.
+
+    Args:
+        path (str): A CSV or Parquet file, a glob of them, or a data directory.
+    """
+
+    def __init__(self, path):
+        import duckdb
+
+        self.path = path
+        self.files = _files(path)
+        if not self.files or not all(os.path.exists(f) for f in self.files):
+            raise FileNotFoundError(f"No data files match {path!r}.")
+        self.fingerprint, self.size_bytes = _source_fingerprint(self.files)
+
+        self._con = duckdb.connect(":memory:")
+        self._con.execute(f"CREATE VIEW sales AS SELECT * FROM {self._relation()}")
+        self._lock = threading.Lock()
+        self._views = OrderedDict()
+        self._dimensions = None
+        self._customer_tables_lock = threading.Lock()
+        self._customer_tables_ready = False
+        self._frame = None
+
+    def _relation(self):
+        files = "[" + ", ".join(_literal(os.path.abspath(f)) for f in self.files) + "]"
+        if all(f.lower().endswith(".parquet") for f in self.files):
+            return f"read_parquet({files})"
+        types = {col: _SQL_TYPES[dtype] for col, dtype in COLUMN_DTYPES.items()}
+        types["Date"] = "TIMESTAMP"
+        struct = ", ".join(f"{_literal(col)}: {_literal(sql_type)}" for col, sql_type in types.items())
+        return f"read_csv({files}, header = true, types = {{{struct}}})"
+
+    def query(self, sql):
+        """Run a query on its own cursor, which is safe across threads, and return a DataFrame."""
+        with self._con.cursor() as cursor:
+            return cursor.execute(sql).df()
+
+    @timed("duckdb.to_frame")
+    def to_frame(self):
+        """Fetch every row as a typed DataFrame, once, for pages that need raw transactions."""
+        with self._lock:
+            if self._frame is not None:
+                return self._frame
+        df = normalize_schema(apply_column_types(self.query("SELECT * FROM sales")))
+        df = set_fingerprint(df, self.fingerprint, source=os.path.abspath(self.path))
+        with self._lock:
+            self._frame = df
+        return df
+
+    def _where(self, regions, products, start_date, end_date, date_column="Date"):
+        start, end = _day_range(start_date, end_date)
+        return " AND ".join([
+            f"{_quote(date_column)} >= {_literal(start)}",
+            f"{_quote(date_column)} < {_literal(end)}",
+            _in("Region", regions),
+            _in("Product", products),
+        ])
+
+    def dimensions(self):
+        """
+        Filter choices for the sidebar, from one scan.
+
+        Returns:
+            dict: 'regions' and 'products' (sorted lists), 'date_min',
+            'date_max' and 'rows'.
+        """
+        if self._dimensions is None:
+            frame = self.query(
+                "SELECT list(DISTINCT \"Region\") AS regions, list(DISTINCT \"Product\") AS products, "
+                "min(\"Date\") AS date_min, max(\"Date\") AS date_max, count(*) AS rows FROM sales"
+            )
+            row = frame.iloc[0]
+            self._dimensions = {
+                "regions": sorted(v for v in row["regions"] if v is not None),
+                "products": sorted(v for v in row["products"] if v is not None),
+                "date_min": pd.Timestamp(row["date_min"]),
+                "date_max": pd.Timestamp(row["date_max"]),
+                "rows": int(row["rows"]),
+            }
+        return self._dimensions
+
+    @timed("duckdb.view")
+    def view(self, regions, products, start_date, end_date):
+        """
+        Everything the dashboard needs about one filter selection, from one scan.
+
+        A GROUPING SETS query returns the cube slice (sums per day, Region
+        and Product) and transaction counts per Customer Gender and Age.
+
+        Returns:
+            dict: 'cube_slice' (same layout as SalesCube.slice), 'demographics'
+            (counts indexed by gender and age) and 'kpis'.
+        """
+        key = ("view", tuple(map(str, regions)), tuple(map(str, products)), str(start_date), str(end_date))
+        cached = self._cached_view(key)
+        if cached is not None:
+            return cached
+
+        frame = self.query(f"""
+            SELECT
+                date_trunc('day', "Date") AS "Date", "Region", "Product",
+                "Customer Gender", "Customer Age",
+                CAST(sum("Sales") AS BIGINT) AS "Sales",
+                CAST(sum("Profit") AS BIGINT) AS "Profit",
+                count(*) AS "Transactions",
+                GROUPING("Customer Gender") = 0 AS is_demographic
+            FROM sales
+            WHERE {self._where(regions, products, start_date, end_date)}
+            GROUP BY GROUPING SETS (
+                (date_trunc('day', "Date"), "Region", "Product"),
+                ("Customer Gender", "Customer Age")
+            )
+        """)
+        is_demographic = frame["is_demographic"].to_numpy(dtype=bool)
+        cube_slice = (
+            frame.loc[~is_demographic, ["Date", "Region", "Product", "Sales", "Profit", "Transactions"]]
+            .sort_values(["Date", "Region", "Product"]).reset_index(drop=True)
+        )
+        cube_slice["Date"] = pd.to_datetime(cube_slice["Date"])
+        demographics = (
+            frame.loc[is_demographic].set_index(["Customer Gender", "Customer Age"])["Transactions"]
+            .rename("Count").sort_index()
+        )
+        totals = cube_slice[["Sales", "Profit", "Transactions"]].sum()
+        kpis = calculate_kpis(totals.to_frame().T)
+        kpis["Transactions"] = int(totals["Transactions"])
+
+        return self._cache_view(key, {"cube_slice": cube_slice, "demographics": demographics, "kpis": kpis})
+
+    def _cached_view(self, key):
+        with self._lock:
+            if key in self._views:
+                self._views.move_to_end(key)
+                return self._views[key]
+        return None
+
+    def _cache_view(self, key, result):
+        with self._lock:
+            self._views[key] = result
+            while len(self._views) > _MAX_CACHED_VIEWS:
+                self._views.popitem(last=False)
+        return result
+
+    @timed("duckdb.comparison_kpis")
+    def comparison_kpis(self, regions, products, start_date, end_date):
+        """
+        KPIs for the previous period and the same period last year, from one scan.
+
+        Same periods and coverage rule as KpiPrefixSums.comparison_kpis():
+        a period the data does not fully cover maps to None.
+        """
+        start = pd.Timestamp(start_date).normalize()
+        end = pd.Timestamp(end_date).normalize()
+        length = end - start + pd.Timedelta(days=1)
+        periods = {
+            "Previous period": (start - length, start - pd.Timedelta(days=1)),
+            "Same period last year": (start - pd.DateOffset(years=1), end - pd.DateOffset(years=1)),
+        }
+        dims = self.dimensions()
+        covered = {
+            label: p_start >= dims["date_min"].normalize() and p_end <= dims["date_max"].normalize()
+            for label, (p_start, p_end) in periods.items()
+        }
+        result = dict.fromkeys(periods)
+        if not any(covered.values()):
+            return result
+
+        columns, ranges = [], []
+        for i, (label, (p_start, p_end)) in enumerate(periods.items()):
+            if not covered[label]:
+                continue
+            lo, hi = _day_range(p_start, p_end)
+            ranges.append(f"(\"Date\" >= {_literal(lo)} AND \"Date\" < {_literal(hi)})")
+            condition = f"FILTER (WHERE {ranges[-1]})"
+            columns += [
+                f"CAST(coalesce(sum(\"Sales\") {condition}, 0) AS BIGINT) AS sales_{i}",
+                f"CAST(coalesce(sum(\"Profit\") {condition}, 0) AS BIGINT) AS profit_{i}",
+                f"count(*) {condition} AS transactions_{i}",
+            ]
+        row = self.query(
+            f"SELECT {', '.join(columns)} FROM sales "
+            f"WHERE ({' OR '.join(ranges)}) AND {_in('Region', regions)} AND {_in('Product', products)}"
+        ).iloc[0]
+        for i, label in enumerate(periods):
+            if covered[label]:
+                totals = {"Sales": int(row[f"sales_{i}"]), "Profit": int(row[f"profit_{i}"])}
+                result[label] = calculate_kpis(pd.DataFrame([totals]))
+                result[label]["Transactions"] = int(row[f"transactions_{i}"])
+        return result
+
+    @timed("duckdb.customer_tables")
+    def _create_customer_tables(self):
+        """
+        Per-customer history tables, created inside DuckDB once per source.
+
+        ``customer_days`` holds each customer's purchase totals per day,
+        region and product, ``customer_months`` their totals per calendar
+        month and ``customers`` their whole-history totals, all from one
+        scan; customer_measures() selects customers from the first and
+        joins them to the other two.
+        """
+        with self._customer_tables_lock:
+            if self._customer_tables_ready:
+                return
+            with self._con.cursor() as cursor:
+                cursor.execute("""
+                    CREATE OR REPLACE TABLE customer_days AS
+                    SELECT
+                        "Customer ID", "Region", "Product", date_trunc('day', "Date") AS day,
+                        min("Date") AS first_purchase, max("Date") AS last_purchase,
+                        count(*) AS orders, sum("Sales") AS sales, sum("Profit") AS profit
+                    FROM sales
+                    WHERE "Customer ID" IS NOT NULL
+                    GROUP BY ALL
+                """)
+                cursor.execute("""
+                    CREATE OR REPLACE TABLE customer_months AS
+                    SELECT
+                        "Customer ID", date_trunc('month', day) AS month,
+                        min(first_purchase) AS first_purchase, max(last_purchase) AS last_purchase,
+                        sum(orders) AS orders, sum(sales) AS sales, sum(profit) AS profit
+                    FROM customer_days
+                    GROUP BY ALL
+                """)
+                cursor.execute("""
+                    CREATE OR REPLACE TABLE customers AS
+                    SELECT
+                        "Customer ID", min(first_purchase) AS first_purchase,
+                        max(last_purchase) AS last_purchase, CAST(sum(orders) AS BIGINT) AS orders,
+                        CAST(sum(sales) AS BIGINT) AS sales, CAST(sum(profit) AS BIGINT) AS profit
+                    FROM customer_months
+                    GROUP BY ALL
+                """)
+            self._customer_tables_ready = True
+
+    @timed("duckdb.customer_measures")
+    def customer_measures(self, regions, products, start_date, end_date, churn_window_days=CHURN_WINDOW_DAYS):
+        """
+        The customer figures of a filter selection, aggregated in SQL.
+
+        The customers appearing in the selection are found in the
+        per-customer day table, without rescanning the source, and joined
+        to the per-customer tables, so only counts, cohort cells and the
+        TOP_CUSTOMERS highest lifetime values come back. As in
+        CustomerRetention, "new" and "churned" are judged on each
+        customer's whole history.
+
+        Returns:
+            dict: As aggregation.customer_measures(), except that
+            'lifetime_value' holds the TOP_CUSTOMERS highest CLVs only.
+        """
+        key = ("customers", tuple(map(str, regions)), tuple(map(str, products)), str(start_date),
+               str(end_date), churn_window_days)
+        cached = self._cached_view(key)
+        if cached is not None:
+            return cached
+        self._create_customer_tables()
+
+        as_of = self.dimensions()["date_max"]
+        windows = sorted(set(CHURN_WINDOWS) | {churn_window_days})
+        churned = [
+            f"count(*) FILTER (WHERE last_purchase < {_literal(as_of - pd.Timedelta(days=w))}) AS churned_{w}"
+            for w in windows
+        ]
+        discount = (1 + ANNUAL_DISCOUNT_RATE) ** (churn_window_days / 365.25) - 1
+        with self._con.cursor() as cursor:
+            # Temporary tables belong to this cursor's connection and go with it
+            cursor.execute(f"""
+                CREATE TEMP TABLE selected AS
+                SELECT
+                    *,
+                    last_purchase < {_literal(as_of - pd.Timedelta(days=churn_window_days))} AS churned,
+                    greatest(floor(epoch({_literal(as_of)} - first_purchase) / 86400) / {churn_window_days}, 1.0)
+                        AS periods
+                FROM customers
+                WHERE "Customer ID" IN (
+                    SELECT "Customer ID" FROM customer_days
+                    WHERE {self._where(regions, products, start_date, end_date, date_column="day")}
+                )
+            """)
+            summary = cursor.execute(f"""
+                SELECT
+                    count(*) AS customers,
+                    count(*) FILTER (WHERE first_purchase >= {_literal(pd.Timestamp(start_date))}) AS new,
+                    {", ".join(churned)}
+                FROM selected
+            """).df().iloc[0]
+            cohorts = cursor.execute(f"""
+                SELECT
+                    (year(s.first_purchase) - 1970) * 12 + month(s.first_purchase) - 1 AS cohort,
+                    date_diff('month', date_trunc('month', s.first_purchase), m.month) AS offset,
+                    count(*) AS customers
+                FROM customer_months m JOIN selected s USING ("Customer ID")
+                WHERE date_diff('month', date_trunc('month', s.first_purchase), m.month) < {COHORT_MONTHS}
+                GROUP BY ALL
+            """).df()
+            # Retention rate as in CustomerRetention.lifetime_value()
+            lifetime_value = cursor.execute(f"""
+                WITH rate AS (
+                    SELECT least(
+                        1 - coalesce(avg(churned::DOUBLE) FILTER (WHERE periods > 1), avg(churned::DOUBLE)),
+                        {MAX_RETENTION_RATE}
+                    ) AS r
+                    FROM selected
+                )
+                SELECT
+                    "Customer ID", orders AS "Orders", sales AS "Sales", profit AS "Profit",
+                    sales / orders AS "Avg Order Value", churned AS "Churned",
+                    profit + CASE WHEN churned THEN 0.0 ELSE profit / periods * r / (1 + {discount} - r) END
+                        AS "CLV"
+                FROM selected, rate
+                ORDER BY "CLV" DESC
+                LIMIT {TOP_CUSTOMERS}
+            """).df()
+
+        n_customers = int(summary["customers"])
+        return self._cache_view(key, {
+            "new_vs_repeat": customer_mix_series(int(summary["new"]), n_customers),
+            "churned_customers": int(summary[f"churned_{churn_window_days}"]),
+            "churn_summary": churn_summary_frame(
+                CHURN_WINDOWS, [int(summary[f"churned_{w}"]) for w in CHURN_WINDOWS], n_customers
+            ),
+            "cohort_retention": cohort_frame(
+                cohorts["cohort"].to_numpy(np.int64), cohorts["offset"].to_numpy(np.int64),
+                cohorts["customers"].to_numpy(float), as_of,
+            ),
+            "lifetime_value": lifetime_value,
+        })
+
+    def dashboard_aggregates(self, regions, products, start_date, end_date, grain="Daily",
+                             churn_window_days=CHURN_WINDOW_DAYS):
+        """
+        DashboardAggregates for a filter selection, aggregated by DuckDB.
+
+        Returns the same result as compute_dashboard_aggregates() on the
+        filtered rows of the pandas path, except that the lifetime value
+        table is cut to the TOP_CUSTOMERS highest.
+        """
+        view = self.view(regions, products, start_date, end_date)
+        customers = self.customer_measures(regions, products, start_date, end_date, churn_window_days)
+        return build_dashboard_aggregates(
+            view["cube_slice"], view["demographics"], customers, grain=grain, kpis=view["kpis"],
+        )
+
+    def build_export(self, fmt, key_parts, selection=None, summaries=None):
+        """
+        Export the selected rows through the export cache.
+
+        CSV, gzipped CSV and Parquet are written by DuckDB's COPY straight
+        from the source files; Excel fetches the rows, which must fit in
+        memory (and in Excel).
+
+        Args:
+            fmt (str): A key of EXPORT_FORMATS.
+            key_parts (list): Values identifying the rows; see exports.export_path().
+            selection (tuple, optional): (regions, products, start_date,
+                end_date); all rows when omitted.
+            summaries (dict, optional): Sheet name -> DataFrame, xlsx only.
+
+        Returns:
+            str: Path of the export file.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}; expected one of {list(EXPORT_FORMATS)}.")
+        where = self._where(*selection) if selection is not None else "TRUE"
+        rows = f"SELECT * FROM sales WHERE {where} ORDER BY \"Date\""
+        options = {
+            "csv": "FORMAT csv, HEADER",
+            "csv.gz": "FORMAT csv, HEADER, COMPRESSION gzip",
+            "parquet": "FORMAT parquet",
+        }
+
+        def write(path):
+            if fmt == "xlsx":
+                write_xlsx(self.query(rows), path, summaries)
+            else:
+                with self._con.cursor() as cursor:
+                    cursor.execute(f"COPY ({rows}) TO {_literal(path)} ({options[fmt]})")
+        return cached_export(fmt, key_parts, write)
+
+
+def get_duckdb_source(path):
+    """Return the DuckDBSource for a path, reopened when its files change."""
+    files = _files(path)
+    if not files or not all(os.path.exists(f) for f in files):
+        raise FileNotFoundError(f"No data files match {path!r}.")
+    key = _source_fingerprint(files)[0]
+    with _sources_lock:
+        source = _sources.get(key)
+        if source is None:
+            source = DuckDBSource(path)
+            _sources[key] = source
+            while len(_sources) > _MAX_CACHED_SOURCES:
+                _sources.popitem(last=False)
+        _sources.move_to_end(key)
+        return source
@@ -0,0 +1,238 @@
+import gzip
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from src.model_cache import DEFAULT_CACHE_DIR, fingerprint
+from src.perf import timed
+
+DEFAULT_EXPORT_DIR = os.path.join(os.path.dirname(DEFAULT_CACHE_DIR), "exports")
+MAX_EXPORT_FILES = 16
+CSV_CHUNK_ROWS = 100_000
+# An xlsx worksheet holds 1,048,576 rows; one is the header.
+EXCEL_MAX_ROWS = 1_048_575
+
+# Format key -> (label, file extension, MIME type)
+EXPORT_FORMATS = OrderedDict([
+    ("csv", ("CSV", ".csv", "text/csv")),
+    ("csv.gz", ("CSV (gzip)", ".csv.gz", "application/gzip")),
+    ("xlsx", ("Excel", ".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")),
+    ("parquet", ("Parquet", ".parquet", "application/vnd.apache.parquet")),
+])
+
+_build_locks = {}
+_build_locks_lock = threading.Lock()
+
+
+def _chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_csv(df, fileobj, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Write a frame as UTF-8 CSV to a binary file object, chunk by chunk.
+
+    Only one chunk is rendered to text at a time, so memory stays bounded
+    however large the frame is.
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+    try:
+        for i, chunk in enumerate(_chunks(df, chunk_rows)):
+            chunk.to_csv(text, header=(i == 0), index=False)
+        if df.empty:
+            df.to_csv(text, index=False)
+        text.flush()
+    finally:
+        text.detach()
+
+
+def write_parquet(df, path, chunk_rows=CSV_CHUNK_ROWS):
+    """Write a frame to Parquet, one row group per chunk."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in _chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def _write_sheet(workbook, name, df, chunk_rows=CSV_CHUNK_ROWS):
+    """Write a frame to a new worksheet row by row, dates formatted as dates."""
+    worksheet = workbook.add_worksheet(name)
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+    header_format = workbook.add_format({"bold": True})
+    for col, column in enumerate(df.columns):
+        is_date = pd.api.types.is_datetime64_any_dtype(df[column])
+        worksheet.set_column(col, col, 12 if is_date else max(10, len(str(column)) + 2),
+                             date_format if is_date else None)
+    worksheet.write_row(0, 0, [str(column) for column in df.columns], header_format)
+
+    row = 1
+    for chunk in _chunks(df, chunk_rows):
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for record in values.itertuples(index=False, name=None):
+            worksheet.write_row(row, 0, record)
+            row += 1
+
+
+def write_xlsx(df, path, summaries=None, sheet_name="Data"):
+    """
+    Write a frame, and optional summary tables, to an xlsx workbook.
+
+    Uses xlsxwriter's constant_memory mode, which flushes each row to disk
+    as soon as the next one starts, so memory does not grow with the row
+    count. Summary sheets come first; rows beyond Excel's sheet limit
+    continue on "Data (2)", "Data (3)", ...
+
+    Args:
+        df (pd.DataFrame): Rows to export.
+        path (str): Destination file.
+        summaries (dict, optional): Sheet name -> small DataFrame.
+        sheet_name (str): Name of the (first) data sheet.
+    """
+    import xlsxwriter
+
+    with xlsxwriter.Workbook(path, {"constant_memory": True}) as workbook:
+        for name, summary in (summaries or {}).items():
+            _write_sheet(workbook, name, summary)
+        parts = list(_chunks(df, EXCEL_MAX_ROWS)) or [df]
+        for i, part in enumerate(parts):
+            _write_sheet(workbook, sheet_name if i == 0 else f"{sheet_name} ({i + 1})", part)
+
+
+def dashboard_summaries(aggregates):
+    """
+    Summary sheets for an Excel export of the dashboard's filtered data.
+
+    Args:
+        aggregates (DashboardAggregates): The figures shown on the dashboard.
+
+    Returns:
+        OrderedDict: Sheet name -> DataFrame for KPIs, products, regions and
+        the sales/profit time series.
+    """
+    kpis = pd.DataFrame({"Metric": list(aggregates.kpis), "Value": list(aggregates.kpis.values())})
+    return OrderedDict([
+        ("KPIs", kpis),
+        ("Products", aggregates.product_sales),
+        ("Regions", aggregates.region_sales),
+        ("Time Series", aggregates.time_series),
+    ])
+
+
+def _write(df, fmt, path, summaries):
+    if fmt == "csv":
+        with open(path, "wb") as f:
+            write_csv(df, f)
+    elif fmt == "csv.gz":
+        # mtime=0 keeps the archive byte-identical for identical data
+        with open(path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as f:
+            write_csv(df, f)
+    elif fmt == "xlsx":
+        write_xlsx(df, path, summaries)
+    elif fmt == "parquet":
+        write_parquet(df, path)
+    else:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {list(EXPORT_FORMATS)}.")
+
+
+def export_path(fmt, key_parts, directory=DEFAULT_EXPORT_DIR):
+    """
+    Return where an export is (or would be) cached.
+
+    Args:
+        fmt (str): A key of EXPORT_FORMATS.
+        key_parts (list): JSON-serializable values identifying the exported
+            rows, e.g. the dataset fingerprint and the active filters.
+        directory (str): Export cache directory.
+
+    Returns:
+        str: Path of the cached file; it exists only once built.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {list(EXPORT_FORMATS)}.")
+    return os.path.join(directory, fingerprint(fmt, key_parts) + EXPORT_FORMATS[fmt][1])
+
+
+@timed("export.build")
+def build_export(df, fmt, key_parts, summaries=None, directory=DEFAULT_EXPORT_DIR):
+    """
+    Write ``df`` in ``fmt`` to the export cache unless it is already there.
+
+    Args:
+        df (pd.DataFrame): Rows to export.
+        fmt (str): A key of EXPORT_FORMATS.
+        key_parts (list): Values identifying ``df``; see export_path().
+        summaries (dict, optional): Sheet name -> DataFrame, xlsx only.
+        directory (str): Export cache directory.
+
+    Returns:
+        str: Path of the export file.
+    """
+    return cached_export(fmt, key_parts, lambda path: _write(df, fmt, path, summaries), directory)
+
+
+def cached_export(fmt, key_parts, write, directory=DEFAULT_EXPORT_DIR):
+    """
+    Produce an export file with ``write(path)`` unless it is already cached.
+
+    Files are written under a temporary name and renamed into place, so a
+    concurrent reader never sees a partial file, and concurrent builds of
+    the same export run once. The oldest files beyond MAX_EXPORT_FILES are
+    removed.
+
+    Args:
+        fmt (str): A key of EXPORT_FORMATS.
+        key_parts (list): Values identifying the exported rows; see export_path().
+        write (callable): Writes the export, in ``fmt``, to the path it is given.
+        directory (str): Export cache directory.
+
+    Returns:
+        str: Path of the export file.
+    """
+    path = export_path(fmt, key_parts, directory)
+    with _build_locks_lock:
+        lock = _build_locks.setdefault(path, threading.Lock())
+    with lock:
+        try:
+            if os.path.exists(path):
+                return path
+            os.makedirs(directory, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                write(tmp)
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        finally:
+            # Callers already waiting hold the lock; later ones find the file
+            with _build_locks_lock:
+                _build_locks.pop(path, None)
+    _evict(directory)
+    return path
+
+
+def _evict(directory, max_files=MAX_EXPORT_FILES):
+    entries = []
+    try:
+        for entry in os.scandir(directory):
+            if not entry.name.endswith(".tmp"):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    # Removed by a concurrent eviction
+                    pass
+    except FileNotFoundError:
+        return
+    entries.sort(reverse=True)
+    for _, path in entries[max_files:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from src.data_loader import dataset_fingerprint
+from src.perf import timed
+from src.shared_cache import shared_cache
+
+
+class FilterIndex:
+    """
+    Precomputed index for Region / Product / Date slicing of a sales frame.
+
+    Rows are addressed in Date order, so a date range is a contiguous run
+    found by binary search. The index keeps a reference to the frame plus
+    the permutation that sorts it (none when it is already in date order)
+    rather than a sorted copy. For every (Region, Product) pair it keeps the
+    date-ordered positions of that pair, so a selection only touches the
+    rows it returns instead of scanning the whole table.
+    """
+
+    @timed("filter.build_index")
+    def __init__(self, df):
+        self.frame = df
+        dates = df["Date"].to_numpy()
+        order = np.argsort(dates, kind="stable")
+        if (order == np.arange(len(order))).all():
+            self._order = None
+            self.dates = dates
+        else:
+            self._order = order
+            self.dates = dates[order]
+
+        region_codes, self.regions = pd.factorize(df["Region"], sort=True)
+        product_codes, self.products = pd.factorize(df["Product"], sort=True)
+        if self._order is not None:
+            region_codes, product_codes = region_codes[order], product_codes[order]
+        n_pairs = len(self.regions) * len(self.products)
+        pair_codes = region_codes.astype(np.int64) * len(self.products) + product_codes
+        # Rows with a missing Region or Product go to a trailing bucket that
+        # no selection can reach, matching the `isin` semantics.
+        missing = (region_codes < 0) | (product_codes < 0)
+        pair_codes[missing] = n_pairs
+        self._complete = not missing.any()
+
+        # A stable sort keeps each pair's positions in date order.
+        self._positions = np.argsort(pair_codes, kind="stable")
+        counts = np.bincount(pair_codes, minlength=n_pairs + 1)
+        self._offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def nbytes(self):
+        """Memory held by the index itself, not counting the frame it refers to."""
+        owned = [self._positions, self._offsets]
+        if self._order is not None:
+            owned += [self._order, self.dates]
+        return (sum(array.nbytes for array in owned)
+                + int(self.regions.memory_usage(deep=True)) + int(self.products.memory_usage(deep=True)))
+
+    def date_bounds(self, start_date, end_date):
+        """Return the [lo, hi) run of date-ordered positions from start_date through all of end_date."""
+        start = pd.Timestamp(start_date).normalize()
+        stop = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+        lo = np.searchsorted(self.dates, start.to_datetime64(), side="left")
+        hi = np.searchsorted(self.dates, stop.to_datetime64(), side="left")
+        return int(lo), int(max(lo, hi))
+
+    def _codes(self, categories, selected):
+        codes = categories.get_indexer(pd.Index(list(selected)))
+        return np.unique(codes[codes >= 0])
+
+    def _resolve(self, regions, products, start_date, end_date):
+        """Return (lo, hi, positions); positions is None when [lo, hi) is the answer."""
+        lo, hi = self.date_bounds(start_date, end_date)
+        region_codes = self._codes(self.regions, regions)
+        product_codes = self._codes(self.products, products)
+        if (self._complete and len(region_codes) == len(self.regions)
+                and len(product_codes) == len(self.products)):
+            return lo, hi, None
+
+        parts = []
+        for r in region_codes:
+            for p in product_codes:
+                k = r * len(self.products) + p
+                segment = self._positions[self._offsets[k]:self._offsets[k + 1]]
+                a, b = np.searchsorted(segment, [lo, hi])
+                if b > a:
+                    parts.append(segment[a:b])
+        if not parts:
+            return lo, hi, np.empty(0, dtype=np.int64)
+        positions = np.concatenate(parts)
+        if len(parts) > 1:
+            positions.sort()
+        return lo, hi, positions
+
+    def positions(self, regions, products, start_date, end_date):
+        """
+        Date-ordered positions (see rows()) matching the selection.
+
+        Args:
+            regions (list): Regions to include.
+            products (list): Products to include.
+            start_date: First date to include.
+            end_date: Last date to include.
+
+        Returns:
+            np.ndarray: Sorted positions of the matching rows.
+        """
+        lo, hi, positions = self._resolve(regions, products, start_date, end_date)
+        return np.arange(lo, hi) if positions is None else positions
+
+    def rows(self, positions):
+        """Return the rows of ``self.frame`` at date-ordered ``positions``, in frame order."""
+        if self._order is None:
+            return self.frame.take(positions)
+        # Gathering in frame order reads the columns sequentially
+        return self.frame.take(np.sort(self._order[positions]))
+
+    @timed("filter.select")
+    def select(self, regions, products, start_date, end_date):
+        """
+        Return the rows matching the Region, Product and Date filters; both
+        ends of the date range are whole days.
+
+        Rows keep the frame's order and index labels, as with a boolean mask.
+        When every region and product is selected the result is the frame
+        itself or, if it is in date order, a slice of it; otherwise only the
+        matching rows are gathered.
+        """
+        lo, hi, positions = self._resolve(regions, products, start_date, end_date)
+        if positions is None:
+            if lo == 0 and hi == len(self):
+                return self.frame
+            if self._order is None:
+                return self.frame.iloc[lo:hi]
+            return self.rows(np.arange(lo, hi))
+        return self.rows(positions)
+
+
+def get_filter_index(df):
+    """Return the FilterIndex for a dataset, building it once per fingerprint."""
+    return shared_cache.get_or_create("filter_indexes", dataset_fingerprint(df), lambda: FilterIndex(df))
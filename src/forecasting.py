@@ -1,24 +1,344 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
 import pandas as pd
-from prophet import Prophet
 
-def forecast_sales(df, periods=30):
+from src.model_cache import DEFAULT_CACHE_DIR, ModelCache, fingerprint
+from src.perf import timed
+from src.shared_cache import shared_cache
+
+# Two-sided normal quantile for an 80% interval, Prophet's default width.
+_INTERVAL_Z = 1.2816
+
+BACKENDS = {
+    "prophet": "Prophet",
+    "fourier": "Fast (trend + Fourier seasonality)",
+}
+
+# Columns that split the data into series for forecast_panel.
+PANEL_DIMENSIONS = ["Region", "Product"]
+
+_model_caches = {}
+
+
+class FourierModel:
+    """
+    Linear trend plus Fourier seasonality fitted by ridge-regularized least squares.
+
+    A NumPy-only stand-in for Prophet on daily series: the design matrix is
+    an intercept, a linear trend and sin/cos pairs for yearly and weekly
+    seasonality. The seasonal coefficients are shrunk slightly, like
+    Prophet's seasonality prior, so short histories do not overfit.
+    """
+
+    def __init__(self, yearly_seasonality=True, weekly_seasonality=False,
+                 yearly_order=10, weekly_order=3, ridge=1.0):
+        self.yearly_seasonality = yearly_seasonality
+        self.weekly_seasonality = weekly_seasonality
+        self.yearly_order = yearly_order
+        self.weekly_order = weekly_order
+        self.ridge = ridge
+        self.start = None
+        self.span = None
+        self.n_obs = None
+        self.scale = None
+        self.coef = None
+        self.sigma = None
+
+    def _design(self, ds):
+        days = (pd.DatetimeIndex(ds) - self.start).days.to_numpy(dtype=float)
+        columns = [np.ones_like(days), days / self.span]
+        periods = []
+        if self.yearly_seasonality:
+            periods.append((365.25, self.yearly_order))
+        if self.weekly_seasonality:
+            periods.append((7.0, self.weekly_order))
+        for period, order in periods:
+            for k in range(1, order + 1):
+                angle = 2 * np.pi * k * days / period
+                columns.extend([np.sin(angle), np.cos(angle)])
+        return np.column_stack(columns)
+
+    def fit(self, ds, y):
+        """Fit on a daily series given as dates ``ds`` and values ``y``."""
+        ds = pd.DatetimeIndex(ds)
+        y = np.asarray(y, dtype=float)
+        self.start = ds.min()
+        self.span = max((ds.max() - self.start).days, 1)
+        self.n_obs = len(y)
+        self.scale = float(np.abs(y).max()) or 1.0
+
+        X = self._design(ds)
+        penalty = np.full(X.shape[1], self.ridge)
+        penalty[:2] = 0.0  # intercept and trend are not shrunk
+        A = X.T @ X + np.diag(penalty)
+        self.coef = np.linalg.solve(A, X.T @ (y / self.scale))
+        residuals = y - X @ self.coef * self.scale
+        dof = max(len(y) - X.shape[1], 1)
+        self.sigma = float(np.sqrt(residuals @ residuals / dof))
+        return self
+
+    def predict(self, ds):
+        """Return a frame with 'ds', 'yhat', 'yhat_lower' and 'yhat_upper'."""
+        ds = pd.DatetimeIndex(ds)
+        yhat = self._design(ds) @ self.coef * self.scale
+        # Widen the interval with distance past the end of the training data.
+        horizon = np.clip((ds - self.start).days.to_numpy(dtype=float) - self.span, 0, None)
+        width = _INTERVAL_Z * self.sigma * np.sqrt(1 + horizon / self.n_obs)
+        return pd.DataFrame({
+            'ds': ds,
+            'yhat': yhat,
+            'yhat_lower': yhat - width,
+            'yhat_upper': yhat + width,
+        })
+
+    def to_json(self):
+        state = dict(vars(self))
+        state['start'] = str(self.start)
+        state['coef'] = self.coef.tolist()
+        return json.dumps(state)
+
+    @classmethod
+    def from_json(cls, text):
+        state = json.loads(text)
+        model = cls()
+        model.__dict__.update(state)
+        model.start = pd.Timestamp(state['start'])
+        model.coef = np.asarray(state['coef'])
+        return model
+
+
+def daily_sales(df):
+    """
+    Aggregate transactions to a daily Sales series.
+
+    Days without transactions are filled with zero so the series is regular.
+
+    Returns:
+        pd.DataFrame: Columns 'ds' (one row per day) and 'y' (total Sales).
+    """
+    dates = pd.to_datetime(df['Date']).dt.normalize()
+    daily = df['Sales'].groupby(dates).sum()
+    if not daily.empty:
+        daily = daily.reindex(pd.date_range(daily.index.min(), daily.index.max(), freq='D'), fill_value=0)
+    return pd.DataFrame({'ds': daily.index, 'y': daily.to_numpy(dtype=float)})
+
+
+def _model_cache(backend):
+    if backend not in _model_caches:
+        # One directory per backend, so each keeps its own max_files budget
+        directory = os.path.join(DEFAULT_CACHE_DIR, backend)
+        if backend == 'prophet':
+            from prophet.serialize import model_from_json, model_to_json
+            _model_caches[backend] = ModelCache(dumps=model_to_json, loads=model_from_json, directory=directory)
+        else:
+            _model_caches[backend] = ModelCache(
+                dumps=FourierModel.to_json, loads=FourierModel.from_json, directory=directory)
+    return _model_caches[backend]
+
+
+def _fit_params(backend, yearly_seasonality, weekly_seasonality, daily_seasonality):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown forecasting backend '{backend}'.")
+    params = {
+        'backend': backend,
+        'yearly_seasonality': yearly_seasonality,
+        'weekly_seasonality': weekly_seasonality,
+        'daily_seasonality': daily_seasonality,
+    }
+    if backend == 'prophet':
+        from prophet import __version__ as prophet_version
+        params['version'] = prophet_version
+    return params
+
+
+def _series_key(series, params):
+    return fingerprint(series['ds'].to_numpy('datetime64[ns]'), series['y'], params)
+
+
+def _fit_series(series, params):
+    """Fit one daily series with the backend and flags described by params."""
+    if params['backend'] == 'fourier':
+        return FourierModel(params['yearly_seasonality'], params['weekly_seasonality']).fit(
+            series['ds'], series['y'])
+    from prophet import Prophet
+    model = Prophet(
+        yearly_seasonality=params['yearly_seasonality'],
+        weekly_seasonality=params['weekly_seasonality'],
+        daily_seasonality=params['daily_seasonality'],
+    )
+    model.fit(series)
+    return model
+
+
+def _predict(model, backend, periods):
+    if backend == 'fourier':
+        history = pd.date_range(model.start, periods=model.span + 1, freq='D')
+        future = history.append(pd.date_range(history[-1] + pd.Timedelta(days=1), periods=periods, freq='D'))
+        return model.predict(future)
+    future = model.make_future_dataframe(periods=periods)
+    return model.predict(future)[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+
+
+def fit_model(df, yearly_seasonality=True, weekly_seasonality=False, daily_seasonality=False,
+              backend='prophet'):
     """
-    Forecast future sales using Prophet.
+    Return a model fitted on the daily Sales series, reusing a cached fit when possible.
+
+    Args:
+        df (pd.DataFrame): DataFrame with columns 'Date' (datetime) and 'Sales' (numeric).
+        yearly_seasonality (bool): Fit a yearly seasonal component.
+        weekly_seasonality (bool): Fit a weekly seasonal component.
+        daily_seasonality (bool): Fit a daily seasonal component (Prophet only).
+        backend (str): One of BACKENDS.
+
+    Returns:
+        tuple: (fitted model, cache key of the fit).
+    """
+    params = _fit_params(backend, yearly_seasonality, weekly_seasonality, daily_seasonality)
+    series = daily_sales(df)
+    key = _series_key(series, params)
+    return _model_cache(backend).get_or_fit(key, lambda: _fit_series(series, params)), key
+
+
+@timed("forecast.forecast_sales")
+def forecast_sales(df, periods=30, yearly_seasonality=True, weekly_seasonality=False,
+                   daily_seasonality=False, backend='prophet'):
+    """
+    Forecast future daily sales.
+
+    Transactions are first aggregated to daily totals. Fitted models are
+    cached in memory and on disk, keyed on that series, the backend and the
+    seasonality flags, and forecasts are memoized per horizon.
 
     Args:
         df (pd.DataFrame): DataFrame with columns 'Date' (datetime) and 'Sales' (numeric).
         periods (int): Number of future periods (days) to forecast.
+        yearly_seasonality (bool): Fit a yearly seasonal component.
+        weekly_seasonality (bool): Fit a weekly seasonal component.
+        daily_seasonality (bool): Fit a daily seasonal component (Prophet only).
+        backend (str): 'prophet', or 'fourier' for the NumPy trend + seasonality model.
 
     Returns:
         pd.DataFrame: Forecast dataframe with columns 'ds', 'yhat', 'yhat_lower', 'yhat_upper'.
     """
-    # Ensure 'Date' is datetime
-    df_prophet = df[['Date', 'Sales']].copy()
-    df_prophet['Date'] = pd.to_datetime(df_prophet['Date'])
-    df_prophet = df_prophet.rename(columns={'Date': 'ds', 'Sales': 'y'})
+    model, key = fit_model(df, yearly_seasonality, weekly_seasonality, daily_seasonality, backend)
+    forecast = shared_cache.get_or_create("forecasts", (key, periods), lambda: _predict(model, backend, periods))
+    # Shallow: callers adding columns must not change the shared cached frame
+    return forecast.copy(deep=False)
 
-    model = Prophet(yearly_seasonality=True, weekly_seasonality=False, daily_seasonality=False)
-    model.fit(df_prophet)
-    future = model.make_future_dataframe(periods=periods)
-    forecast = model.predict(future)
-    return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+
+def _fit_and_predict(series, params, periods):
+    """
+    Fit and predict one panel series.
+
+    Runs in a worker process, so the fitted model travels back as JSON.
+    """
+    model = _fit_series(series, params)
+    return _predict(model, params['backend'], periods), _model_cache(params['backend']).dumps(model)
+
+
+def panel_series(df, by=PANEL_DIMENSIONS):
+    """
+    Split transactions into one zero-filled daily Sales series per group.
+
+    Returns:
+        dict: Mapping of group key tuple to a 'ds'/'y' frame.
+    """
+    dates = pd.to_datetime(df['Date']).dt.normalize().rename('Date')
+    grouped = df['Sales'].groupby([df[col] for col in by] + [dates], observed=True).sum()
+    panel = {}
+    for key, daily in grouped.groupby(level=list(range(len(by))), observed=True):
+        daily = daily.droplevel(list(range(len(by))))
+        daily = daily.reindex(pd.date_range(daily.index.min(), daily.index.max(), freq='D'), fill_value=0)
+        key = key if isinstance(key, tuple) else (key,)
+        panel[key] = pd.DataFrame({'ds': daily.index, 'y': daily.to_numpy(dtype=float)})
+    return panel
+
+
+@timed("forecast.forecast_panel")
+def forecast_panel(df, periods=30, yearly_seasonality=True, weekly_seasonality=False,
+                   daily_seasonality=False, backend='fourier', by=PANEL_DIMENSIONS,
+                   parallel=None, max_workers=None, progress=None):
+    """
+    Forecast every Region x Product series (or another panel split) in parallel.
+
+    Series with a cached fit are only predicted; the rest are fitted, in a
+    process pool of at most ``max_workers`` workers when ``parallel``, and
+    their models are added to the model cache. The whole panel forecast is
+    memoized per horizon like forecast_sales.
+
+    Args:
+        df (pd.DataFrame): Transactions with 'Date', 'Sales' and the ``by`` columns.
+        periods (int): Number of future periods (days) to forecast.
+        yearly_seasonality (bool): Fit a yearly seasonal component.
+        weekly_seasonality (bool): Fit a weekly seasonal component.
+        daily_seasonality (bool): Fit a daily seasonal component (Prophet only).
+        backend (str): One of BACKENDS.
+        by (list): Columns that define a series.
+        parallel (bool, optional): Fit in a process pool. Defaults to True for
+            Prophet; Fourier fits take milliseconds, less than starting a worker.
+        max_workers (int, optional): Pool size; defaults to the CPU count.
+        progress (callable, optional): Called as ``progress(done, total, key)``
+            after each series finishes.
+
+    Returns:
+        pd.DataFrame: Long-format forecast with the ``by`` columns followed by
+        'ds', 'yhat', 'yhat_lower' and 'yhat_upper'.
+    """
+    params = _fit_params(backend, yearly_seasonality, weekly_seasonality, daily_seasonality)
+    panel = panel_series(df, by)
+    keys = {group: _series_key(series, params) for group, series in panel.items()}
+    panel_key = (fingerprint(list(by), sorted(keys.values())), periods)
+    cached = shared_cache.get("forecasts", panel_key)
+    if cached is not None:
+        return cached.copy(deep=False)
+
+    cache = _model_cache(backend)
+    total = len(panel)
+    frames = {}
+
+    def finish(group, forecast):
+        frames[group] = forecast.assign(**dict(zip(by, group)))
+        if progress is not None:
+            progress(len(frames), total, group)
+
+    to_fit = []
+    for group, series in panel.items():
+        model = cache.get(keys[group])
+        if model is None:
+            to_fit.append(group)
+        else:
+            finish(group, _predict(model, backend, periods))
+
+    if parallel is None:
+        parallel = backend == 'prophet'
+    if parallel and len(to_fit) > 1:
+        workers = max(1, min(max_workers or os.cpu_count() or 1, len(to_fit)))
+        # 'spawn' keeps workers independent of the (threaded) Streamlit server process.
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = {
+                pool.submit(_fit_and_predict, panel[group], params, periods): group
+                for group in to_fit
+            }
+            for future in as_completed(futures):
+                group = futures[future]
+                forecast, model_json = future.result()
+                cache.put(keys[group], cache.loads(model_json))
+                finish(group, forecast)
+    else:
+        for group in to_fit:
+            model = cache.get_or_fit(keys[group], lambda: _fit_series(panel[group], params))
+            finish(group, _predict(model, backend, periods))
+
+    columns = list(by) + ['ds', 'yhat', 'yhat_lower', 'yhat_upper']
+    if frames:
+        result = pd.concat([frames[group] for group in panel], ignore_index=True)[columns]
+    else:
+        result = pd.DataFrame(columns=columns)
+    shared_cache.put("forecasts", panel_key, result)
+    return result.copy(deep=False)
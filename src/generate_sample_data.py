@@ -1,55 +1,233 @@
 # src/generate_sample_data.py
 
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
-import random
+import argparse
 import os
 
-def generate_sample_data(output_path="data/sample_sales_data.csv", num_days=100):
+import numpy as np
+import pandas as pd
+
+REGIONS = ['Central', 'Northern', 'Southern']
+PRODUCTS = ['Maize Seeds', 'Fertilizer', 'Pesticides', 'Irrigation Kit', 'Animal Feed']
+GENDERS = ['Male', 'Female']
+COLUMNS = ['Customer ID', 'Date', 'Region', 'Product', 'Sales', 'Profit', 'Customer Age', 'Customer Gender']
+
+# Share of customers living in each region.
+REGION_WEIGHTS = np.array([0.45, 0.20, 0.35])
+# Product mix per region (rows follow REGIONS, columns PRODUCTS).
+REGION_PRODUCT_MIX = np.array([
+    [0.30, 0.30, 0.15, 0.10, 0.15],
+    [0.25, 0.20, 0.15, 0.05, 0.35],
+    [0.20, 0.25, 0.20, 0.20, 0.15],
+])
+# Demand multiplier per product and calendar month (Jan..Dec): seed and
+# fertilizer peak at planting (Oct-Dec), pesticides in the rains, irrigation
+# kits in the dry season.
+PRODUCT_SEASON = np.ones((len(PRODUCTS), 12))
+PRODUCT_SEASON[0, 9:12] = PRODUCT_SEASON[1, 9:12] = 2.0
+PRODUCT_SEASON[2, 0:3] = 1.5
+PRODUCT_SEASON[3, 5:9] = 1.5
+# Typical basket value (MWK) and profit margin range per product.
+PRODUCT_PRICE = np.array([3000, 8000, 4500, 9500, 2500])
+PRODUCT_MARGIN = np.array([[0.10, 0.30], [0.08, 0.20], [0.15, 0.35], [0.20, 0.40], [0.10, 0.25]])
+# Relative traffic Monday..Sunday.
+WEEKDAY_WEIGHTS = np.array([1.0, 0.95, 0.95, 1.0, 1.1, 1.25, 0.6])
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+def _cdf(weights):
+    cdf = np.cumsum(weights, axis=-1)
+    return cdf / cdf[..., -1:]
+
+
+def _draw(rng, cdf, n):
+    """Draw n category codes from a cumulative distribution."""
+    return np.minimum(np.searchsorted(cdf, rng.random(n), side='right'), len(cdf) - 1)
+
+
+def _draw_rows(rng, cdf_rows):
+    """Draw one code per row from per-row cumulative distributions of shape (n, k)."""
+    return np.minimum((rng.random(len(cdf_rows))[:, None] >= cdf_rows).sum(axis=1), cdf_rows.shape[1] - 1)
+
+
+def _calendar(start, num_days, rng, growth, anomaly_days):
+    """Per-day traffic weights and sales multipliers, and each day's month."""
+    dates = pd.date_range(start, periods=num_days, freq='D')
+    t = np.arange(num_days)
+    # Yearly peak in mid-December, trough in June; steady growth; weekday pattern.
+    yearly = 1 + 0.3 * np.cos(2 * np.pi * (dates.dayofyear.to_numpy() - 350) / 365.25)
+    traffic = yearly * (1 + growth * t / 365.25) * WEEKDAY_WEIGHTS[dates.dayofweek.to_numpy()]
+    traffic *= rng.lognormal(0, 0.1, num_days)
+
+    # Whole days whose sales jump, e.g. a promotion or a double-posted batch.
+    multiplier = np.ones(num_days)
+    if anomaly_days:
+        multiplier[rng.choice(num_days, size=min(anomaly_days, num_days), replace=False)] = 3.0
+    return dates, traffic, multiplier, dates.month.to_numpy() - 1
+
+
+def _customers(rng, num_customers):
+    """Customer attributes; a heavy-tailed activity weight makes some buy far more often."""
+    return {
+        'activity_cdf': _cdf(rng.lognormal(0, 1.0, num_customers)),
+        'home_region': _draw(rng, _cdf(REGION_WEIGHTS), num_customers),
+        'preferred_product': rng.integers(0, len(PRODUCTS), num_customers),
+        'age': rng.integers(18, 66, num_customers),
+        'gender': rng.integers(0, len(GENDERS), num_customers),
+    }
+
+
+def iter_sample_chunks(num_rows=3000, num_customers=None, num_days=300, start_date="2024-01-01",
+                       seed=42, anomaly_rate=0.002, growth=0.15, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Generate synthetic transactions as DataFrames of up to ``chunk_rows`` rows.
+
+    Rows come out in date order across chunks. Each transaction belongs to
+    one of ``num_customers`` customers, who mostly buy in their home region
+    and often their preferred product; daily traffic follows a yearly cycle,
+    a weekday pattern and steady growth; the product mix depends on region
+    and month. Anomalies are injected as single transactions 5-10x their
+    usual value (``anomaly_rate`` of rows) and a few whole days at 3x sales.
+
+    Args:
+        num_rows (int): Total transactions.
+        num_customers (int, optional): Distinct customers; defaults to num_rows // 8.
+        num_days (int): Days covered, starting at ``start_date``.
+        start_date (str): First date.
+        seed (int): Random seed; output is reproducible for a given chunk size.
+        anomaly_rate (float): Fraction of transactions turned into spikes.
+        growth (float): Yearly traffic growth.
+        chunk_rows (int): Rows per yielded DataFrame.
+
+    Yields:
+        pd.DataFrame: Chunks with the columns in COLUMNS.
+    """
+    seeds = np.random.SeedSequence(seed)
+    setup_seed, chunk_seed = seeds.spawn(2)
+    rng = np.random.default_rng(setup_seed)
+
+    num_customers = max(1, num_customers or num_rows // 8)
+    dates, traffic, day_multiplier, day_month = _calendar(
+        start_date, num_days, rng, growth, anomaly_days=max(1, num_days // 180) if anomaly_rate else 0
+    )
+    customers = _customers(rng, num_customers)
+    # Rows per day, fixed up front so chunks split the timeline in order.
+    day_ends = np.cumsum(rng.multinomial(num_rows, traffic / traffic.sum()))
+    # Product probabilities per (region, month).
+    mix_cdf = _cdf(REGION_PRODUCT_MIX[:, None, :] * PRODUCT_SEASON.T[None, :, :])
+    region_cdf = _cdf(REGION_WEIGHTS)
+    margin_low, margin_high = PRODUCT_MARGIN[:, 0], PRODUCT_MARGIN[:, 1]
+    regions = pd.CategoricalDtype(REGIONS)
+    products = pd.CategoricalDtype(PRODUCTS)
+    genders = pd.CategoricalDtype(GENDERS)
+
+    starts = range(0, num_rows, chunk_rows)
+    for lo, child_seed in zip(starts, chunk_seed.spawn(len(starts))):
+        rng = np.random.default_rng(child_seed)
+        hi = min(lo + chunk_rows, num_rows)
+        n = hi - lo
+        day = np.searchsorted(day_ends, np.arange(lo, hi), side='right')
+
+        customer = _draw(rng, customers['activity_cdf'], n)
+        region = np.where(rng.random(n) < 0.9, customers['home_region'][customer], _draw(rng, region_cdf, n))
+        product = _draw_rows(rng, mix_cdf[region, day_month[day]])
+        product = np.where(rng.random(n) < 0.4, customers['preferred_product'][customer], product)
+
+        sales = PRODUCT_PRICE[product] * rng.lognormal(0, 0.35, n) * day_multiplier[day]
+        spikes = rng.random(n) < anomaly_rate
+        sales[spikes] *= rng.uniform(5, 10, spikes.sum())
+        sales = np.maximum(np.round(sales), 100).astype(np.int64)
+        profit = (sales * rng.uniform(margin_low[product], margin_high[product])).astype(np.int64)
+
+        yield pd.DataFrame({
+            'Customer ID': customer + 1,
+            'Date': dates[day],
+            'Region': pd.Categorical.from_codes(region, dtype=regions),
+            'Product': pd.Categorical.from_codes(product, dtype=products),
+            'Sales': sales,
+            'Profit': profit,
+            'Customer Age': customers['age'][customer] + day // 365,
+            'Customer Gender': pd.Categorical.from_codes(customers['gender'][customer], dtype=genders),
+        }, columns=COLUMNS)
+
+
+def make_sample_frame(num_rows=3000, **kwargs):
+    """Generate synthetic transactions in memory; takes iter_sample_chunks() arguments."""
+    return pd.concat(list(iter_sample_chunks(num_rows, **kwargs)), ignore_index=True)
+
+
+def generate_sample_data(output_path="data/sample_sales_data.csv", num_days=300, num_rows=3000,
+                         num_customers=None, start_date="2024-01-01", seed=42, anomaly_rate=0.002,
+                         chunk_rows=DEFAULT_CHUNK_ROWS, file_format=None):
     """
     Generate sample sales data for the SME BI Dashboard.
 
+    Chunks from iter_sample_chunks() are written as they are generated,
+    so memory use depends on ``chunk_rows`` rather than the total size.
+
     Args:
-        output_path (str): Path to save the generated CSV file.
+        output_path (str): Path to save the generated file.
         num_days (int): Number of days of data to generate.
+        num_rows (int): Number of transactions.
+        num_customers (int, optional): Distinct customers; defaults to num_rows // 8.
+        start_date (str): First date.
+        seed (int): Random seed.
+        anomaly_rate (float): Fraction of transactions turned into spikes.
+        chunk_rows (int): Rows generated and written at a time.
+        file_format (str, optional): "csv" or "parquet"; inferred from the
+            file extension when omitted.
     """
-    np.random.seed(42)
-    random.seed(42)
-
-    regions = ['Central', 'Northern', 'Southern']
-    products = ['Maize Seeds', 'Fertilizer', 'Pesticides', 'Irrigation Kit', 'Animal Feed']
-    genders = ['Male', 'Female']
-
-    start_date = datetime(2024, 1, 1)
-    dates = [start_date + timedelta(days=i) for i in range(num_days)]
-
-    data = []
-    for i, date in enumerate(dates):
-        region = random.choice(regions)
-        product = random.choice(products)
-        sales = random.randint(1000, 10000)
-        profit = int(sales * random.uniform(0.1, 0.3))
-        age = random.randint(18, 65)
-        gender = random.choice(genders)
-
-        data.append({
-            "Customer ID": i + 1,
-            "Date": date.strftime("%Y-%m-%d"),
-            "Region": region,
-            "Product": product,
-            "Sales": sales,
-            "Profit": profit,
-            "Customer Age": age,
-            "Customer Gender": gender
-        })
-
-    df = pd.DataFrame(data)
-
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    df.to_csv(output_path, index=False)
+    file_format = file_format or ('parquet' if output_path.endswith('.parquet') else 'csv')
+    if file_format not in ('csv', 'parquet'):
+        raise ValueError(f"Unsupported format {file_format!r}; use 'csv' or 'parquet'.")
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    chunks = iter_sample_chunks(num_rows, num_customers=num_customers, num_days=num_days,
+                                start_date=start_date, seed=seed, anomaly_rate=anomaly_rate,
+                                chunk_rows=chunk_rows)
+    if file_format == 'csv':
+        with open(output_path, 'w', newline='', encoding='utf-8') as f:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(f, header=(i == 0), index=False, date_format='%Y-%m-%d')
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
 
     print(f"Sample data saved to {output_path}")
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic SME sales transactions.")
+    parser.add_argument("--output", default="data/sample_sales_data.csv",
+                        help="Output file; a .parquet extension writes Parquet.")
+    parser.add_argument("--rows", type=int, default=3000, help="Number of transactions.")
+    parser.add_argument("--customers", type=int, default=None, help="Distinct customers (default rows // 8).")
+    parser.add_argument("--days", type=int, default=300, help="Days of data.")
+    parser.add_argument("--start", default="2024-01-01", help="First date (YYYY-MM-DD).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--anomaly-rate", type=float, default=0.002,
+                        help="Fraction of transactions turned into spikes.")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--format", choices=["csv", "parquet"], default=None)
+    args = parser.parse_args()
+
+    generate_sample_data(
+        output_path=args.output, num_days=args.days, num_rows=args.rows,
+        num_customers=args.customers, start_date=args.start, seed=args.seed,
+        anomaly_rate=args.anomaly_rate, chunk_rows=args.chunk_rows, file_format=args.format
+    )
+
+
 if __name__ == "__main__":
-    generate_sample_data()
+    main()
@@ -0,0 +1,156 @@
+import csv
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from src.data_loader import apply_column_types, concat_frames, normalize_schema, set_fingerprint
+from src.perf import timed
+from src.shared_cache import shared_cache
+
+# Columns the dashboard expects in an uploaded file, with their Arrow types.
+SALES_SCHEMA = pa.schema([
+    ("Customer ID", pa.int64()),
+    ("Date", pa.timestamp("ns")),
+    ("Region", pa.string()),
+    ("Product", pa.string()),
+    ("Sales", pa.int64()),
+    ("Profit", pa.int64()),
+    ("Customer Age", pa.int64()),
+    ("Customer Gender", pa.string()),
+])
+
+# Bytes of raw CSV parsed per streamed batch.
+DEFAULT_BLOCK_SIZE = 16 << 20
+DEFAULT_MAX_WORKERS = 4
+# Bytes read at a time when hashing a file or looking for its header line.
+_READ_CHUNK = 1 << 20
+
+
+def _open_source(source):
+    """
+    Return a binary stream over an uploaded file, buffer, raw bytes or path.
+
+    In-memory sources are wrapped without copying their bytes; paths are
+    read from disk as the parser goes.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return pa.OSFile(os.fspath(source))
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return pa.BufferReader(pa.py_buffer(source))
+    if hasattr(source, "getbuffer"):
+        return pa.BufferReader(pa.py_buffer(source.getbuffer()))
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return pa.PythonFile(source, mode="r")
+
+
+def _source_digest(source):
+    """SHA-256 of a source's bytes, read in chunks rather than all at once."""
+    digest = hashlib.sha256()
+    with _open_source(source) as stream:
+        while chunk := stream.read(_READ_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _check_header(source, name):
+    first_line = b""
+    with _open_source(source) as stream:
+        while b"\n" not in first_line and (chunk := stream.read(_READ_CHUNK)):
+            first_line += chunk
+    first_line = first_line.split(b"\n", 1)[0]
+    header = next(csv.reader([first_line.decode("utf-8-sig").strip("\r")]), [])
+    missing = [col for col in SALES_SCHEMA.names if col not in header]
+    if missing:
+        raise ValueError(f"{name} is missing required columns: {', '.join(missing)}")
+
+
+def read_sales_csv(source, block_size=DEFAULT_BLOCK_SIZE, name="Uploaded file"):
+    """
+    Parse a sales CSV with the pyarrow engine and an explicit schema.
+
+    The file is streamed in blocks of ``block_size`` bytes, and each block
+    is converted to a compact pandas frame before the next is parsed, so
+    neither the whole raw file nor all of its Arrow batches are held
+    alongside the result; only the expected columns are materialized.
+
+    Args:
+        source: Uploaded file, binary buffer, raw bytes or path.
+        block_size (int): Bytes of CSV parsed per streamed batch.
+        name (str): Name used in error messages.
+
+    Returns:
+        pd.DataFrame: Typed DataFrame with the columns of SALES_SCHEMA,
+        compacted by normalize_schema().
+    """
+    _check_header(source, name)
+
+    frames = []
+    with _open_source(source) as stream:
+        reader = pacsv.open_csv(
+            stream,
+            read_options=pacsv.ReadOptions(block_size=block_size),
+            convert_options=pacsv.ConvertOptions(
+                column_types=SALES_SCHEMA,
+                include_columns=SALES_SCHEMA.names,
+            ),
+        )
+        for batch in reader:
+            frames.append(normalize_schema(apply_column_types(batch.to_pandas(split_blocks=True))))
+            del batch
+    if not frames:
+        return normalize_schema(apply_column_types(SALES_SCHEMA.empty_table().to_pandas()))
+    # Blocks can differ in integer width or fall under the categorical
+    # threshold on their own, so the combined frame is normalized again.
+    return normalize_schema(frames[0] if len(frames) == 1 else concat_frames(frames))
+
+
+def _read_one(source, digest, name, block_size):
+    return shared_cache.get_or_create(
+        "uploads", digest, lambda: read_sales_csv(source, block_size=block_size, name=name)
+    )
+
+
+@timed("ingestion.read_uploads")
+def read_uploads(files, max_workers=DEFAULT_MAX_WORKERS, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Parse one or more uploaded sales CSVs (e.g. monthly exports) into one frame.
+
+    Files are parsed concurrently and each parsed file is cached by the
+    SHA-256 of its bytes, so Streamlit reruns with the same uploads do not
+    re-parse anything.
+
+    Args:
+        files (list): Uploaded files, buffers or paths.
+        max_workers (int): Maximum number of files parsed at once.
+        block_size (int): Bytes of CSV parsed per streamed batch.
+
+    Returns:
+        pd.DataFrame: Concatenated typed DataFrame, in upload order, tagged
+        with a fingerprint of the combined upload.
+    """
+    files = list(files)
+    if not files:
+        return pd.DataFrame()
+
+    payloads = []
+    for f in files:
+        name = getattr(f, "name", None) or str(f)
+        payloads.append((f, _source_digest(f), name))
+
+    combined_key = hashlib.sha256("".join(d for _, d, _ in payloads).encode()).hexdigest()
+    combined = shared_cache.get("uploads", combined_key)
+    if combined is not None:
+        return combined
+
+    workers = max(1, min(max_workers, len(payloads)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(lambda p: _read_one(*p, block_size), payloads))
+
+    combined = frames[0] if len(frames) == 1 else concat_frames(frames)
+    set_fingerprint(combined, combined_key, source=f"upload:{combined_key}")
+    return shared_cache.put("uploads", combined_key, combined)
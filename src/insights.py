@@ -1,12 +1,14 @@
 from src.localization import format_currency
+from src.perf import timed
 
 
-def generate_insight(df):
-    """Generate a simple business insight based on regional sales."""
-    if df.empty or "Region" not in df.columns or "Sales" not in df.columns:
+@timed("insights.generate_insight")
+def generate_insight(region_sales):
+    """Generate a simple business insight from precomputed Sales per Region."""
+    if region_sales.empty or "Region" not in region_sales.columns or "Sales" not in region_sales.columns:
         return "Insufficient data to generate insights."
 
-    region_sales = df.groupby("Region")["Sales"].sum().sort_values(ascending=False)
+    region_sales = region_sales.set_index("Region")["Sales"].sort_values(ascending=False)
     top_region = region_sales.idxmax()
     drop_region = region_sales.idxmin()
     diff = region_sales.max() - region_sales.min()
@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from src.shared_cache import shared_cache
+
+DEFAULT_MAX_WORKERS = 2
+_MAX_FINISHED_JOBS = 32
+# Shared-cache namespace holding finished jobs' results.
+RESULTS_NAMESPACE = "job_results"
+# Worker thread names start with this, which tells job work apart in perf logs.
+THREAD_NAME_PREFIX = "dashboard-job"
+
+
+class Job:
+    """
+    A unit of background work and its observable state.
+
+    The job function receives the Job as its first argument and can call
+    report() to publish progress, a status message and partial results,
+    which pages read on later reruns. The final result is kept in the
+    shared cache, within its memory budget, rather than on the job; one
+    too large for the whole budget is handed to the first reader only.
+    """
+
+    def __init__(self, key, label):
+        self.key = key
+        self.label = label
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = "Waiting for a free worker..."
+        self.partial = None
+        self.error = None
+        self._oversized = None
+        self.submitted = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    @property
+    def result(self):
+        """The finished job's result, or None until then or once the shared cache has evicted it."""
+        with self._lock:
+            if self._oversized is not None:
+                result, self._oversized = self._oversized, None
+                return result
+        return shared_cache.get(RESULTS_NAMESPACE, self.key)
+
+    @property
+    def expired(self):
+        """Whether the job finished but its result has since been evicted."""
+        return (self.status == "done" and self._oversized is None
+                and (RESULTS_NAMESPACE, self.key) not in shared_cache)
+
+    def report(self, progress=None, message=None, partial=None):
+        """Publish progress (0-1), a status message and/or partial results."""
+        with self._lock:
+            if progress is not None:
+                self.progress = min(max(float(progress), 0.0), 1.0)
+            if message is not None:
+                self.message = message
+            if partial is not None:
+                self.partial = partial
+
+    def _run(self, fn, args, kwargs):
+        self.status = "running"
+        self.report(message="Running...")
+        try:
+            result = fn(self, *args, **kwargs)
+            shared_cache.put(RESULTS_NAMESPACE, self.key, result)
+            if (RESULTS_NAMESPACE, self.key) not in shared_cache:
+                self._oversized = result
+            self.status = "done"
+            self.report(progress=1.0, message="Done.")
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.status = "failed"
+            traceback.print_exc()
+        finally:
+            self.finished = time.time()
+
+
+class JobRunner:
+    """
+    Thread pool with a registry of jobs keyed on dataset fingerprint and parameters.
+
+    Submitting a job whose key is already registered returns the existing
+    job (queued, running or finished), so identical requests from
+    concurrent sessions run once. Failed jobs, and finished jobs whose
+    result the shared cache has evicted, are rerun on the next submit.
+
+    Threads suit the model code here: NumPy, scikit-learn and Prophet's
+    Stan backend spend their time outside the GIL.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=THREAD_NAME_PREFIX)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(kind, fingerprint, params=None):
+        return f"{kind}:{fingerprint}:{json.dumps(params or {}, sort_keys=True, default=str)}"
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def submit(self, kind, fingerprint, params, fn, *args, label=None, **kwargs):
+        """
+        Submit ``fn(job, *args, **kwargs)`` unless an identical job is registered.
+
+        Args:
+            kind (str): Job type, e.g. "forecast".
+            fingerprint (str): Fingerprint of the dataset the job reads.
+            params (dict): JSON-serializable parameters that change the result.
+            fn (callable): Work function; receives the Job first.
+            label (str, optional): Human-readable description.
+
+        Returns:
+            Job: The new or already registered job.
+        """
+        key = self.make_key(kind, fingerprint, params)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status != "failed" and not job.expired:
+                self._jobs.move_to_end(key)
+                return job
+            job = Job(key, label or kind)
+            self._jobs[key] = job
+            self._evict()
+        self._pool.submit(job._run, fn, args, kwargs)
+        return job
+
+    def _evict(self):
+        finished = [key for key, job in self._jobs.items() if job.done]
+        for key in finished[:max(0, len(finished) - _MAX_FINISHED_JOBS)]:
+            del self._jobs[key]
+
+    def jobs(self):
+        """Return a snapshot of all registered jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+
+
+# Shared by every session in the Streamlit server process.
+runner = JobRunner()
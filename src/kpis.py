@@ -1,3 +1,13 @@
+import numpy as np
+import pandas as pd
+
+from src.cube import get_sales_cube
+from src.data_loader import dataset_fingerprint
+from src.perf import timed
+from src.shared_cache import shared_cache
+
+
+@timed("kpis.calculate_kpis")
 def calculate_kpis(df):
     """Calculate key performance indicators from the dataframe."""
     total_sales = df["Sales"].sum()
@@ -9,3 +19,106 @@ def calculate_kpis(df):
         "Total Profit": total_profit,
         "Profit Margin (%)": profit_margin,
     }
+
+
+class KpiPrefixSums:
+    """
+    Cumulative Sales, Profit and transaction counts per (Region, Product) by day.
+
+    Built from a SalesCube, with one prefix array per pair present in the
+    data. The totals over any date range are the difference of two prefix
+    values per selected pair, so KPIs for a new range, or for a comparison
+    period, cost no scan of the data.
+    """
+
+    MEASURES = ["Sales", "Profit", "Transactions"]
+
+    @timed("kpis.build_prefix_sums")
+    def __init__(self, cube):
+        frame = cube.frame
+        pairs = frame[["Region", "Product"]].drop_duplicates().sort_values(["Region", "Product"])
+        self.pair_regions = pairs["Region"].to_numpy()
+        self.pair_products = pairs["Product"].to_numpy()
+        if frame.empty:
+            self.first_day = self.last_day = None
+            self._prefix = np.zeros((0, 1, len(self.MEASURES)))
+            return
+
+        self.first_day = frame["Date"].min()
+        self.last_day = frame["Date"].max()
+        n_days = (self.last_day - self.first_day).days + 1
+        pair_idx = pd.MultiIndex.from_frame(pairs).get_indexer(
+            pd.MultiIndex.from_frame(frame[["Region", "Product"]])
+        )
+        day_idx = (frame["Date"] - self.first_day).dt.days.to_numpy()
+
+        values = frame[self.MEASURES].to_numpy()
+        daily = np.zeros((len(pairs), n_days + 1, len(self.MEASURES)), dtype=values.dtype)
+        # Cube rows are unique per (day, region, product), so plain assignment suffices.
+        daily[pair_idx, day_idx + 1] = values
+        self._prefix = np.cumsum(daily, axis=1)
+
+    def covers(self, start_date, end_date):
+        """Whether the data spans the whole of [start_date, end_date]."""
+        if self.first_day is None:
+            return False
+        return (pd.Timestamp(start_date).normalize() >= self.first_day
+                and pd.Timestamp(end_date).normalize() <= self.last_day)
+
+    def totals(self, regions, products, start_date, end_date):
+        """
+        Sum each measure over the selection and inclusive date range.
+
+        Returns:
+            dict: Summed 'Sales', 'Profit' and 'Transactions'.
+        """
+        selected = (pd.Index(self.pair_regions).isin(list(regions))
+                    & pd.Index(self.pair_products).isin(list(products)))
+        if self.first_day is None or not selected.any():
+            return dict.fromkeys(self.MEASURES, 0)
+
+        n_days = self._prefix.shape[1] - 1
+        start = (pd.Timestamp(start_date).normalize() - self.first_day).days
+        end = (pd.Timestamp(end_date).normalize() - self.first_day).days + 1
+        start, end = min(max(start, 0), n_days), min(max(end, 0), n_days)
+        if end <= start:
+            return dict.fromkeys(self.MEASURES, 0)
+
+        prefix = self._prefix[selected]
+        sums = (prefix[:, end] - prefix[:, start]).sum(axis=0)
+        return dict(zip(self.MEASURES, sums.tolist()))
+
+    def kpis(self, regions, products, start_date, end_date):
+        """Return the calculate_kpis dictionary for a selection without scanning rows."""
+        totals = self.totals(regions, products, start_date, end_date)
+        kpis = calculate_kpis(pd.DataFrame([totals]))
+        kpis["Transactions"] = totals["Transactions"]
+        return kpis
+
+    def comparison_kpis(self, regions, products, start_date, end_date):
+        """
+        KPIs for the periods a date range is compared against.
+
+        Returns:
+            dict: 'Previous period' (the equally long range just before
+            start_date) and 'Same period last year'. A period the data does
+            not fully cover maps to None rather than to a partial total.
+        """
+        start = pd.Timestamp(start_date).normalize()
+        end = pd.Timestamp(end_date).normalize()
+        length = end - start + pd.Timedelta(days=1)
+        periods = {
+            "Previous period": (start - length, start - pd.Timedelta(days=1)),
+            "Same period last year": (start - pd.DateOffset(years=1), end - pd.DateOffset(years=1)),
+        }
+        return {
+            label: self.kpis(regions, products, p_start, p_end) if self.covers(p_start, p_end) else None
+            for label, (p_start, p_end) in periods.items()
+        }
+
+
+def get_kpi_prefix_sums(df):
+    """Return the KpiPrefixSums for a dataset, building them once per fingerprint."""
+    return shared_cache.get_or_create(
+        "kpi_prefix_sums", dataset_fingerprint(df), lambda: KpiPrefixSums(get_sales_cube(df))
+    )
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join("data", ".cache", "models")
+MAX_MODEL_FILES = 64
+
+
+def fingerprint(*parts):
+    """
+    Hash arrays, frames and JSON-serializable parameters into one cache key.
+
+    Args:
+        *parts: numpy arrays, pandas objects or JSON-serializable values.
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if hasattr(part, "to_numpy"):
+            part = part.to_numpy()
+        if isinstance(part, np.ndarray):
+            digest.update(str(part.dtype).encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+
+class ModelCache:
+    """
+    Two-tier cache for fitted models: an in-memory LRU backed by files on disk.
+
+    The memory tier serves repeated views within the process (and so across
+    Streamlit sessions); the disk tier survives app restarts and keeps the
+    ``max_files`` most recently used models. Models are written with the
+    ``dumps`` callable (model -> str) and read back with ``loads``
+    (str -> model). Sessions share one cache, so it is safe to use from
+    several threads.
+
+    Eviction counts every ``suffix`` file in ``directory``, so caches for
+    different kinds of model should each have their own directory.
+    """
+
+    def __init__(self, dumps, loads, directory=DEFAULT_CACHE_DIR, max_items=8, suffix=".json",
+                 max_files=MAX_MODEL_FILES):
+        self.dumps = dumps
+        self.loads = loads
+        self.directory = directory
+        self.max_items = max_items
+        self.suffix = suffix
+        self.max_files = max_files
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _remember(self, key, model):
+        with self._lock:
+            self._memory[key] = model
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached model for a key, or None."""
+        with self._lock:
+            model = self._memory.get(key)
+            if model is not None:
+                self._memory.move_to_end(key)
+                return model
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                model = self.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # A truncated or incompatible file is treated as a miss and refitted.
+            print(f"Ignoring unreadable model cache {path}: {e}")
+            return None
+        try:
+            # Reads count as use, so eviction drops the least recently used files
+            os.utime(path)
+        except OSError:
+            pass
+        self._remember(key, model)
+        return model
+
+    def put(self, key, model):
+        """Store a model in memory and, best effort, on disk."""
+        self._remember(key, model)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "w") as f:
+                f.write(self.dumps(model))
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Could not write model cache {path}: {e}")
+            return
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(self.suffix):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except FileNotFoundError:
+                        # Removed by a concurrent eviction
+                        pass
+        except FileNotFoundError:
+            return
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_files:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get_or_fit(self, key, fit):
+        """Return the cached model for a key, calling ``fit()`` and storing it on a miss."""
+        model = self.get(key)
+        if model is None:
+            model = fit()
+            self.put(key, model)
+        return model
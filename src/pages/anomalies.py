@@ -0,0 +1,90 @@
+import streamlit as st
+
+from src.anomaly_detection import (
+    PANEL_LEVELS, detect_sales_anomalies, get_streaming_detector, scan_panel_anomalies
+)
+from src.ui import background_result
+from src.visuals import cached_figure, sales_anomaly_chart
+
+STREAMING_MODE = "Streaming (new data only)"
+PANEL_MODE = "Panel scan (Region / Product)"
+BATCH_MODE = "Batch (Isolation Forest)"
+
+
+def anomalies_page(df):
+    st.title("Real-Time Sales Anomaly Detection")
+    st.markdown(
+        "<span style='font-size:1.05rem;'>Monitor and detect unusual sales patterns instantly.</span>",
+        unsafe_allow_html=True
+    )
+    st.markdown("---")
+
+    mode = st.sidebar.radio("Detection mode", [STREAMING_MODE, PANEL_MODE, BATCH_MODE])
+    if mode == PANEL_MODE:
+        panel_anomalies_view(df)
+        return
+    if mode == STREAMING_MODE:
+        # Only rows appended since the last update are scored
+        detector = get_streaming_detector(df)
+        new_rows = background_result(
+            "anomalies-streaming", df, {}, lambda job: detector.update(df),
+            label="Updating the anomaly baseline with new data"
+        )
+        if new_rows is None:
+            return
+        st.caption(
+            f"Scored {len(new_rows):,} new transaction(s); baseline covers data up to "
+            f"{detector.watermark:%Y-%m-%d}."
+        )
+        df_anomaly = df
+        anomalies = detector.anomalies
+    else:
+        df_anomaly = background_result(
+            "anomalies-batch", df, {}, lambda job: detect_sales_anomalies(df),
+            label="Fitting the Isolation Forest"
+        )
+        if df_anomaly is None:
+            return
+        anomalies = df_anomaly[df_anomaly['Anomaly']]
+
+    if anomalies.empty:
+        st.success("No sales anomalies detected.")
+    else:
+        st.warning(f"{len(anomalies)} sales anomalies detected.")
+        st.dataframe(anomalies[['Date', 'Sales']], use_container_width=True)
+
+    fig = cached_figure(sales_anomaly_chart, df_anomaly, anomalies, width=860, height=320)
+    st.plotly_chart(fig, use_container_width=False)
+
+
+def panel_anomalies_view(df):
+    """Rank anomalies across Region, Product and Region x Product series."""
+    grain = st.sidebar.selectbox("Time grain", ["Daily", "Weekly"])
+    level = st.sidebar.selectbox("Series level", list(PANEL_LEVELS))
+    # One vectorized scan per dataset and grain; the widgets below only filter it
+    scan = background_result(
+        "anomalies-panel", df, {'grain': grain}, lambda job: scan_panel_anomalies(df, grain=grain),
+        label=f"Scanning {grain.lower()} Region / Product series"
+    )
+    if scan is None:
+        return
+    level_scan = scan[scan['Level'] == level]
+    series = st.sidebar.selectbox("Series", ["All series"] + sorted(level_scan['Series'].unique()))
+    if series != "All series":
+        level_scan = level_scan[level_scan['Series'] == series]
+
+    anomalies = level_scan[level_scan['Anomaly']]
+    if anomalies.empty:
+        st.success(f"No {grain.lower()} anomalies detected for this selection.")
+    else:
+        st.warning(f"{len(anomalies)} {grain.lower()} anomalies detected, strongest first.")
+        st.dataframe(
+            anomalies[['Series', 'Date', 'Sales', 'Baseline', 'Score']],
+            use_container_width=True, hide_index=True
+        )
+    if series == "All series":
+        return
+
+    history = level_scan.sort_values('Date')
+    fig = cached_figure(sales_anomaly_chart, history, anomalies, width=860, height=320)
+    st.plotly_chart(fig, use_container_width=False)
@@ -0,0 +1,185 @@
+import streamlit as st
+
+from src.aggregation import compute_dashboard_aggregates
+from src.cube import TIME_GRAINS, get_sales_cube
+from src.data_loader import dataset_fingerprint
+from src.exports import dashboard_summaries
+from src.filter_index import get_filter_index
+from src.insights import generate_insight
+from src.kpis import get_kpi_prefix_sums
+from src.retention import CHURN_WINDOWS, get_customer_retention
+from src.ui import render_export, render_kpis
+from src.visuals import (
+    cached_figure, sales_by_region, age_distribution, gender_pie, sales_by_product, sales_profit_over_time,
+    cohort_heatmap
+)
+
+
+def _header():
+    st.title("SME Business Intelligence Dashboard (Malawi)")
+    st.markdown(
+        "<span style='font-size:1.1rem;'>Empowering SME owners in Malawi with clear, actionable data.</span>",
+        unsafe_allow_html=True
+    )
+    st.markdown("---")
+
+
+def _sidebar_filters(regions, products, date_min, date_max):
+    """
+    Render the sidebar filters.
+
+    Returns:
+        tuple: ((regions, products, start_date, end_date), grain, churn window in days).
+    """
+    selected_regions = st.sidebar.multiselect("Filter by Region", regions, default=list(regions))
+    selected_products = st.sidebar.multiselect("Filter by Product", products, default=list(products))
+    date_range = st.sidebar.date_input("Date Range", [date_min, date_max])
+    if isinstance(date_range, tuple) or isinstance(date_range, list):
+        start_date, end_date = date_range[0], date_range[-1]
+    else:
+        start_date = end_date = date_range
+    agg_option = st.sidebar.selectbox("Aggregate by", list(TIME_GRAINS))
+    churn_window = st.sidebar.selectbox(
+        "Churn after (days without a purchase)", CHURN_WINDOWS, index=0
+    )
+    return (selected_regions, selected_products, start_date, end_date), agg_option, churn_window
+
+
+def _render_kpi_section(kpis, comparison_kpis):
+    """KPIs and their change against the period picked in the sidebar, fetched lazily by ``comparison_kpis()``."""
+    st.subheader("Key Performance Indicators")
+    compare_to = st.sidebar.selectbox("Compare KPIs to", ["Previous period", "Same period last year", "None"])
+    baseline = None
+    if compare_to != "None":
+        baseline = comparison_kpis()[compare_to]
+        if baseline is None:
+            st.caption(f"No data covers the {compare_to.lower()}, so no change is shown.")
+    render_kpis(kpis, baseline=baseline, baseline_label=compare_to)
+    st.markdown("---")
+
+
+def _render_aggregates(aggregates, agg_option, churn_window):
+    # Regional Sales and Gender Distribution side by side
+    st.subheader("Regional Sales & Gender Distribution")
+    col1, col2 = st.columns([1.2, 1])
+    with col1:
+        fig_region = cached_figure(sales_by_region, aggregates.region_sales, width=520, height=340)
+        st.plotly_chart(fig_region, use_container_width=False)
+    with col2:
+        fig_gender = cached_figure(gender_pie, aggregates.gender_counts, width=340, height=340)
+        st.plotly_chart(fig_gender, use_container_width=False)
+    st.markdown("---")
+
+    # Customer Age Distribution
+    st.subheader("Customer Age Distribution")
+    fig_age = cached_figure(age_distribution, aggregates.age_counts, width=860, height=320)
+    st.plotly_chart(fig_age, use_container_width=False)
+    st.markdown("---")
+
+    # Business Insight
+    st.subheader("Business Insight")
+    st.info(generate_insight(aggregates.region_sales))
+    st.markdown("---")
+
+    # New vs. returning customers, churn and retention for the customers in view
+    st.subheader("Customer Retention")
+    mix = aggregates.new_vs_repeat
+    col1, col2, col3 = st.columns(3)
+    col1.metric("New Customers", f"{mix.get('New', 0):,}")
+    col2.metric("Returning Customers", f"{mix.get('Returning', 0):,}")
+    col3.metric(f"Churned ({churn_window}+ days)", f"{aggregates.churned_customers:,}")
+    st.write("Churn by Window", aggregates.churn_summary)
+    if not aggregates.cohort_retention.empty:
+        fig_cohorts = cached_figure(cohort_heatmap, aggregates.cohort_retention, width=860, height=420)
+        st.plotly_chart(fig_cohorts, use_container_width=False)
+    st.write("Top Customers by Lifetime Value", aggregates.lifetime_value.head(10))
+    st.markdown("---")
+
+    # Drilldown: click a region bar to see details
+    st.subheader("Drilldown: Sales by Region (Filtered)")
+    region_fig = cached_figure(sales_by_region, aggregates.region_sales, width=600, height=340)
+    st.plotly_chart(region_fig, use_container_width=False)
+
+    # Sales/profit by product
+    st.subheader("Sales by Product")
+    prod_sales = aggregates.product_sales[['Product', 'Sales', 'Profit']]
+    fig_prod = cached_figure(sales_by_product, prod_sales, width=600, height=340)
+    st.plotly_chart(fig_prod, use_container_width=False)
+
+    # Top/bottom products
+    top_products = prod_sales.sort_values('Sales', ascending=False).head(3)
+    bottom_products = prod_sales.sort_values('Sales').head(3)
+    st.write("Top Products", top_products)
+    st.write("Bottom Products", bottom_products)
+
+    # Time aggregation option
+    st.subheader(f"Sales & Profit Over Time ({agg_option})")
+    fig_time = cached_figure(sales_profit_over_time, aggregates.time_series, agg_option, width=860, height=320)
+    st.plotly_chart(fig_time, use_container_width=False)
+
+
+def _export_key(dataset_key, selection, agg_option):
+    regions, products, start_date, end_date = selection
+    return [dataset_key, sorted(map(str, regions)), sorted(map(str, products)),
+            str(start_date), str(end_date), agg_option]
+
+
+def dashboard_page(df):
+    _header()
+    regions = df['Region'].unique()
+    products = df['Product'].unique()
+    selection, agg_option, churn_window = _sidebar_filters(
+        regions, products, df['Date'].min(), df['Date'].max()
+    )
+
+    # Sums over Date/Region/Product come from the pre-aggregated cube; raw
+    # rows are only needed for the customer-level views below.
+    cube_df = get_sales_cube(df).slice(*selection)
+    filtered_df = get_filter_index(df).select(*selection)
+
+    # KPIs, and their comparison periods, from per-day prefix sums
+    prefix_sums = get_kpi_prefix_sums(df)
+    kpis = prefix_sums.kpis(*selection)
+    _render_kpi_section(kpis, lambda: prefix_sums.comparison_kpis(*selection))
+
+    # Every other figure on the page, in one pass over the filtered data;
+    # customer figures use each customer's full history, precomputed once per dataset
+    aggregates = compute_dashboard_aggregates(
+        cube_df, filtered_df, grain=agg_option, kpis=kpis,
+        retention=get_customer_retention(df), start_date=selection[2], churn_window_days=churn_window
+    )
+    _render_aggregates(aggregates, agg_option, churn_window)
+
+    # Filtered rows plus the summaries above, built only when requested
+    render_export(
+        filtered_df,
+        _export_key(dataset_fingerprint(df), selection, agg_option),
+        "filtered_data",
+        summaries=dashboard_summaries(aggregates),
+        key="filtered-data",
+        label="Export filtered data as"
+    )
+
+
+def dashboard_query_page(source):
+    """
+    The dashboard over a DuckDBSource: the same page, with filtering and
+    aggregation pushed down to SQL instead of done on an in-memory frame.
+    """
+    _header()
+    dims = source.dimensions()
+    st.caption(f"Querying {dims['rows']:,} rows in place with DuckDB.")
+    selection, agg_option, churn_window = _sidebar_filters(
+        dims['regions'], dims['products'], dims['date_min'], dims['date_max']
+    )
+
+    aggregates = source.dashboard_aggregates(*selection, grain=agg_option, churn_window_days=churn_window)
+    _render_kpi_section(aggregates.kpis, lambda: source.comparison_kpis(*selection))
+    _render_aggregates(aggregates, agg_option, churn_window)
+
+    key_parts = _export_key(source.fingerprint, selection, agg_option)
+    summaries = dashboard_summaries(aggregates)
+    render_export(
+        None, key_parts, "filtered_data", key="filtered-data", label="Export filtered data as",
+        build=lambda fmt: source.build_export(fmt, key_parts, selection=selection, summaries=summaries)
+    )
@@ -0,0 +1,61 @@
+import pandas as pd
+import streamlit as st
+
+from src.forecasting import BACKENDS as FORECAST_BACKENDS, forecast_panel, forecast_sales
+from src.ui import background_result
+from src.visuals import cached_figure, forecast_chart
+
+ALL_SERIES = "All regions & products"
+
+
+def forecast_page(df):
+    st.title("Sales Forecasting")
+    st.markdown(
+        "<span style='font-size:1.05rem;'>Predict future sales trends to inform business decisions.</span>",
+        unsafe_allow_html=True
+    )
+    st.markdown("---")
+
+    backend = st.sidebar.selectbox(
+        "Forecast model", list(FORECAST_BACKENDS), format_func=FORECAST_BACKENDS.get
+    )
+    # Changing only the horizon predicts from the cached fit
+    periods = st.sidebar.slider("Forecast horizon (days)", min_value=7, max_value=365, value=30)
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        # The loaded frame is shared between sessions, so convert a copy
+        df = df.assign(Date=pd.to_datetime(df['Date']))
+
+    # Pick one Region x Product series, or forecast total sales
+    pairs = df[['Region', 'Product']].drop_duplicates().sort_values(['Region', 'Product'])
+    series_options = [ALL_SERIES] + [f"{r} · {p}" for r, p in pairs.itertuples(index=False)]
+    selected_series = st.sidebar.selectbox("Series", series_options)
+
+    if selected_series == ALL_SERIES:
+        forecast = background_result(
+            "forecast", df, {'periods': periods, 'backend': backend},
+            lambda job: forecast_sales(df, periods=periods, backend=backend),
+            label="Fitting the sales forecast"
+        )
+    else:
+        def run_panel(job):
+            finished = []
+
+            def report(done, total, group):
+                finished.append(' · '.join(group))
+                job.report(done / total, f"Forecast {done}/{total}: {finished[-1]}", partial=list(finished))
+
+            return forecast_panel(df, periods=periods, backend=backend, progress=report)
+
+        panel = background_result(
+            "forecast-panel", df, {'periods': periods, 'backend': backend}, run_panel,
+            label="Forecasting each Region × Product series"
+        )
+        forecast = None
+        if panel is not None:
+            region, product = selected_series.split(" · ", 1)
+            forecast = panel[(panel['Region'] == region) & (panel['Product'] == product)]
+    if forecast is None:
+        return
+
+    fig = cached_figure(forecast_chart, forecast, width=860, height=320)
+    st.plotly_chart(fig, use_container_width=False)
@@ -0,0 +1,39 @@
+import streamlit as st
+
+from src.customer_segmentation import FEATURE_COLUMNS, segment_customers
+from src.ui import background_result
+from src.visuals import cached_figure, segment_scatter
+
+
+def segmentation_page(df):
+    st.title("Customer Segmentation")
+    st.markdown(
+        "<span style='font-size:1.05rem;'>Identify and visualize customer segments for targeted strategies.</span>",
+        unsafe_allow_html=True
+    )
+    st.markdown("---")
+
+    # Ensure unique customer identifier exists
+    if 'Customer ID' not in df.columns:
+        df = df.copy()
+        df['Customer ID'] = df.index + 1
+
+    # One row per customer: recency, frequency, monetary value, tenure, age
+    customers = background_result(
+        "segmentation", df, {'n_clusters': 3}, lambda job: segment_customers(df),
+        label="Clustering customers"
+    )
+    if customers is None:
+        return
+    customers = customers.assign(Segment=customers['Segment'].astype(str))
+
+    # Sampled and drawn with WebGL when there are many customers
+    fig = cached_figure(segment_scatter, customers, width=860, height=320)
+    st.plotly_chart(fig, use_container_width=False)
+
+    st.subheader("Segment Profiles")
+    profiles = customers.groupby('Segment').agg(
+        Customers=('Customer ID', 'size'),
+        **{col: (col, 'mean') for col in FEATURE_COLUMNS}
+    ).round(1)
+    st.dataframe(profiles, use_container_width=True)
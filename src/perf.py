@@ -0,0 +1,299 @@
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger("sme_dashboard.perf")
+
+# Environment variable naming where JSON perf logs go: "stderr" or a file path.
+LOG_ENV_VAR = "SME_PERF_LOG"
+_MAX_RECENT_STAGES = 100
+
+_current = contextvars.ContextVar("perf_recorder", default=None)
+_recent = deque(maxlen=_MAX_RECENT_STAGES)
+_recent_lock = threading.Lock()
+_logging_configured = False
+_logging_lock = threading.Lock()
+# Runs currently tracking memory; tracemalloc is process-wide, so it is
+# started for the first and stopped after the last.
+_tracing_users = 0
+_tracing_owned = False
+_tracing_lock = threading.Lock()
+
+
+class StageRecord:
+    """Timing of one stage: wall time, rows processed and, if tracked, peak memory."""
+
+    def __init__(self, name, rows=None, depth=0):
+        self.name = name
+        self.rows = rows
+        self.depth = depth
+        self.note = None
+        self.seconds = None
+        self.peak_bytes = None
+        self.thread = threading.current_thread().name
+        self.started = time.time()
+
+    def as_dict(self):
+        return {
+            "stage": self.name, "seconds": self.seconds, "rows": self.rows,
+            "peak_bytes": self.peak_bytes, "note": self.note, "depth": self.depth,
+            "thread": self.thread, "started": self.started,
+        }
+
+
+class RerunRecorder:
+    """
+    Stages recorded during one script run (one Streamlit rerun).
+
+    Set as the current recorder by rerun(); stage() calls made from the
+    same thread, including nested ones, are appended in start order.
+    """
+
+    def __init__(self, label="rerun", track_memory=False):
+        self.label = label
+        self.track_memory = track_memory
+        self.stages = []
+        self.seconds = None
+        self.peak_bytes = None
+        self.profile_text = None
+        self.profile_data = None
+        self._memory_stack = []
+        # Highest traced memory seen by finished top-level stages
+        self._peak_seen = 0
+
+    def frame(self):
+        """Return the recorded stages as a DataFrame, indented by nesting."""
+        return pd.DataFrame({
+            "Stage": ["  " * s.depth + s.name for s in self.stages],
+            "Seconds": [s.seconds for s in self.stages],
+            "Rows": [s.rows for s in self.stages],
+            "Peak MB": [None if s.peak_bytes is None else s.peak_bytes / 1e6 for s in self.stages],
+            "Note": [s.note for s in self.stages],
+        })
+
+
+def _rows_of(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    return None
+
+
+def _log(event, payload):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": event, **payload}, default=str))
+
+
+def _fold_peak(recorder, peak):
+    """Carry a peak into the enclosing stage, or the run itself at top level."""
+    if recorder._memory_stack and recorder._memory_stack[-1] is not None:
+        recorder._memory_stack[-1][1] = max(recorder._memory_stack[-1][1], peak)
+    elif not recorder._memory_stack:
+        recorder._peak_seen = max(recorder._peak_seen, peak)
+
+
+def _acquire_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_owned = True
+        _tracing_users += 1
+
+
+def _release_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    Time a block of work as a named stage.
+
+    Yields the StageRecord, whose ``rows`` and ``note`` can be set inside
+    the block. The record is added to the current rerun (if any), kept in
+    the process-wide recent_stages() buffer, and logged as JSON.
+
+    Example:
+        with stage("filter.select") as record:
+            filtered = index.select(...)
+            record.rows = len(filtered)
+    """
+    recorder = _current.get()
+    depth = len(recorder._memory_stack) if recorder is not None else 0
+    record = StageRecord(name, rows=rows, depth=depth)
+    track = recorder is not None and recorder.track_memory and tracemalloc.is_tracing()
+    if recorder is not None:
+        recorder.stages.append(record)
+        if track:
+            # Fold the peak so far into the enclosing stage before resetting it
+            current, peak = tracemalloc.get_traced_memory()
+            _fold_peak(recorder, peak)
+            tracemalloc.reset_peak()
+            recorder._memory_stack.append([current, current])
+        else:
+            recorder._memory_stack.append(None)
+
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - start
+        if recorder is not None:
+            frame = recorder._memory_stack.pop()
+            if frame is not None:
+                base, seen = frame
+                seen = max(seen, tracemalloc.get_traced_memory()[1])
+                # Other runs may reset the shared peak meanwhile
+                record.peak_bytes = max(0, seen - base)
+                _fold_peak(recorder, seen)
+        with _recent_lock:
+            _recent.append(record)
+        _log("stage", record.as_dict())
+
+
+def timed(name=None):
+    """
+    Decorator form of stage().
+
+    Rows processed are taken from the first DataFrame argument, or from
+    the result when no argument is a DataFrame.
+    """
+    def decorate(fn):
+        stage_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            rows = next((_rows_of(a) for a in args if _rows_of(a) is not None), None)
+            with stage(stage_name, rows=rows) as record:
+                result = fn(*args, **kwargs)
+                if record.rows is None:
+                    record.rows = _rows_of(result)
+                return result
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def rerun(label="rerun", track_memory=False, profile=False):
+    """
+    Record every stage of one script run.
+
+    Args:
+        label (str): Name for the run, e.g. the page.
+        track_memory (bool): Record per-stage peak memory with tracemalloc.
+            Python allocations are traced while any such run lasts, which
+            slows it down noticeably. Tracing is process-wide, so runs in
+            concurrent sessions see each other's allocations.
+        profile (bool): Capture a cProfile of the run; the top functions by
+            cumulative time end up in ``profile_text`` and the raw stats in
+            ``profile_data`` (bytes loadable with pstats).
+
+    Yields:
+        RerunRecorder: Filled in as the run proceeds.
+    """
+    recorder = RerunRecorder(label, track_memory=track_memory)
+    token = _current.set(recorder)
+    if track_memory:
+        _acquire_tracing()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    profiler = cProfile.Profile() if profile else None
+    start = time.perf_counter()
+    if profiler is not None:
+        try:
+            profiler.enable()
+        except ValueError:  # another session is already profiling
+            profiler = None
+    try:
+        yield recorder
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        recorder.seconds = time.perf_counter() - start
+        if track_memory:
+            recorder.peak_bytes = max(0, max(recorder._peak_seen, tracemalloc.get_traced_memory()[1]) - base)
+            _release_tracing()
+        _current.reset(token)
+        if profiler is not None:
+            _capture_profile(recorder, profiler)
+        _log("rerun", {
+            "label": label, "seconds": recorder.seconds, "peak_bytes": recorder.peak_bytes,
+            "stages": len(recorder.stages), "process_peak_rss_bytes": process_peak_rss(),
+        })
+
+
+def _capture_profile(recorder, profiler, limit=30):
+    text = io.StringIO()
+    stats = pstats.Stats(profiler, stream=text)
+    stats.sort_stats("cumulative").print_stats(limit)
+    recorder.profile_text = text.getvalue()
+    # Same format as Stats.dump_stats(), so pstats/snakeviz can read a saved copy
+    recorder.profile_data = marshal.dumps(stats.stats)
+
+
+def recent_stages(exclude=None):
+    """
+    Return the most recently finished stages from any thread, newest first.
+
+    Args:
+        exclude (RerunRecorder, optional): Leave out this run's own stages.
+    """
+    own = set(map(id, exclude.stages)) if exclude is not None else set()
+    with _recent_lock:
+        return [record for record in reversed(_recent) if id(record) not in own]
+
+
+def process_peak_rss():
+    """Peak resident set size of this process in bytes, where the platform reports it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def configure_logging(destination=None):
+    """
+    Send perf events as JSON lines to stderr or a file.
+
+    Args:
+        destination (str, optional): "stderr" or a file path; defaults to
+            the SME_PERF_LOG environment variable. Nothing is configured
+            when neither is set. Safe to call on every rerun.
+    """
+    global _logging_configured
+    destination = destination or os.environ.get(LOG_ENV_VAR)
+    if not destination:
+        return
+    with _logging_lock:
+        if _logging_configured:
+            return
+        handler = logging.StreamHandler() if destination == "stderr" else logging.FileHandler(destination)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        _logging_configured = True
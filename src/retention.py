@@ -0,0 +1,351 @@
+import numpy as np
+import pandas as pd
+
+from src.data_loader import appended_rows, dataset_fingerprint, widen_integers
+from src.perf import timed
+from src.shared_cache import shared_cache
+
+CHURN_WINDOW_DAYS = 30
+# Churn windows offered on the dashboard, in days.
+CHURN_WINDOWS = [30, 60, 90, 180]
+COHORT_MONTHS = 12
+ANNUAL_DISCOUNT_RATE = 0.10
+# Caps the retention rate in the lifetime value formula, which diverges at 1.
+MAX_RETENTION_RATE = 0.99
+
+
+def _months(dates):
+    """Calendar months since 1970-01 for an array of datetimes."""
+    return np.asarray(dates, dtype="datetime64[M]").astype(np.int64)
+
+
+def customer_mix_series(n_new, n_customers):
+    """New and returning customer counts, laid out as CustomerRetention.customer_mix() returns them."""
+    mix = pd.Series({"New": n_new, "Returning": n_customers - n_new}, name="Customers")
+    mix = mix.rename_axis("Customer Type")
+    return mix[mix > 0]
+
+
+def churn_summary_frame(windows, churned, n_customers):
+    """Churned counts per window, laid out as CustomerRetention.churn_summary() returns them."""
+    return pd.DataFrame({
+        "Window (days)": list(windows),
+        "Churned": list(churned),
+        "Customers": n_customers,
+        "Churn Rate (%)": [c / n_customers * 100 if n_customers else 0.0 for c in churned],
+    })
+
+
+def cohort_frame(cohorts, offsets, counts, as_of, max_months=COHORT_MONTHS, as_rate=True):
+    """
+    Lay out cohort purchase counts as CustomerRetention.cohort_matrix() returns them.
+
+    Every customer buys in their first month, so each cohort's size is its
+    count at offset 0.
+
+    Args:
+        cohorts (np.ndarray): Cohort of each count, in months since 1970-01.
+        offsets (np.ndarray): Months since first purchase, below ``max_months``.
+        counts (np.ndarray): Customers of the cohort buying in that month.
+        as_of (pd.Timestamp): Latest date in the data; later cells are NaN.
+        max_months (int): Months since first purchase to include.
+        as_rate (bool): Shares of the cohort rather than customer counts.
+
+    Returns:
+        pd.DataFrame: Indexed by cohort month start, one column per month
+        since first purchase.
+    """
+    columns = pd.RangeIndex(max_months, name="Months Since First Purchase")
+    if not len(cohorts):
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name="Cohort"), dtype=float)
+
+    cohort_lo = int(cohorts.min())
+    n_cohorts = int(cohorts.max()) - cohort_lo + 1
+    matrix = np.bincount(
+        (cohorts - cohort_lo) * max_months + offsets, weights=counts, minlength=n_cohorts * max_months
+    ).reshape(n_cohorts, max_months)
+    sizes = matrix[:, 0].copy()
+
+    # Cells after the last month of data have not been observed yet
+    last_month = _months([as_of.to_datetime64()])[0]
+    cohort_months = np.arange(n_cohorts) + cohort_lo
+    matrix[cohort_months[:, None] + np.arange(max_months)[None, :] > last_month] = np.nan
+
+    non_empty = sizes > 0
+    values = matrix / sizes[:, None] if as_rate else matrix
+    index = pd.DatetimeIndex(
+        cohort_months[non_empty].astype("datetime64[M]").astype("datetime64[ns]"), name="Cohort"
+    )
+    return pd.DataFrame(values[non_empty], index=index, columns=columns)
+
+
+class CustomerRetention:
+    """
+    Per-customer purchase history, summarised once per dataset.
+
+    Holds each customer's first and last purchase date, order count and
+    total sales and profit, plus the distinct (customer, calendar month)
+    pairs in which they bought. New-vs-returning counts, churn, monthly
+    cohort retention and lifetime value are all derived from these tables,
+    so a filtered view only needs the IDs of the customers in it (see
+    positions()) rather than another pass over its transactions.
+
+    "New" and "churned" are judged on each customer's whole history, not
+    on the filtered rows: a customer who first bought before the selected
+    date range is a returning customer even if the range hides that.
+    """
+
+    @timed("retention.build")
+    def __init__(self, df):
+        codes, ids = pd.factorize(df["Customer ID"], sort=True)
+        valid = codes >= 0
+        if not valid.all():
+            df, codes = df[valid], codes[valid]
+
+        grouped = df[["Date", "Sales", "Profit"]].groupby(codes)
+        customers = grouped.agg(**{
+            "First Purchase": ("Date", "min"),
+            "Last Purchase": ("Date", "max"),
+            "Orders": ("Date", "size"),
+            "Sales": ("Sales", "sum"),
+            "Profit": ("Profit", "sum"),
+        })
+        customers.index = pd.Index(ids, name="Customer ID")
+        # appended() adds to these sums, which must not keep a narrow integer type
+        self.customers = widen_integers(customers, ["Sales", "Profit"])
+        self.as_of = df["Date"].max() if len(df) else None
+
+        # Distinct (customer, month) pairs, encoded as one integer per row
+        months = _months(df["Date"].to_numpy())
+        self._first_month = _months(customers["First Purchase"].to_numpy())
+        if len(months):
+            month0 = int(months.min())
+            span = int(months.max()) - month0 + 1
+            pairs = pd.unique(codes.astype(np.int64) * span + (months - month0))
+            self._pair_customer = pairs // span
+            self._pair_month = pairs % span + month0
+        else:
+            self._pair_customer = self._pair_month = np.zeros(0, dtype=np.int64)
+
+    @timed("retention.append")
+    def appended(self, new_rows):
+        """
+        Return the retention tables for this data plus ``new_rows``, leaving these unchanged.
+
+        The new rows are summarised on their own and merged into the
+        per-customer table and the (customer, month) pairs. Only the new
+        customers and the pairs from the new rows' months are looked up,
+        so the cost depends on the new rows plus array copies of the
+        existing tables, not on the transactions already seen.
+        """
+        if new_rows.empty:
+            return self
+        batch = CustomerRetention(new_rows)
+        if self.as_of is None:
+            return batch
+        old, new = self.customers, batch.customers
+        index = old.index.union(new.index)
+        old_pos = np.arange(len(old)) if len(index) == len(old) else index.get_indexer(old.index)
+        new_pos = index.get_indexer(new.index)
+        known = old.index.get_indexer(new.index) >= 0
+
+        columns = {}
+        for name in old.columns:
+            values = np.empty(len(index), dtype=old[name].dtype)
+            values[old_pos] = old[name].to_numpy()
+            current, added = values[new_pos], new[name].to_numpy()
+            if name == "First Purchase":
+                merged = np.minimum(current, added)
+            elif name == "Last Purchase":
+                merged = np.maximum(current, added)
+            else:
+                merged = current + added
+            values[new_pos] = np.where(known, merged, added)
+            columns[name] = values
+        customers = pd.DataFrame(columns, index=index)
+
+        # Pairs from the new rows duplicate old ones only in months the old data reached
+        month0 = int(min(self._pair_month.min(), batch._pair_month.min()))
+        span = int(max(self._pair_month.max(), batch._pair_month.max())) - month0 + 1
+        pair_customer = new_pos[batch._pair_customer]
+        recent = self._pair_month >= batch._pair_month.min()
+        old_recent = old_pos[self._pair_customer[recent]] * span + (self._pair_month[recent] - month0)
+        fresh = ~np.isin(pair_customer * span + (batch._pair_month - month0), old_recent)
+
+        retention = CustomerRetention.__new__(CustomerRetention)
+        retention.customers = customers
+        retention.as_of = max(self.as_of, batch.as_of)
+        retention._first_month = _months(customers["First Purchase"].to_numpy())
+        retention._pair_customer = np.concatenate([old_pos[self._pair_customer], pair_customer[fresh]])
+        retention._pair_month = np.concatenate([self._pair_month, batch._pair_month[fresh]])
+        return retention
+
+    def lookup(self, customer_ids):
+        """Return the positions in ``customers`` of some Customer IDs, skipping unknown ones."""
+        found = self.customers.index.get_indexer(customer_ids)
+        return found[found >= 0]
+
+    def positions(self, rows):
+        """
+        Return the customers appearing in some rows, as positions in ``customers``.
+
+        Args:
+            rows (pd.DataFrame): Transactions from this dataset, e.g. a filtered view.
+
+        Returns:
+            np.ndarray: Integer positions, for the ``customers`` argument of
+            the other methods.
+        """
+        return self.lookup(pd.unique(rows["Customer ID"]))
+
+    def _mask(self, customers):
+        if customers is None:
+            return np.ones(len(self.customers), dtype=bool)
+        mask = np.zeros(len(self.customers), dtype=bool)
+        mask[customers] = True
+        return mask
+
+    def customer_mix(self, customers, start_date):
+        """
+        Count new and returning customers in a view starting at ``start_date``.
+
+        A customer is new when their first purchase ever falls on or after
+        ``start_date``.
+
+        Args:
+            customers (np.ndarray): Positions from positions().
+            start_date (date-like): First day of the view.
+
+        Returns:
+            pd.Series: Customer counts indexed "New" and "Returning"; types
+            with no customers are left out.
+        """
+        first = self.customers["First Purchase"].to_numpy()[customers]
+        n_new = int((first >= np.datetime64(pd.Timestamp(start_date))).sum())
+        return customer_mix_series(n_new, len(first))
+
+    def churned(self, customers=None, window_days=CHURN_WINDOW_DAYS):
+        """
+        Mark customers with no purchase in the last ``window_days`` of the data.
+
+        Args:
+            customers (np.ndarray, optional): Positions from positions();
+                defaults to every customer.
+            window_days (int): Days without a purchase after which a customer
+                counts as churned.
+
+        Returns:
+            np.ndarray: Boolean flag per selected customer.
+        """
+        last = self.customers["Last Purchase"].to_numpy()
+        if customers is not None:
+            last = last[customers]
+        if self.as_of is None:
+            return np.zeros(len(last), dtype=bool)
+        return last < np.datetime64(self.as_of - pd.Timedelta(days=window_days))
+
+    def churn_summary(self, customers=None, windows=CHURN_WINDOWS):
+        """
+        Churned customers under several churn windows.
+
+        Args:
+            customers (np.ndarray, optional): Positions from positions().
+            windows (list): Churn windows in days.
+
+        Returns:
+            pd.DataFrame: 'Window (days)', 'Churned', 'Customers' and
+            'Churn Rate (%)', one row per window.
+        """
+        n = len(self.customers) if customers is None else len(customers)
+        churned = [int(self.churned(customers, window).sum()) for window in windows]
+        return churn_summary_frame(windows, churned, n)
+
+    def cohort_matrix(self, customers=None, max_months=COHORT_MONTHS, as_rate=True):
+        """
+        Monthly cohort retention.
+
+        Customers are grouped by the month of their first purchase; each
+        cell is the share (or number) of a cohort buying again N months
+        later. Months after the end of the data are NaN.
+
+        Args:
+            customers (np.ndarray, optional): Positions from positions();
+                defaults to every customer.
+            max_months (int): Months since first purchase to include (0 is
+                the first month itself).
+            as_rate (bool): Shares of the cohort rather than customer counts.
+
+        Returns:
+            pd.DataFrame: Indexed by cohort month start, one column per month
+            since first purchase.
+        """
+        pair_mask = self._mask(customers)[self._pair_customer]
+        pair_cohort = self._first_month[self._pair_customer[pair_mask]]
+        pair_offset = self._pair_month[pair_mask] - pair_cohort
+        keep = pair_offset < max_months
+        return cohort_frame(
+            pair_cohort[keep], pair_offset[keep], np.ones(int(keep.sum())), self.as_of, max_months, as_rate
+        )
+
+    def lifetime_value(self, customers=None, window_days=CHURN_WINDOW_DAYS,
+                       annual_discount_rate=ANNUAL_DISCOUNT_RATE):
+        """
+        Customer lifetime value: profit so far plus the expected future profit.
+
+        Future profit uses the retention-based formula m * r / (1 + d - r),
+        with one period per churn window: m is the customer's average profit
+        per period since their first purchase, r the share of established
+        customers (first purchase at least one window ago) not churned, and
+        d the discount rate per period. Churned customers get no future
+        profit.
+
+        Args:
+            customers (np.ndarray, optional): Positions from positions();
+                defaults to every customer.
+            window_days (int): Churn window, also the period length.
+            annual_discount_rate (float): Yearly discount rate.
+
+        Returns:
+            pd.DataFrame: 'Customer ID', 'Orders', 'Sales', 'Profit',
+            'Avg Order Value', 'Churned' and 'CLV', highest CLV first.
+        """
+        table = self.customers if customers is None else self.customers.iloc[customers]
+        churned = self.churned(customers, window_days)
+        if table.empty:
+            periods = np.zeros(0)
+            retention = 0.0
+        else:
+            periods = np.maximum((self.as_of - table["First Purchase"]).dt.days.to_numpy() / window_days, 1.0)
+            established = periods > 1.0
+            churn_rate = churned[established].mean() if established.any() else churned.mean()
+            retention = min(1.0 - churn_rate, MAX_RETENTION_RATE)
+        discount = (1 + annual_discount_rate) ** (window_days / 365.25) - 1
+        future = table["Profit"].to_numpy() / periods * retention / (1 + discount - retention)
+
+        return pd.DataFrame({
+            "Orders": table["Orders"],
+            "Sales": table["Sales"],
+            "Profit": table["Profit"],
+            "Avg Order Value": table["Sales"] / table["Orders"],
+            "Churned": churned,
+            "CLV": table["Profit"] + np.where(churned, 0.0, future),
+        }).sort_values("CLV", ascending=False).reset_index()
+
+
+def _build_retention(df):
+    appended = appended_rows(df)
+    if appended is not None:
+        parent = shared_cache.get("retention", appended[0])
+        if parent is not None:
+            return parent.appended(appended[1])
+    return CustomerRetention(df)
+
+
+def get_customer_retention(df):
+    """
+    Return the CustomerRetention for a dataset, building it once per fingerprint.
+
+    A dataset appended to one whose tables are cached extends them with
+    the new rows; see CustomerRetention.appended().
+    """
+    return shared_cache.get_or_create("retention", dataset_fingerprint(df), lambda: _build_retention(df))
@@ -0,0 +1,207 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Byte budget, in megabytes, for the process-wide cache.
+BUDGET_ENV_VAR = "SME_CACHE_MAX_MB"
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+_SIZE_DEPTH = 3
+
+
+def estimate_nbytes(value, _depth=0):
+    """
+    Approximate memory held by a cached value.
+
+    DataFrames and Series count their index and (deep) column memory,
+    NumPy arrays their buffer, and other objects with an integer
+    ``nbytes`` attribute report their own size; containers and plain
+    objects add up their elements or attributes a few levels deep. Shared
+    sub-objects may be counted more than once, so the estimate errs high.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(index=True, deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, pd.Index):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(getattr(type(value), "nbytes", None), property):
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes, bytearray)):
+        return sys.getsizeof(value)
+    if _depth >= _SIZE_DEPTH:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_nbytes(k, _depth + 1) + estimate_nbytes(v, _depth + 1) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v, _depth + 1) for v in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + estimate_nbytes(vars(value), _depth + 1)
+    return sys.getsizeof(value)
+
+
+class SharedCache:
+    """
+    Process-wide LRU cache of datasets, aggregates and model outputs.
+
+    Entries live in named namespaces ("datasets", "cubes", ...) and are
+    keyed on the dataset fingerprint plus the operation's parameters, so
+    every Streamlit session on the server shares one copy of each result
+    instead of holding its own. When the estimated size of all entries
+    exceeds ``max_bytes`` the least recently used are dropped.
+
+    Cached values are shared between sessions and threads, so callers
+    must treat them as read-only: copy before modifying.
+
+    get_or_create() builds a missing entry once, even when several
+    sessions ask for it at the same time; the others wait and then hit.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self._stats = {}
+
+    def _counter(self, namespace):
+        return self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "evictions": 0})
+
+    def __contains__(self, cache_key):
+        """Whether a (namespace, key) pair is cached, without counting a lookup."""
+        with self._lock:
+            return cache_key in self._entries
+
+    def get(self, namespace, key, default=None):
+        """Return a cached value and mark it recently used, or ``default``, counting a hit or miss."""
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                self._counter(namespace)["misses"] += 1
+                return default
+            self._entries.move_to_end((namespace, key))
+            self._counter(namespace)["hits"] += 1
+            return entry[0]
+
+    def put(self, namespace, key, value, nbytes=None):
+        """
+        Store a value, evicting least recently used entries to stay within budget.
+
+        Args:
+            namespace (str): Kind of value, e.g. "cubes".
+            key (hashable): Dataset fingerprint and parameters.
+            value: The value; shared, so it must not be modified afterwards.
+            nbytes (int, optional): Its size; estimated when omitted.
+
+        Returns:
+            The value. It is not stored when larger than the whole budget.
+        """
+        nbytes = estimate_nbytes(value) if nbytes is None else nbytes
+        if nbytes > self.max_bytes:
+            return value
+        with self._lock:
+            old = self._entries.pop((namespace, key), None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[(namespace, key)] = (value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                (evicted_namespace, _), (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self._counter(evicted_namespace)["evictions"] += 1
+        return value
+
+    def get_or_create(self, namespace, key, build, nbytes=None):
+        """
+        Return the cached value, calling ``build()`` to create it on a miss.
+
+        Concurrent callers for the same key wait for a single build.
+        """
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None:
+                self._entries.move_to_end((namespace, key))
+                self._counter(namespace)["hits"] += 1
+                return entry[0]
+            lock = self._build_locks.setdefault((namespace, key), threading.Lock())
+        with lock:
+            try:
+                with self._lock:
+                    entry = self._entries.get((namespace, key))
+                    if entry is not None:
+                        # Built by another caller while this one waited
+                        self._entries.move_to_end((namespace, key))
+                        self._counter(namespace)["hits"] += 1
+                        return entry[0]
+                    self._counter(namespace)["misses"] += 1
+                return self.put(namespace, key, build(), nbytes)
+            finally:
+                with self._lock:
+                    self._build_locks.pop((namespace, key), None)
+
+    def discard(self, namespace, key):
+        """Drop one entry if present."""
+        with self._lock:
+            entry = self._entries.pop((namespace, key), None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def clear(self, namespace=None):
+        """Drop every entry, or those of one namespace, and reset the matching statistics."""
+        with self._lock:
+            for cache_key in [k for k in self._entries if namespace is None or k[0] == namespace]:
+                self._bytes -= self._entries.pop(cache_key)[1]
+            if namespace is None:
+                self._stats.clear()
+            else:
+                self._stats.pop(namespace, None)
+
+    @property
+    def nbytes(self):
+        """Estimated bytes held by all entries."""
+        return self._bytes
+
+    def stats(self):
+        """
+        Hit/miss statistics and current usage per namespace.
+
+        Returns:
+            pd.DataFrame: 'Namespace', 'Entries', 'MB', 'Hits', 'Misses',
+            'Hit Rate (%)' and 'Evictions'.
+        """
+        with self._lock:
+            usage = {}
+            for (namespace, _), (_, nbytes) in self._entries.items():
+                entries, total = usage.get(namespace, (0, 0))
+                usage[namespace] = (entries + 1, total + nbytes)
+            rows = []
+            for namespace in sorted(set(usage) | set(self._stats)):
+                entries, total = usage.get(namespace, (0, 0))
+                counts = self._counter(namespace)
+                lookups = counts["hits"] + counts["misses"]
+                rows.append({
+                    "Namespace": namespace,
+                    "Entries": entries,
+                    "MB": total / 1e6,
+                    "Hits": counts["hits"],
+                    "Misses": counts["misses"],
+                    "Hit Rate (%)": counts["hits"] / lookups * 100 if lookups else None,
+                    "Evictions": counts["evictions"],
+                })
+        return pd.DataFrame(rows, columns=["Namespace", "Entries", "MB", "Hits", "Misses",
+                                           "Hit Rate (%)", "Evictions"])
+
+
+def _budget_from_env():
+    value = os.environ.get(BUDGET_ENV_VAR)
+    return int(float(value) * 1024 * 1024) if value else DEFAULT_MAX_BYTES
+
+
+shared_cache = SharedCache(max_bytes=_budget_from_env())
@@ -1,5 +1,19 @@
+import os
+import time
+
+import pandas as pd
 import streamlit as st
+from src.data_loader import dataset_fingerprint
+from src.exports import EXPORT_FORMATS, build_export, export_path
+from src.jobs import THREAD_NAME_PREFIX, runner as job_runner
 from src.localization import format_currency
+from src.perf import process_peak_rss, recent_stages
+from src.shared_cache import shared_cache
+
+JOB_POLL_SECONDS = 1.0
+# Session-state keys read by app.main() before the next rerun starts.
+PERF_TRACK_MEMORY_KEY = "perf-track-memory"
+PERF_PROFILE_KEY = "perf-profile-next"
 
 def inject_css():
     """Inject custom CSS for consistent app styling."""
@@ -9,14 +23,169 @@ def inject_css():
     except FileNotFoundError:
         st.warning("Custom CSS file not found. Styling may be affected.")
 
-def render_kpis(kpi_dict):
-    """Render KPIs inside a styled container."""
+def _pct_change(current, baseline):
+    if not baseline:
+        return None
+    return f"{(current - baseline) / abs(baseline) * 100:+.1f}%"
+
+
+def render_kpis(kpi_dict, baseline=None, baseline_label=None):
+    """
+    Render KPIs inside a styled container.
+
+    When a baseline KPI dictionary is given (e.g. the previous period), each
+    metric shows its change against it as the st.metric delta.
+    """
+    deltas = {}
+    if baseline:
+        suffix = f" vs {baseline_label.lower()}" if baseline_label else ""
+        for key in ("Total Sales", "Total Profit"):
+            change = _pct_change(kpi_dict.get(key, 0), baseline.get(key, 0))
+            deltas[key] = change + suffix if change else None
+        margin_change = kpi_dict.get("Profit Margin (%)", 0) - baseline.get("Profit Margin (%)", 0)
+        deltas["Profit Margin (%)"] = f"{margin_change:+.2f} pp{suffix}"
+
     with st.container():
         col1, col2, col3 = st.columns(3)
-        col1.metric("Total Sales", format_currency(kpi_dict.get("Total Sales", 0)))
-        col2.metric("Total Profit", format_currency(kpi_dict.get("Total Profit", 0)))
+        col1.metric("Total Sales", format_currency(kpi_dict.get("Total Sales", 0)),
+                    delta=deltas.get("Total Sales"))
+        col2.metric("Total Profit", format_currency(kpi_dict.get("Total Profit", 0)),
+                    delta=deltas.get("Total Profit"))
         profit_margin = kpi_dict.get("Profit Margin (%)", 0)
-        col3.metric("Profit Margin", f"{profit_margin:.2f}%")
+        col3.metric("Profit Margin", f"{profit_margin:.2f}%",
+                    delta=deltas.get("Profit Margin (%)"))
+
+def render_job_status(job):
+    """Show a background job's progress, partial results or failure."""
+    if job.status == "failed":
+        st.error(f"{job.label} failed: {job.error}")
+        return
+    st.info(f"{job.label}... This page updates automatically when it finishes.")
+    st.progress(job.progress, text=job.message)
+    if job.partial:
+        with st.expander(f"Finished so far ({len(job.partial)})"):
+            st.write(", ".join(map(str, job.partial)))
+
+def background_result(kind, df, params, fn, label):
+    """
+    Run ``fn(job)`` in the shared job runner and return its result once finished.
+
+    Until then, render the job's progress and schedule a rerun to poll it;
+    the work carries on if the user navigates away, and identical jobs
+    from other sessions are shared.
+    """
+    job = job_runner.submit(kind, dataset_fingerprint(df), params, fn, label=label)
+    if job.status == "done":
+        return job.result
+    render_job_status(job)
+    if not job.done:
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+    return None
+
+def render_export(df, key_parts, file_stem, summaries=None, key="export", label="Export data as", build=None):
+    """
+    Sidebar export controls: a format picker and an on-demand build button.
+
+    Nothing is serialized until "Prepare download" is clicked. Built files
+    are cached on disk by ``key_parts``, so later reruns, and other sessions
+    exporting the same data, go straight to the download button. The file
+    is only read when that button is clicked, and is rebuilt if the export
+    cache evicted it in the meantime.
+
+    Args:
+        df (pd.DataFrame): Rows to export; may be None when ``build`` is given.
+        key_parts (list): Values identifying ``df``, e.g. dataset fingerprint and filters.
+        file_stem (str): Download file name without extension.
+        summaries (dict, optional): Sheet name -> DataFrame, added to Excel exports.
+        key (str): Widget key prefix, unique per page element.
+        label (str): Format picker label.
+        build (callable, optional): ``build(fmt)`` returning the path of the
+            built export, for rows that are not in memory (e.g. a DuckDB
+            query); defaults to build_export() on ``df``.
+    """
+    fmt = st.sidebar.selectbox(
+        label, list(EXPORT_FORMATS), format_func=lambda f: EXPORT_FORMATS[f][0], key=f"{key}-format"
+    )
+    format_label, extension, mime = EXPORT_FORMATS[fmt]
+    if build is None:
+        def build(fmt):
+            return build_export(df, fmt, key_parts, summaries=summaries)
+    path = export_path(fmt, key_parts)
+    if not os.path.exists(path):
+        if not st.sidebar.button(f"Prepare {format_label} download", key=f"{key}-prepare"):
+            return
+        rows = "" if df is None else f" of {len(df):,} rows"
+        with st.spinner(f"Preparing {format_label} export{rows}..."):
+            path = build(fmt)
+
+    def read_export():
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # Evicted by a newer export since this rerun
+            with open(build(fmt), "rb") as f:
+                return f.read()
+
+    st.sidebar.download_button(
+        label=f"Download {format_label}",
+        data=read_export,
+        file_name=file_stem + extension,
+        mime=mime,
+        key=f"{key}-download"
+    )
+
+def _request_profile():
+    st.session_state[PERF_PROFILE_KEY] = True
+
+def render_perf_panel(recorder):
+    """
+    Sidebar "Performance" panel for the rerun that just finished.
+
+    Lists each recorded stage with its wall time, rows and (when memory
+    tracking is on) peak Python memory, stages finished meanwhile by
+    background jobs, the shared cache's usage and hit rates, and, after
+    "Profile next rerun", the cProfile of that rerun with a .prof download.
+
+    Args:
+        recorder (RerunRecorder): From the perf.rerun() around the page.
+    """
+    with st.sidebar.expander("Performance"):
+        st.checkbox("Track peak memory (slower)", key=PERF_TRACK_MEMORY_KEY)
+        st.button("Profile next rerun", on_click=_request_profile, key="perf-profile-button")
+
+        summary = f"Rerun took {recorder.seconds:.3f} s"
+        if recorder.peak_bytes is not None:
+            summary += f", peak Python memory {recorder.peak_bytes / 1e6:,.1f} MB"
+        rss = process_peak_rss()
+        if rss is not None:
+            summary += f"; process peak RSS {rss / 1e6:,.0f} MB"
+        st.caption(summary)
+        if recorder.stages:
+            st.dataframe(recorder.frame(), hide_index=True)
+
+        background = [record for record in recent_stages(exclude=recorder)
+                      if record.thread.startswith(THREAD_NAME_PREFIX)][:10]
+        if background:
+            st.caption("Recent background stages")
+            st.dataframe(pd.DataFrame({
+                "Stage": [record.name for record in background],
+                "Seconds": [record.seconds for record in background],
+                "Rows": [record.rows for record in background],
+            }), hide_index=True)
+
+        cache_stats = shared_cache.stats()
+        if not cache_stats.empty:
+            st.caption(f"Shared cache: {shared_cache.nbytes / 1e6:,.1f} of "
+                       f"{shared_cache.max_bytes / 1e6:,.0f} MB")
+            st.dataframe(cache_stats, hide_index=True)
+
+        if recorder.profile_text:
+            st.code(recorder.profile_text, language=None)
+            st.download_button("Download profile (.prof)", data=recorder.profile_data,
+                               file_name="rerun.prof", mime="application/octet-stream",
+                               key="perf-profile-download")
 
 def section_header(title: str):
     """Stylish section header consistent with CSS."""
@@ -1,72 +1,360 @@
+import json
+
+import numpy as np
+import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from src import localization
+from src.data_loader import dataset_fingerprint
+from src.localization import t
+from src.model_cache import fingerprint
+from src.perf import stage
+from src.shared_cache import shared_cache
 
 # Consistent green palette for all visuals
 GREEN_SHADES = ['#006400', '#228B22', '#32CD32', '#7CFC00', '#ADFF2F']
 
-def sales_by_region(df):
-    data = df.groupby("Region", as_index=False)["Sales"].sum()
+# Dashboard theme, layered over Plotly's default template so trace styling
+# is unchanged; every figure built here uses it.
+pio.templates["sme"] = go.layout.Template(layout=dict(
+    plot_bgcolor='#ffffff',
+    paper_bgcolor='#ffffff',
+    font=dict(color='#222'),
+    margin=dict(l=10, r=10, t=40, b=10),
+))
+TEMPLATE = "plotly+sme"
+
+# Payload caps: longer line series are downsampled, larger scatters sampled,
+# and traces with more points than WEBGL_THRESHOLD are drawn with WebGL.
+MAX_LINE_POINTS = 2000
+MAX_SCATTER_POINTS = 20000
+WEBGL_THRESHOLD = 5000
+AGE_BINS = 20
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(float)
+    return values.astype(float)
+
+
+def lttb(x, y, n_out, keep=None):
+    """
+    Positions of a Largest-Triangle-Three-Buckets downsample of a line.
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previous
+    pick and the next bucket's average, which preserves peaks and dips far
+    better than striding or averaging.
+
+    Args:
+        x (array-like): Sorted x values (numbers or datetimes).
+        y (array-like): y values.
+        n_out (int): Number of points to keep.
+        keep (array-like, optional): Boolean mask of points that must be
+            kept regardless, e.g. anomalies.
+
+    Returns:
+        np.ndarray: Sorted integer positions into x/y.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        picked = np.arange(n)
+    else:
+        x, y = _as_float(x), np.nan_to_num(_as_float(y))
+        # n_out - 2 buckets between the fixed first and last points
+        edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+        picked = np.empty(n_out, dtype=np.int64)
+        picked[0], picked[-1] = 0, n - 1
+        a = 0
+        for i in range(n_out - 2):
+            lo, hi = edges[i], edges[i + 1]
+            next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+            avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+            area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+            a = lo + int(np.argmax(area))
+            picked[i + 1] = a
+    if keep is not None:
+        picked = np.union1d(picked, np.flatnonzero(np.asarray(keep)))
+    return picked
+
+
+def downsample(frame, x, y, max_points=MAX_LINE_POINTS, keep=None):
+    """
+    Reduce a frame to at most about ``max_points`` rows for a line chart.
+
+    Args:
+        frame (pd.DataFrame): Rows sorted by ``x``.
+        x (str): x column.
+        y (list): y columns; each gets an equal share of the point budget.
+        max_points (int): Point budget, before ``keep``.
+        keep (array-like, optional): Boolean mask of rows that must survive.
+
+    Returns:
+        pd.DataFrame: The selected rows, in order.
+    """
+    if len(frame) <= max_points:
+        return frame
+    share = max(3, max_points // len(y))
+    picked = np.unique(np.concatenate([
+        lttb(frame[x].to_numpy(), frame[col].to_numpy(), share) for col in y
+    ]))
+    if keep is not None:
+        picked = np.union1d(picked, np.flatnonzero(np.asarray(keep)))
+    return frame.iloc[picked]
+
+
+def scatter_trace(n_points):
+    """Scattergl above WEBGL_THRESHOLD points, SVG Scatter below."""
+    return go.Scattergl if n_points > WEBGL_THRESHOLD else go.Scatter
+
+
+def binned_counts(values, weights, edges):
+    """Sum ``weights`` into histogram bins on the server; returns one count per bin."""
+    counts, _ = np.histogram(np.asarray(values, dtype=float), bins=edges, weights=np.asarray(weights, dtype=float))
+    return counts
+
+def sales_by_region(region_sales):
+    """Bar chart of precomputed Sales per Region."""
     fig = px.bar(
-        data,
+        region_sales,
         x="Region",
         y="Sales",
-        title="Sales by Region",
+        title=t("region_sales"),
         text_auto=True,
         color="Region",
-        color_discrete_sequence=GREEN_SHADES
-    )
-    fig.update_layout(
-        margin=dict(t=40, b=20, l=20, r=20),
-        plot_bgcolor='#ffffff',
-        paper_bgcolor='#ffffff',
-        font=dict(color='#222'),
-        autosize=True,
-        height=400,
-        showlegend=False
+        color_discrete_sequence=GREEN_SHADES,
+        template=TEMPLATE
     )
+    fig.update_layout(height=400, showlegend=False)
     fig.update_traces(textfont_size=12)
     return fig
 
-def age_distribution(df):
-    fig = px.histogram(
-        df,
-        x="Customer Age",
-        color="Customer Gender",
-        title="Customer Age Distribution",
-        nbins=20,
-        color_discrete_map={"Male": "#006400", "Female": "#32CD32"}
-    )
+def age_distribution(age_counts):
+    """
+    Age histogram from precomputed counts per (Customer Gender, Customer Age).
+
+    Bins are computed here, so the figure carries AGE_BINS bars per gender
+    instead of one value per age.
+    """
+    colors = {"Male": "#006400", "Female": "#32CD32"}
+    ages = age_counts["Customer Age"].to_numpy(dtype=float)
+    low, high = (np.floor(ages.min()), np.floor(ages.max())) if len(ages) else (0.0, 0.0)
+    width = max(1.0, np.ceil((high - low + 1) / AGE_BINS))
+    edges = np.arange(low, high + width + 1, width)
+    centers = (edges[:-1] + edges[1:]) / 2
+    labels = [f"{lo:.0f}-{hi - 1:.0f}" for lo, hi in zip(edges[:-1], edges[1:])]
+
+    fig = go.Figure(layout_template=TEMPLATE)
+    for gender, group in age_counts.groupby("Customer Gender", observed=True, sort=True):
+        fig.add_trace(go.Bar(
+            x=centers, y=binned_counts(group["Customer Age"], group["Count"], edges),
+            width=width, name=str(gender), customdata=labels,
+            hovertemplate="Age %{customdata}<br>Count %{y:,}<extra>%{fullData.name}</extra>",
+            marker_color=colors.get(gender)
+        ))
     fig.update_layout(
-        margin=dict(t=40, b=20, l=20, r=20),
-        plot_bgcolor='#ffffff',
-        paper_bgcolor='#ffffff',
-        font=dict(color='#222'),
-        autosize=True,
+        title=t("customer_age"),
+        xaxis_title="Customer Age",
+        yaxis_title="Count",
+        legend_title_text="Customer Gender",
+        bargap=0,
         height=400,
         barmode='overlay'
     )
     fig.update_traces(opacity=0.85)
     return fig
 
-def gender_pie(df):
-    gender_counts = df["Customer Gender"].value_counts().reset_index()
-    gender_counts.columns = ["Customer Gender", "Count"]
+def gender_pie(gender_counts):
+    """Donut chart of precomputed counts per Customer Gender."""
     fig = px.pie(
         gender_counts,
         names="Customer Gender",
         values="Count",
         hole=0.4,
-        title="Customer Gender Split",
+        title=t("gender_split"),
         color="Customer Gender",
-        color_discrete_map={"Male": "#228B22", "Female": "#7CFC00"}
-    )
-    fig.update_layout(
-        margin=dict(t=40, b=20, l=20, r=20),
-        font=dict(color='#222'),
-        autosize=True,
-        height=350,
-        showlegend=True,
-        plot_bgcolor='#ffffff',
-        paper_bgcolor='#ffffff'
+        color_discrete_map={"Male": "#228B22", "Female": "#7CFC00"},
+        template=TEMPLATE
     )
+    fig.update_layout(height=350, showlegend=True)
     fig.update_traces(textinfo='percent+label', pull=[0.03, 0.03])
     return fig
+
+
+def sales_by_product(product_sales):
+    """Bar chart of precomputed Sales per Product."""
+    return px.bar(product_sales, x='Product', y='Sales', color='Product', title='Sales by Product', template=TEMPLATE)
+
+
+def sales_profit_over_time(time_df, grain):
+    """Line chart of a precomputed Sales/Profit time series, LTTB-downsampled if long."""
+    time_df = downsample(time_df, 'Date', ['Sales', 'Profit'])
+    return px.line(time_df, x='Date', y=['Sales', 'Profit'], title=f'Sales & Profit Over Time ({grain})',
+                   template=TEMPLATE)
+
+
+def sales_anomaly_chart(history, anomalies):
+    """
+    Sales line with anomalies marked, plus a 'Baseline' line if ``history`` has one.
+
+    The line is LTTB-downsampled to MAX_LINE_POINTS, always keeping the
+    rows flagged in ``anomalies`` so the markers sit on the line.
+
+    Args:
+        history (pd.DataFrame): Rows with 'Date' and 'Sales' (and optionally
+            'Baseline'); sorted by Date here unless they already are.
+        anomalies (pd.DataFrame): Flagged rows with 'Date' and 'Sales'.
+    """
+    if not history['Date'].is_monotonic_increasing:
+        history = history.sort_values('Date', kind='stable')
+    keep = None
+    if not anomalies.empty and len(history) > MAX_LINE_POINTS:
+        flagged = pd.MultiIndex.from_frame(anomalies[['Date', 'Sales']])
+        keep = pd.MultiIndex.from_frame(history[['Date', 'Sales']]).isin(flagged)
+    line = downsample(history, 'Date', ['Sales'], keep=keep)
+
+    Scatter = scatter_trace(len(line))
+    fig = go.Figure(layout_template=TEMPLATE)
+    fig.add_trace(Scatter(
+        x=line['Date'], y=line['Sales'],
+        mode='lines', name='Sales', line=dict(color='#064635')
+    ))
+    if 'Baseline' in line.columns:
+        fig.add_trace(Scatter(
+            x=line['Date'], y=line['Baseline'],
+            mode='lines', name='Baseline', line=dict(color='#A9D6C1', dash='dash')
+        ))
+    if not anomalies.empty:
+        fig.add_trace(scatter_trace(len(anomalies))(
+            x=anomalies['Date'], y=anomalies['Sales'],
+            mode='markers', name='Anomalies',
+            marker=dict(color='red', size=10, symbol='x')
+        ))
+    return fig
+
+
+def segment_scatter(customers, max_points=MAX_SCATTER_POINTS):
+    """
+    Recency vs. Monetary scatter of customers coloured by 'Segment'.
+
+    Above ``max_points`` customers a fixed-seed sample is drawn from each
+    segment in proportion to its size; above WEBGL_THRESHOLD points the
+    scatter is rendered with WebGL.
+    """
+    if len(customers) > max_points:
+        fraction = max_points / len(customers)
+        customers = customers.groupby('Segment', group_keys=False, observed=True).sample(
+            frac=fraction, random_state=42
+        )
+    return px.scatter(
+        customers, x='Recency', y='Monetary',
+        color='Segment',
+        color_discrete_sequence=px.colors.sequential.Greens[3:],
+        hover_data=['Customer ID', 'Frequency', 'Customer Age', 'Dominant Product'],
+        labels={'Recency': 'Days since last purchase', 'Monetary': 'Total sales'},
+        render_mode='webgl' if len(customers) > WEBGL_THRESHOLD else 'svg',
+        template=TEMPLATE
+    )
+
+
+def forecast_chart(forecast):
+    """Forecast line with its upper and lower bounds."""
+    fig = go.Figure(layout_template=TEMPLATE)
+    fig.add_trace(go.Scatter(
+        x=forecast['ds'], y=forecast['yhat'],
+        mode='lines', name='Forecast', line=dict(color='#064635')
+    ))
+    fig.add_trace(go.Scatter(
+        x=forecast['ds'], y=forecast['yhat_upper'],
+        mode='lines', name='Upper Bound', line=dict(color='#A9D6C1', dash='dash')
+    ))
+    fig.add_trace(go.Scatter(
+        x=forecast['ds'], y=forecast['yhat_lower'],
+        mode='lines', name='Lower Bound', line=dict(color='#A9D6C1', dash='dash')
+    ))
+    return fig
+
+
+def cohort_heatmap(cohorts):
+    """
+    Heatmap of monthly cohort retention.
+
+    Args:
+        cohorts (pd.DataFrame): Shares from CustomerRetention.cohort_matrix(),
+            one row per cohort month and one column per month since first
+            purchase.
+    """
+    fig = px.imshow(
+        cohorts.to_numpy() * 100,
+        x=[str(c) for c in cohorts.columns],
+        y=cohorts.index.strftime('%Y-%m'),
+        color_continuous_scale='Greens',
+        zmin=0, zmax=100,
+        text_auto='.0f',
+        aspect='auto',
+        labels=dict(x='Months since first purchase', y='Cohort', color='Retained (%)'),
+        title='Monthly Cohort Retention',
+        template=TEMPLATE
+    )
+    fig.update_yaxes(autorange='reversed', type='category')
+    return fig
+
+
+def style_figure(fig, width, height, **layout):
+    """Apply the dashboard template and a fixed size to a figure."""
+    fig.update_layout(template=TEMPLATE, autosize=False, width=width, height=height, **layout)
+    return fig
+
+
+def _part_hash(part):
+    if isinstance(part, (pd.DataFrame, pd.Series)):
+        frame = part.to_frame() if isinstance(part, pd.Series) else part
+        # Loaded datasets carry their fingerprint, so large frames are not
+        # rehashed; small derived tables are hashed once and tagged.
+        key = [[str(c) for c in frame.columns], [str(d) for d in frame.dtypes], dataset_fingerprint(frame)]
+        if not isinstance(frame.index, pd.RangeIndex):
+            # A default RangeIndex carries no data; any other index does
+            key.append(pd.util.hash_pandas_object(frame.index).to_numpy().tobytes().hex())
+        return key
+    return part
+
+
+def cached_figure(builder, *args, width=None, height=None, **kwargs):
+    """
+    Build ``builder(*args, **kwargs)``, styled to the given size, through a figure cache.
+
+    Figures are stored as serialized JSON keyed on the chart builder, the
+    fingerprint of its data (see data_loader.dataset_fingerprint), its
+    other arguments, the size and the current language, so reruns
+    triggered by unrelated widgets skip Plotly Express and figure
+    validation without rescanning the data. Returns a fresh Figure each call; callers may
+    modify it freely.
+
+    Args:
+        builder (callable): A chart function from this module.
+        *args: Its data arguments (DataFrames are hashed by content).
+        width (int, optional): Figure width in pixels.
+        height (int, optional): Figure height in pixels.
+        **kwargs: Further keyword arguments for ``builder``.
+
+    Returns:
+        go.Figure: The chart.
+    """
+    key = fingerprint(
+        builder.__module__, builder.__qualname__, [_part_hash(a) for a in args],
+        kwargs, width, height, localization.current_language,
+    )
+    with stage(f"figure.{builder.__name__}") as record:
+        payload = shared_cache.get("figures", key)
+        record.note = "cached" if payload is not None else "built"
+        if payload is None:
+            fig = builder(*args, **kwargs)
+            if width is not None and height is not None:
+                style_figure(fig, width, height)
+            payload = shared_cache.put("figures", key, fig.to_json())
+        # The JSON came from a validated figure, so skip re-validating it.
+        return go.Figure(json.loads(payload), _validate=False)
@@ -0,0 +1,134 @@
+"""
+Incremental appends must match a build from scratch.
+
+Each partition is normalized on its own, as load_data does, so its
+integer columns can be narrower than the sums the stores keep.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.aggregation import customer_measures  # noqa: E402
+from src.cube import SalesCube  # noqa: E402
+from src.customer_segmentation import CustomerFeatureStore  # noqa: E402
+from src.data_loader import concat_frames, normalize_schema  # noqa: E402
+from src.retention import CustomerRetention  # noqa: E402
+
+
+def _partition(day, sales, customers=(1, 2), gender="Male", product="Widget", region="North"):
+    n = len(customers)
+    return normalize_schema(pd.DataFrame({
+        "Date": pd.to_datetime([day] * n),
+        "Customer ID": list(customers),
+        "Region": [region] * n,
+        "Product": [product] * n,
+        "Sales": list(sales),
+        "Profit": [s // 5 for s in sales],
+        "Customer Age": [30 + 5 * i for i in range(n)],
+        "Customer Gender": [gender] * n,
+    }), max_category_ratio=1.0)
+
+
+def _partitions(seed=7, rows=3000, days=180, first_day_rows=50):
+    """
+    Three date-ordered partitions of random transactions, normalized one by one.
+
+    The first partition is a single day in which every customer buys
+    once, so its sums keep the narrow type of its Sales column, and Sales
+    sit just under the int16 limit. Later partitions bring a product and
+    a gender the first never had, and the third starts on the second's
+    last day, so the two share cube cells.
+    """
+    rng = np.random.default_rng(seed)
+    day = np.sort(rng.integers(1, days, rows))
+    day[:first_day_rows] = 0
+    customer = rng.integers(1, 200, rows)
+    customer[:first_day_rows] = np.arange(1, first_day_rows + 1)
+    product = rng.choice(["Widget", "Gizmo"], rows)
+    gender = rng.choice(["Male", "Female"], rows)
+    later = np.arange(rows) >= first_day_rows
+    product[later & (rng.random(rows) < 0.3)] = "Gadget"
+    gender[later & (rng.random(rows) < 0.2)] = "Other"
+    df = pd.DataFrame({
+        "Date": pd.Timestamp("2024-01-01") + pd.to_timedelta(day, unit="D"),
+        "Customer ID": customer,
+        "Region": rng.choice(["North", "South", "East"], rows),
+        "Product": product,
+        "Sales": rng.integers(30000, 32000, rows),
+        "Profit": rng.integers(-2000, 8000, rows),
+        "Customer Age": rng.integers(18, 80, rows),
+        "Customer Gender": gender,
+    })
+    second_cut = int(day.searchsorted(day[rows // 2])) + 1
+    parts = [df.iloc[:first_day_rows], df.iloc[first_day_rows:second_cut], df.iloc[second_cut:]]
+    return [normalize_schema(part.reset_index(drop=True), max_category_ratio=1.0) for part in parts]
+
+
+def _appended(store_type, parts):
+    store = store_type(parts[0])
+    for part in parts[1:]:
+        store = store.appended(part)
+    return store
+
+
+def test_cube_append_matches_full_build():
+    parts = _partitions()
+    assert parts[1]["Date"].iloc[-1] == parts[2]["Date"].iloc[0]
+    appended = _appended(SalesCube, parts)
+    rebuilt = SalesCube(concat_frames(parts))
+    pd.testing.assert_frame_equal(appended.frame, rebuilt.frame, check_categorical=False)
+    np.testing.assert_array_equal(appended.dates, rebuilt.dates)
+
+
+def test_retention_append_matches_full_build():
+    parts = _partitions()
+    full = concat_frames(parts)
+    appended = _appended(CustomerRetention, parts)
+    rebuilt = CustomerRetention(full)
+    pd.testing.assert_frame_equal(appended.customers, rebuilt.customers)
+    assert appended.as_of == rebuilt.as_of
+
+    view = full[full["Date"] >= pd.Timestamp("2024-03-01")]
+    for customers in (None, rebuilt.positions(view)):
+        expected = customer_measures(rebuilt, customers, "2024-03-01")
+        for name, value in customer_measures(appended, customers, "2024-03-01").items():
+            if isinstance(value, (pd.DataFrame, pd.Series)):
+                assert value.equals(expected[name]), name
+            else:
+                assert value == expected[name], name
+
+
+def test_feature_store_append_matches_full_build():
+    parts = _partitions()
+    appended = _appended(CustomerFeatureStore, parts).features()
+    rebuilt = CustomerFeatureStore(concat_frames(parts)).features()
+    pd.testing.assert_frame_equal(appended, rebuilt, check_categorical=False)
+
+
+def test_sums_near_int16_limit_do_not_wrap_on_append():
+    first = _partition("2024-01-01", [30000, 20000])
+    second = _partition("2024-02-01", [30000, 20000])
+    full = concat_frames([first, second])
+
+    retention = CustomerRetention(first).appended(second)
+    assert retention.customers["Sales"].tolist() == CustomerRetention(full).customers["Sales"].tolist()
+    assert retention.customers["Sales"].tolist() == [60000, 40000]
+
+    store = CustomerFeatureStore(first).appended(second)
+    assert store.customers["Monetary"].tolist() == [60000, 40000]
+
+
+def test_feature_store_append_adds_new_categories_for_known_customers():
+    first = _partition("2024-01-01", [100, 200])
+    # Customer 2 comes back with a gender and product the first partition never had
+    second = _partition("2024-02-01", [300, 400, 500], customers=(2, 2, 3), gender="Female", product="Gadget")
+
+    appended = CustomerFeatureStore(first).appended(second).features()
+    rebuilt = CustomerFeatureStore(concat_frames([first, second])).features()
+    pd.testing.assert_frame_equal(appended, rebuilt, check_categorical=False)
+    assert appended.set_index("Customer ID").loc[2, "Dominant Product"] == "Gadget"
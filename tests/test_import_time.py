@@ -0,0 +1,31 @@
+"""
+Cold-start import check for the Streamlit entry point.
+
+Imports ``app`` in fresh interpreters (see benchmarks/import_time.py) and
+fails when a page-specific library loads at startup or the import exceeds
+its time budget. Set SME_IMPORT_BUDGET_SECONDS to adjust the budget on
+slower machines.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from import_time import DEFERRED_MODULES, import_profile  # noqa: E402
+
+IMPORT_BUDGET_SECONDS = float(os.environ.get("SME_IMPORT_BUDGET_SECONDS", "2.0"))
+_RUNS = 2
+
+
+def test_app_import_defers_page_libraries_and_fits_budget():
+    runs = [import_profile("app") for _ in range(_RUNS)]
+    rows, loaded = min(runs, key=lambda run: run[0][-1][2])
+
+    eager = sorted(set(DEFERRED_MODULES) & loaded)
+    assert not eager, f"deferred modules imported eagerly: {', '.join(eager)}"
+
+    seconds = rows[-1][2] / 1e6
+    assert seconds <= IMPORT_BUDGET_SECONDS, (
+        f"import app took {seconds:.3f} s, budget is {IMPORT_BUDGET_SECONDS:.3f} s"
+    )